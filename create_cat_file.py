@@ -126,27 +126,19 @@ def main():
 </html>
 """
         
-        # Try to write the file directly
+        # Write the file through the file manager. Vibe files are links into
+        # the shared blob store, so they must never be written in place.
         cat_html_path = vibe_dir / "cat.html"
-        logger.info(f"Writing cat.html directly to: {cat_html_path}")
-        
-        try:
-            with open(cat_html_path, 'w') as f:
-                f.write(cat_html_content)
-            
-            # Check if the file was created
-            if cat_html_path.exists():
-                logger.info(f"Successfully created cat.html: {cat_html_path}")
-                logger.info(f"File size: {cat_html_path.stat().st_size} bytes")
-            else:
-                logger.error(f"Failed to create cat.html: {cat_html_path}")
-        except Exception as e:
-            logger.exception(f"Error creating cat.html: {str(e)}")
-        
-        # Also try using the file manager
         logger.info(f"Writing cat.html using file manager")
         result = file_manager.write_file("cat.html", cat_html_content)
         logger.info(f"File manager result: {result}")
 
+        # Check if the file was created
+        if cat_html_path.exists():
+            logger.info(f"Successfully created cat.html: {cat_html_path}")
+            logger.info(f"File size: {cat_html_path.stat().st_size} bytes")
+        else:
+            logger.error(f"Failed to create cat.html: {cat_html_path}")
+
 if __name__ == "__main__":
     main()
@@ -86,9 +86,8 @@ def main():
         logger.info(f"IPFS URL: {ipfs_url}")
 
         # Save the image to the vibe directory
-        local_path = file_manager.get_file_path("test_dog.png")
-        with open(local_path, 'wb') as f:
-            f.write(image_data)
+        save_result = file_manager.save_image_data(image_data, "test_dog.png")
+        local_path = save_result.get('path')
         logger.info(f"Local path: {local_path}")
 
         # Create a simulated result string
@@ -182,11 +181,13 @@ Remember: Always use the IPFS URL as the primary src in your HTML for reliabilit
 </body>
 </html>"""
 
-                # Save the HTML file
-                html_path = file_manager.get_file_path("test_dalle.html")
-                with open(html_path, 'w') as f:
-                    f.write(html_content)
-                logger.info(f"HTML file created: {html_path}")
+                # Save the HTML file through the file manager (vibe files are
+                # links into the shared blob store and must not be written in place)
+                result = file_manager.write_file("test_dalle.html", html_content)
+                if result.get("success"):
+                    logger.info(f"HTML file created: {result['path']}")
+                else:
+                    logger.error(f"Failed to create HTML file: {result.get('error')}")
 
                 # List all files in the vibe directory
                 logger.info("Listing files in vibe directory...")
@@ -68,11 +68,11 @@ def main():
 </body>
 </html>"""
         
-        # Write the file directly
-        logger.info(f"Writing file directly to: {file_path}")
-        with open(file_path, 'w') as f:
-            f.write(content)
-        logger.info(f"File written directly: {file_path}")
+        # Write the file through the file manager. Vibe files are links into
+        # the shared blob store, so they must never be written in place.
+        logger.info(f"Writing file using file manager: {filename}")
+        result = file_manager.write_file(filename, content)
+        logger.info(f"File manager result: {result}")
         
         # Check if the file exists
         if file_path.exists():
@@ -83,20 +83,6 @@ def main():
         else:
             logger.error(f"File does not exist: {file_path}")
         
-        # Now try using the file manager
-        logger.info(f"Writing file using file manager: {filename}")
-        result = file_manager.write_file(filename, content)
-        logger.info(f"File manager result: {result}")
-        
-        # Check if the file exists again
-        if file_path.exists():
-            logger.info(f"File exists after using file manager: {file_path}")
-            with open(file_path, 'r') as f:
-                file_content = f.read()
-            logger.info(f"File content after using file manager: {file_content[:100]}...")
-        else:
-            logger.error(f"File does not exist after using file manager: {file_path}")
-        
         # List all files in the vibe directory
         logger.info(f"Listing files in vibe directory: {vibe_dir}")
         for file in vibe_dir.iterdir():
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Vibe, UserProfile, GeneratedImage
+from .models import Vibe, UserProfile, GeneratedImage, BackgroundJob
 
 # Register your models here.
 @admin.register(Vibe)
@@ -23,3 +23,9 @@ class GeneratedImageAdmin(admin.ModelAdmin):
     def short_prompt(self, obj):
         return obj.prompt[:50] + '...' if len(obj.prompt) > 50 else obj.prompt
     short_prompt.short_description = 'Prompt'
+
+@admin.register(BackgroundJob)
+class BackgroundJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'job_type', 'user', 'status', 'attempts', 'run_after', 'created_at')
+    search_fields = ('user__username', 'idempotency_key', 'error')
+    list_filter = ('job_type', 'status', 'created_at')
@@ -0,0 +1,239 @@
+"""
+Token budget for the messages sent to the AI model.
+
+Without a limit, every message of a builder session is sent on every call, so
+requests get slower and more expensive the longer a conversation runs. Before
+each call the conversation is fitted to AI_CONTEXT_TOKEN_BUDGET tokens:
+
+1. System prompts and the most recent messages are always sent as they are.
+2. Large code blocks in older messages (file contents from read_file,
+   write_file arguments, long tool results) are replaced by a short note.
+3. If that isn't enough, the oldest messages are left out, together with the
+   tool results that belong to them.
+
+Token counts use tiktoken when it is installed, and otherwise an estimate of
+four characters per token. Counts are cached per message content.
+"""
+import re
+import logging
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Set
+from django.conf import settings
+
+try:
+    import tiktoken
+except ImportError:  # tiktoken is optional, the estimate is close enough
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of tokens of conversation to send with each request
+AI_CONTEXT_TOKEN_BUDGET = getattr(settings, 'AI_CONTEXT_TOKEN_BUDGET', 16000)
+
+# Number of most recent messages that are always sent in full
+AI_CONTEXT_KEEP_RECENT_MESSAGES = getattr(settings, 'AI_CONTEXT_KEEP_RECENT_MESSAGES', 6)
+
+# Code blocks in older messages larger than this are elided
+AI_CONTEXT_ELIDE_MIN_TOKENS = getattr(settings, 'AI_CONTEXT_ELIDE_MIN_TOKENS', 200)
+
+# Tokens added by the API for each message on top of its content
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# Fenced code blocks, including tool blocks
+CODE_BLOCK_PATTERN = re.compile(r"```([^\n`]*)\n(.*?)```", re.DOTALL)
+
+# Number of lines kept at the start of an elided block (tool name and arguments)
+ELIDED_BLOCK_HEAD_LINES = 3
+
+OMITTED_MESSAGES_NOTE = "Some earlier messages in this conversation were left out to keep the request small."
+
+_encoding = None
+_encoding_loaded = False
+
+
+def _get_encoding():
+    """Get the tiktoken encoding, or None if tiktoken isn't available."""
+    global _encoding, _encoding_loaded
+
+    if not _encoding_loaded:
+        _encoding_loaded = True
+        if tiktoken is not None:
+            try:
+                _encoding = tiktoken.get_encoding('o200k_base')
+            except Exception as e:
+                logger.warning(f"Could not load tiktoken encoding, estimating token counts: {str(e)}")
+
+    return _encoding
+
+
+@lru_cache(maxsize=4096)
+def count_text_tokens(text: str) -> int:
+    """
+    Count the tokens in a piece of text.
+
+    Args:
+        text: The text
+
+    Returns:
+        The number of tokens
+    """
+    if not text:
+        return 0
+
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+
+    return (len(text) + 3) // 4
+
+
+def count_message_tokens(message: Dict[str, Any]) -> int:
+    """
+    Count the tokens a message takes up in a request.
+
+    Args:
+        message: The message
+
+    Returns:
+        The number of tokens
+    """
+    tokens = MESSAGE_OVERHEAD_TOKENS + count_text_tokens(message.get('content') or '')
+    if message.get('tool_calls'):
+        tokens += count_text_tokens(str(message['tool_calls']))
+    return tokens
+
+
+def elide_content(content: str, min_tokens: int = None) -> str:
+    """
+    Replace large code blocks in a message with a short note.
+
+    The first lines of each block are kept, so the model can still see which
+    tool was called and with what filename.
+
+    Args:
+        content: The message content
+        min_tokens: Blocks with at least this many tokens are elided
+
+    Returns:
+        The shortened content
+    """
+    if min_tokens is None:
+        min_tokens = AI_CONTEXT_ELIDE_MIN_TOKENS
+
+    def replace(match):
+        language, body = match.group(1), match.group(2)
+        tokens = count_text_tokens(body)
+        if tokens < min_tokens:
+            return match.group(0)
+
+        head = body.split("\n")[:ELIDED_BLOCK_HEAD_LINES]
+        return "```{}\n{}\n[... {} tokens elided to keep the request small ...]\n```".format(
+            language, "\n".join(head), tokens
+        )
+
+    shortened = CODE_BLOCK_PATTERN.sub(replace, content)
+
+    # Long messages without code blocks (e.g. a large tool result) are cut
+    # down to their beginning
+    if count_text_tokens(shortened) >= min_tokens * 4:
+        limit = min_tokens * 4
+        shortened = f"{shortened[:limit]}\n[... message shortened to keep the request small ...]"
+
+    return shortened
+
+
+def _tool_call_ids(message: Dict[str, Any]) -> Set[str]:
+    """Get the IDs of the tool calls made by an assistant message."""
+    return {tool_call.get('id') for tool_call in message.get('tool_calls') or [] if tool_call.get('id')}
+
+
+def fit_messages(messages: List[Dict[str, Any]], budget: Optional[int] = None,
+                 keep_recent: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Fit a conversation into a token budget.
+
+    The messages passed in are never modified; shortened messages are copies.
+
+    Args:
+        messages: The conversation, oldest first
+        budget: Maximum number of tokens (defaults to AI_CONTEXT_TOKEN_BUDGET)
+        keep_recent: Number of recent messages to keep in full
+            (defaults to AI_CONTEXT_KEEP_RECENT_MESSAGES)
+
+    Returns:
+        The messages to send
+    """
+    if budget is None:
+        budget = AI_CONTEXT_TOKEN_BUDGET
+    if keep_recent is None:
+        keep_recent = AI_CONTEXT_KEEP_RECENT_MESSAGES
+
+    tokens = [count_message_tokens(message) for message in messages]
+    original_total = total = sum(tokens)
+    if not budget or total <= budget:
+        return messages
+
+    # The most recent messages are kept as they are. A tool result can't be
+    # sent without the assistant message that called the tool, so move the
+    # start back to include it.
+    recent_start = max(len(messages) - keep_recent, 0)
+    while recent_start > 0 and messages[recent_start].get('role') == 'tool':
+        recent_start -= 1
+
+    def is_protected(index):
+        return index >= recent_start or messages[index].get('role') == 'system'
+
+    # Shorten older messages, biggest first
+    fitted = list(messages)
+    for index in sorted(range(len(messages)), key=lambda i: tokens[i], reverse=True):
+        if total <= budget:
+            break
+        if is_protected(index) or tokens[index] < AI_CONTEXT_ELIDE_MIN_TOKENS:
+            continue
+
+        content = messages[index].get('content') or ''
+        shortened = elide_content(content)
+        if shortened != content:
+            fitted[index] = {**messages[index], 'content': shortened}
+            new_tokens = count_message_tokens(fitted[index])
+            total -= tokens[index] - new_tokens
+            tokens[index] = new_tokens
+
+    # Leave out the oldest messages until the conversation fits
+    dropped = set()
+    dropped_tool_call_ids = set()
+    for index in range(len(messages)):
+        if total <= budget:
+            break
+        # Tool results are only left out along with their call
+        if is_protected(index) or index in dropped or messages[index].get('role') == 'tool':
+            continue
+
+        dropped.add(index)
+        total -= tokens[index]
+        dropped_tool_call_ids |= _tool_call_ids(messages[index])
+
+        # Tool results can't be sent without the call they answer
+        for other in range(index + 1, recent_start):
+            if other not in dropped and messages[other].get('tool_call_id') in dropped_tool_call_ids:
+                dropped.add(other)
+                total -= tokens[other]
+
+    if dropped:
+        fitted = [message for index, message in enumerate(fitted) if index not in dropped]
+
+        # Tell the model something is missing, after the system prompts
+        insert_at = 0
+        while insert_at < len(fitted) and fitted[insert_at].get('role') == 'system':
+            insert_at += 1
+        fitted.insert(insert_at, {"role": "system", "content": OMITTED_MESSAGES_NOTE})
+        total += count_message_tokens(fitted[insert_at])
+
+    logger.info(
+        f"Fitted {len(messages)} messages ({original_total} tokens) "
+        f"to {len(fitted)} messages ({total} tokens), left out {len(dropped)}"
+    )
+    if total > budget:
+        logger.warning(f"Conversation is still over the token budget ({total} > {budget}) after fitting")
+
+    return fitted
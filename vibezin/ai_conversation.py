@@ -1,48 +1,87 @@
 """
 Conversation management for AI assistants.
 """
+import time
 import logging
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Iterator, AsyncIterator, Generator
+from asgiref.sync import sync_to_async
 from django.contrib.auth.models import User
 
 from .ai_models import get_user_ai_context
-from .ai_prompts import VIBE_BUILDER_SYSTEM_PROMPT, get_vibe_context_prompt
-from .ai_tools import process_tool_calls
+from .ai_context_window import fit_messages
+from .ai_prompts import get_vibe_system_prompts
+from .ai_tools import process_tool_calls, dispatch_tool_calls
+from .ai_tool_executor import run_in_worker
 
 logger = logging.getLogger(__name__)
 
+# Steps yielded by VibeConversation._reasoning_loop
+_EVENT = "event"
+_MODEL = "model"
+_CALL = "call"
+
+
+def _token_event(content: str) -> Dict[str, Any]:
+    """Build a ``token`` event carrying a piece of the response."""
+    return {"event": "token", "data": {"content": content}}
+
+
+def _done_event(result: Dict[str, Any], started: float, first_token_at) -> Dict[str, Any]:
+    """
+    Build the final ``done`` event, adding timing information to the result.
+
+    Args:
+        result: The result dictionary of the reasoning loop
+        started: When the loop started (time.monotonic)
+        first_token_at: When the first token arrived, or None if none did
+
+    Returns:
+        The ``done`` event
+    """
+    total_time = time.monotonic() - started
+    time_to_first_token = first_token_at - started if first_token_at is not None else None
+    result["timing"] = {
+        "time_to_first_token": time_to_first_token,
+        "total_time": total_time
+    }
+    logger.info(f"AI response finished: time_to_first_token={time_to_first_token}, total_time={total_time:.3f}s")
+    return {"event": "done", "data": result}
+
+
 class VibeConversation:
     """Class to manage a conversation about a vibe."""
 
-    def __init__(self, user: User, vibe_id: int):
+    def __init__(self, user: User, vibe_id: int, use_response_cache: bool = False):
         """
         Initialize a conversation about a vibe.
 
         Args:
             user: The user who owns the conversation
             vibe_id: The ID of the vibe
+            use_response_cache: Whether to answer identical requests from the AI
+                response cache (see ai_response_cache). Only the non-streaming
+                paths use the cache.
         """
         from .models import Vibe
 
         self.user = user
+        self.use_response_cache = use_response_cache
         self.vibe = Vibe.objects.get(pk=vibe_id)
         self.context = get_user_ai_context(user)
-        self.messages = [
-            {
-                "role": "system",
-                "content": VIBE_BUILDER_SYSTEM_PROMPT
-            }
-        ]
 
-        # Add initial context about the vibe
-        self.add_message(
-            "system",
-            get_vibe_context_prompt(
-                self.vibe.title,
-                self.vibe.description,
-                self.vibe.slug
-            )
+        # Start with the builder prompt and context about the vibe. Both are
+        # built once per version of the vibe, with the model's instructions
+        # already applied.
+        builder_prompt, vibe_prompt = get_vibe_system_prompts(
+            self.vibe.title,
+            self.vibe.description,
+            self.vibe.slug,
+            o1_reasoning=getattr(self.context, 'o1_reasoning', False)
         )
+        self.messages = [
+            {"role": "system", "content": builder_prompt},
+            {"role": "system", "content": vibe_prompt},
+        ]
 
     def add_message(self, role: str, content: str, **kwargs) -> None:
         """
@@ -85,6 +124,18 @@ class VibeConversation:
 
         self.messages.append(message)
 
+    def get_context_messages(self) -> List[Dict[str, Any]]:
+        """
+        Get the messages to send to the model.
+
+        Older messages are shortened or left out so the request fits the
+        token budget (see ai_context_window).
+
+        Returns:
+            List of messages
+        """
+        return fit_messages(self.messages)
+
     def validate_messages(self) -> bool:
         """
         Validate the messages in the conversation to ensure they're properly formatted for the OpenAI API.
@@ -150,216 +201,373 @@ class VibeConversation:
         Returns:
             Dictionary with response content or error message
         """
+        result = {"success": False, "error": "The O1 reasoning loop ended without a response"}
+        for event in self.stream_response(temperature, max_tokens, max_iterations, stream=False):
+            if event["event"] == "done":
+                result = event["data"]
+        return result
+
+    def stream_response(self, temperature: float = 0.7, max_tokens: int = 1000,
+                        max_iterations: int = 5, stream: bool = True) -> Iterator[Dict[str, Any]]:
+        """
+        Run the O1 reasoning loop, streaming progress as it happens.
+
+        This is the streaming counterpart of get_response. Token deltas from
+        the model are yielded as soon as they arrive, along with progress
+        events for each iteration and tool call. The last event is always
+        ``done`` and carries the same dictionary get_response returns, plus
+        timing information.
+
+        Args:
+            temperature: Controls randomness (0-1)
+            max_tokens: Maximum number of tokens to generate
+            max_iterations: Maximum number of iterations in the reasoning loop
+            stream: Whether to stream tokens from the model or wait for whole responses
+
+        Yields:
+            Dictionaries with an ``event`` name and its ``data``
+        """
+        started = time.monotonic()
+        first_token_at = None
+        loop = self._reasoning_loop(max_iterations)
+        try:
+            step = next(loop)
+            while True:
+                kind, value = step
+                reply = None
+                if kind == _EVENT:
+                    if value["event"] == "token" and first_token_at is None:
+                        first_token_at = time.monotonic()
+                    yield value
+                elif kind == _MODEL and stream:
+                    for stream_event in self.context.stream_response(self.get_context_messages(), temperature, max_tokens):
+                        if stream_event["type"] == "delta":
+                            if first_token_at is None:
+                                first_token_at = time.monotonic()
+                                logger.info(f"First token after {first_token_at - started:.3f}s")
+                            yield _token_event(stream_event["content"])
+                        elif stream_event["type"] == "response":
+                            reply = stream_event["response"]
+                elif kind == _MODEL:
+                    reply = self.context.generate_response(
+                        self.get_context_messages(), temperature, max_tokens, use_cache=self.use_response_cache
+                    )
+                    first_token_at = first_token_at or time.monotonic()
+                else:
+                    func, *args = value
+                    reply = func(*args)
+                step = loop.send(reply)
+        except StopIteration as stop:
+            result = stop.value
+        except Exception as e:
+            logger.exception(f"Error in O1 reasoning loop: {str(e)}")
+            result = {"success": False, "error": f"Error in O1 reasoning loop: {str(e)}"}
+        yield _done_event(result, started, first_token_at)
+
+    async def aget_response(self, temperature: float = 0.7, max_tokens: int = 1000, max_iterations: int = 5) -> Dict[str, Any]:
+        """
+        Get a response from the AI using the O1 reasoning loop, asynchronously.
+
+        This is the async counterpart of get_response. Waiting on OpenAI
+        doesn't hold a thread, so an ASGI process can serve many builder
+        sessions at once.
+
+        Args:
+            temperature: Controls randomness (0-1)
+            max_tokens: Maximum number of tokens to generate
+            max_iterations: Maximum number of iterations in the reasoning loop
+
+        Returns:
+            Dictionary with response content or error message
+        """
+        result = {"success": False, "error": "The O1 reasoning loop ended without a response"}
+        async for event in self.astream_response(temperature, max_tokens, max_iterations, stream=False):
+            if event["event"] == "done":
+                result = event["data"]
+        return result
+
+    async def astream_response(self, temperature: float = 0.7, max_tokens: int = 1000,
+                               max_iterations: int = 5, stream: bool = True) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Run the O1 reasoning loop asynchronously, yielding progress as it happens.
+
+        This is the async counterpart of stream_response and yields the same
+        events. Tools still run synchronously (they touch the database and the
+        filesystem), each batch on a worker thread of its own, so one
+        session's slow tool call doesn't hold up the others.
+
+        Args:
+            temperature: Controls randomness (0-1)
+            max_tokens: Maximum number of tokens to generate
+            max_iterations: Maximum number of iterations in the reasoning loop
+            stream: Whether to stream tokens from the model or wait for whole responses
+
+        Yields:
+            Dictionaries with an ``event`` name and its ``data``
+        """
+        started = time.monotonic()
+        first_token_at = None
+        loop = self._reasoning_loop(max_iterations)
+        try:
+            step = next(loop)
+            while True:
+                kind, value = step
+                reply = None
+                if kind == _EVENT:
+                    if value["event"] == "token" and first_token_at is None:
+                        first_token_at = time.monotonic()
+                    yield value
+                elif kind == _MODEL and stream:
+                    async for stream_event in self.context.astream_response(self.get_context_messages(), temperature, max_tokens):
+                        if stream_event["type"] == "delta":
+                            if first_token_at is None:
+                                first_token_at = time.monotonic()
+                                logger.info(f"First token after {first_token_at - started:.3f}s")
+                            yield _token_event(stream_event["content"])
+                        elif stream_event["type"] == "response":
+                            reply = stream_event["response"]
+                elif kind == _MODEL:
+                    reply = await self.context.agenerate_response(
+                        self.get_context_messages(), temperature, max_tokens, use_cache=self.use_response_cache
+                    )
+                    first_token_at = first_token_at or time.monotonic()
+                else:
+                    # Not thread sensitive, so a slow tool call (an image
+                    # generation, say) doesn't hold up other sessions waiting
+                    # on the one shared sync thread
+                    reply = await sync_to_async(run_in_worker, thread_sensitive=False)(*value)
+                step = loop.send(reply)
+        except StopIteration as stop:
+            result = stop.value
+        except Exception as e:
+            logger.exception(f"Error in async O1 reasoning loop: {str(e)}")
+            result = {"success": False, "error": f"Error in O1 reasoning loop: {str(e)}"}
+        yield _done_event(result, started, first_token_at)
+
+    def _reasoning_loop(self, max_iterations: int) -> Generator[tuple, Any, Dict[str, Any]]:
+        """
+        The O1 reasoning loop shared by stream_response and astream_response.
+
+        The loop doesn't call the model or run tools itself, so the same steps
+        run over both the sync and the async transport. It yields pairs of:
+
+        - ``(_EVENT, event)``: a progress event to pass on to the caller
+        - ``(_MODEL, None)``: call the model; send back its response
+        - ``(_CALL, (func, *args))``: run a blocking function (tools, the
+          filesystem); send back what it returns
+
+        Args:
+            max_iterations: Maximum number of iterations in the reasoning loop
+
+        Returns:
+            The result dictionary (as returned by get_response, without timing)
+        """
         # Validate messages before sending to OpenAI API
         self.validate_messages()
-        try:
-            if not self.context:
-                logger.error("No OpenAI API key found for this user")
-                return {"success": False, "error": "No OpenAI API key found for this user"}
-
-            # For testing purposes, if the API key is a test key, return a mock response
-            if self.context.api_key == 'sk-test-key':
-                # Log that we're using a mock response
-                logger.warning(f"Using mock response because API key is 'sk-test-key'")
-
-                # Create a mock response that demonstrates proper tool usage with O1 reasoning
-                from .ai_mock_responses import get_mock_response
-                mock_content = get_mock_response()
-                self.add_message("assistant", mock_content)
-
-                # Process the tool call to get the actual file list
-                processed_content = process_tool_calls(mock_content, self.vibe, self.user)
-
-                # Return the processed content
-                return {
-                    "success": True,
-                    "content": processed_content,
-                    "raw_response": {"choices": [{"message": {"content": mock_content}}]}
-                }
 
-            # Log the actual API key (first 5 chars) for debugging
-            logger.info(f"Using API key: {self.context.api_key[:5]}...")
-
-            # Log the messages being sent to the API
-            logger.info(f"Starting O1 reasoning loop with {len(self.messages)} messages")
-            for i, msg in enumerate(self.messages):
-                logger.info(f"Message {i}: role={msg['role']}, content_length={len(msg['content'])}")
-
-            # Initialize variables for the reasoning loop
-            iteration = 0
-            final_content = ""
-            all_tool_results = []
-            has_tool_calls = False
-            final_response = None
-
-            # Start the O1 reasoning loop
-            while iteration < max_iterations:
-                iteration += 1
-                logger.info(f"O1 reasoning loop iteration {iteration}/{max_iterations}")
-
-                # Generate the response
-                logger.info(f"Generating response with temperature={temperature}, max_tokens={max_tokens}")
-                response = self.context.generate_response(self.messages, temperature, max_tokens)
-
-                # Log the response
-                logger.info(f"Response received: {response.keys()}")
-                if "error" in response:
-                    error_message = response["error"]
-                    details = response.get("details", "")
-                    logger.error(f"Error in response: {error_message}")
-                    if details:
-                        logger.error(f"Error details: {details}")
-
-                    # Format a user-friendly error message
-                    user_message = error_message
-                    if "API key" in error_message:
-                        user_message = "Your OpenAI API key appears to be invalid. Please check your profile settings and update your API key."
-                    elif "model" in error_message and "does not exist" in error_message:
-                        user_message = "The AI model is currently unavailable. We've tried to use a fallback model but encountered an error. Please try again later."
-                    elif "rate limit" in error_message.lower():
-                        user_message = "You've reached the rate limit for the OpenAI API. Please wait a moment and try again."
-                    elif "timeout" in error_message.lower():
-                        user_message = "The request to the AI service timed out. Please try again later."
-
-                    return {"success": False, "error": user_message, "technical_details": error_message}
-
-                # Save the final response
-                final_response = response
-
-                # Extract the content
-                content = self.context.extract_content(response)
-                logger.info(f"Extracted content length: {len(content)}")
-
-                # Check if there are tool calls in the response
-                tool_calls = []
-                if "choices" in response and "message" in response["choices"][0]:
-                    message = response["choices"][0]["message"]
-                    if "tool_calls" in message:
-                        tool_calls = message["tool_calls"]
-                        has_tool_calls = True
-                        logger.info(f"Tool calls found: {len(tool_calls)}")
-                        for i, tool_call in enumerate(tool_calls):
-                            function = tool_call.get("function", {})
-                            logger.info(f"Tool call {i}: name={function.get('name')}")
-                    else:
-                        logger.info("No tool calls found in the response")
-
-                # If there are no tool calls, we're done with the reasoning loop
-                if not tool_calls:
-                    logger.info("No tool calls found, ending reasoning loop")
+        if not self.context:
+            logger.error("No OpenAI API key found for this user")
+            return {"success": False, "error": "No OpenAI API key found for this user"}
+
+        # For testing purposes, if the API key is a test key, return a mock response
+        if self.context.api_key == 'sk-test-key':
+            logger.warning("Using mock response because API key is 'sk-test-key'")
+            result = yield _CALL, (self._mock_response,)
+            yield _EVENT, _token_event(result["content"])
+            return result
+
+        logger.info(f"Starting O1 reasoning loop with {len(self.messages)} messages")
+
+        iteration = 0
+        final_content = ""
+        content = ""
+        all_tool_results = []
+        has_tool_calls = False
+        final_response = None
+
+        while iteration < max_iterations:
+            iteration += 1
+            logger.info(f"O1 reasoning loop iteration {iteration}/{max_iterations}")
+            yield _EVENT, {"event": "iteration", "data": {"iteration": iteration, "max_iterations": max_iterations}}
+
+            response = yield _MODEL, None
+            if response is None:
+                response = {"error": "The AI service closed the stream without a response."}
+
+            if "error" in response:
+                return self._format_error(response)
+
+            final_response = response
+            content = self.context.extract_content(response, include_tool_calls=False)
+
+            # If there are no tool calls, we're done with the reasoning loop
+            tool_calls = self._get_tool_calls(response)
+            if not tool_calls:
+                logger.info("No tool calls found, ending reasoning loop")
+                if has_tool_calls:
+                    final_content = yield _CALL, (self._run_text_tool_calls, content)
+                else:
                     final_content = content
-                    break
+                break
 
-                # Process tool calls in the response
-                processed_content = process_tool_calls(content, self.vibe, self.user)
-                logger.info(f"Processed content length: {len(processed_content)}")
-
-                # Add the assistant's response to the conversation history
-                self.add_message("assistant", content)
-                logger.info("Added assistant response to conversation history")
+            has_tool_calls = True
+            yield _EVENT, {
+                "event": "tool_calls",
+                "data": {"tools": [tool_call.get("function", {}).get("name", "") for tool_call in tool_calls]}
+            }
 
-                # Extract tool results from the processed content
-                tool_results = []
-                for tool_call in tool_calls:
-                    function = tool_call.get("function", {})
-                    name = function.get("name", "")
-                    tool_id = tool_call.get("id", "")
-
-                    # Create a basic tool result if we can't extract it from the content
-                    tool_result = {
-                        "tool_call_id": tool_id,
-                        "role": "tool",
-                        "name": name,
-                        "content": f"Tool result for {name}"
-                    }
-
-                    # Try to find the tool result in the processed content
-                    if processed_content:
-                        tool_result_start = processed_content.find(f"Tool result:")
-                        if tool_result_start != -1:
-                            tool_result_end = processed_content.find("\n\n", tool_result_start)
-                            if tool_result_end == -1:
-                                tool_result_end = len(processed_content)
-
-                            result_content = processed_content[tool_result_start:tool_result_end].strip()
-                            tool_result["content"] = result_content
-                            logger.info(f"Extracted tool result for {name}: {result_content[:100]}...")
-                        else:
-                            logger.warning(f"Could not find tool result for {name} in processed content")
-                    else:
-                        logger.warning(f"No processed content available to extract tool result for {name}")
-
-                    # Add the tool result to the list
-                    tool_results.append(tool_result)
-
-                # Add tool results to all_tool_results
-                all_tool_results.extend(tool_results)
-
-                # Add tool results to the conversation history
-                for tool_result in tool_results:
-                    # Verify this tool result corresponds to a valid tool call
-                    tool_call_id = tool_result.get("tool_call_id")
-                    if not tool_call_id:
-                        logger.warning(f"Skipping tool result without tool_call_id: {tool_result}")
-                        continue
-
-                    # Check if there's a corresponding tool call in the last assistant message
-                    found_matching_tool_call = False
-                    for msg in reversed(self.messages):
-                        if msg.get("role") == "assistant" and "tool_calls" in msg:
-                            for tool_call in msg["tool_calls"]:
-                                if tool_call.get("id") == tool_call_id:
-                                    found_matching_tool_call = True
-                                    break
-                            if found_matching_tool_call:
-                                break
-
-                    if not found_matching_tool_call:
-                        logger.warning(f"Skipping tool result with tool_call_id {tool_call_id} as it doesn't match any tool calls")
-                        continue
-
-                    # Add tool result as a properly formatted tool message
-                    self.messages.append({
-                        "role": "tool",
-                        "tool_call_id": tool_result["tool_call_id"],
-                        "name": tool_result["name"],
-                        "content": tool_result["content"]
-                    })
-                    logger.info(f"Added tool result to conversation history: {tool_result['name']} with tool_call_id: {tool_result['tool_call_id']}")
-
-                # If we've reached the maximum number of iterations, break
-                if iteration >= max_iterations:
-                    logger.warning(f"Reached maximum number of iterations ({max_iterations}), ending reasoning loop")
-                    final_content = processed_content
-                    break
-
-            # If we didn't have any tool calls, just return the original content
-            if not has_tool_calls:
-                logger.info("No tool calls were made during the reasoning loop")
-                return {
-                    "success": True,
-                    "content": content,
-                    "raw_response": final_response
+            processed_content, tool_results = yield _CALL, (self._run_tools, content, tool_calls)
+            all_tool_results.extend(tool_results)
+            for tool_result in tool_results:
+                yield _EVENT, {
+                    "event": "tool_result",
+                    "data": {"name": tool_result["name"], "content": tool_result["content"]}
                 }
 
-            # Process the final content with all tool results
-            final_processed_content = process_tool_calls(final_content, self.vibe, self.user)
-            logger.info(f"Final processed content length: {len(final_processed_content)}")
+            if iteration >= max_iterations:
+                logger.warning(f"Reached maximum number of iterations ({max_iterations}), ending reasoning loop")
+                final_content = processed_content
+                break
 
+        # If we didn't have any tool calls, just return the original content
+        if not has_tool_calls:
+            logger.info("No tool calls were made during the reasoning loop")
             return {
                 "success": True,
-                "content": final_processed_content,
-                "raw_response": final_response,
-                "tool_results": all_tool_results,
-                "iterations": iteration
-            }
-        except Exception as e:
-            logger.exception(f"Error in O1 reasoning loop: {str(e)}")
-            return {
-                "success": False,
-                "error": f"Error in O1 reasoning loop: {str(e)}"
+                "content": content,
+                "raw_response": final_response
             }
 
+        logger.info(f"Final processed content length: {len(final_content)}")
+        return {
+            "success": True,
+            "content": final_content,
+            "raw_response": final_response,
+            "tool_results": all_tool_results,
+            "iterations": iteration
+        }
+
+    def _mock_response(self) -> Dict[str, Any]:
+        """
+        Answer with the canned mock response used for the 'sk-test-key' API key.
+
+        Returns:
+            Dictionary with the processed mock content
+        """
+        from .ai_mock_responses import get_mock_response
+
+        # Create a mock response that demonstrates proper tool usage with O1 reasoning
+        mock_content = get_mock_response()
+        self.add_message("assistant", mock_content)
+
+        # Process the tool call to get the actual file list
+        processed_content = process_tool_calls(mock_content, self.vibe, self.user)
+
+        return {
+            "success": True,
+            "content": processed_content,
+            "raw_response": {"choices": [{"message": {"content": mock_content}}]}
+        }
+
+    def _format_error(self, response: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Turn an error response from the AI model into a user-friendly result.
+
+        Args:
+            response: The response dictionary containing an error
+
+        Returns:
+            Dictionary with success set to False and the error message
+        """
+        error_message = response["error"]
+        details = response.get("details", "")
+        logger.error(f"Error in response: {error_message}")
+        if details:
+            logger.error(f"Error details: {details}")
+
+        # Format a user-friendly error message
+        user_message = error_message
+        if "API key" in error_message:
+            user_message = "Your OpenAI API key appears to be invalid. Please check your profile settings and update your API key."
+        elif "model" in error_message and "does not exist" in error_message:
+            user_message = "The AI model is currently unavailable. We've tried to use a fallback model but encountered an error. Please try again later."
+        elif "rate limit" in error_message.lower():
+            user_message = "You've reached the rate limit for the OpenAI API. Please wait a moment and try again."
+        elif "timeout" in error_message.lower():
+            user_message = "The request to the AI service timed out. Please try again later."
+
+        return {"success": False, "error": user_message, "technical_details": error_message}
+
+    def _get_tool_calls(self, response: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Get the tool calls from a response.
+
+        Args:
+            response: The response dictionary from the AI model
+
+        Returns:
+            List of tool calls (empty if there are none)
+        """
+        tool_calls = []
+        if "choices" in response and "message" in response["choices"][0]:
+            message = response["choices"][0]["message"]
+            if "tool_calls" in message:
+                tool_calls = message["tool_calls"]
+                logger.info(f"Tool calls found: {len(tool_calls)}")
+                for i, tool_call in enumerate(tool_calls):
+                    function = tool_call.get("function", {})
+                    logger.info(f"Tool call {i}: name={function.get('name')}")
+            else:
+                logger.info("No tool calls found in the response")
+        return tool_calls
+
+    def _run_tools(self, content: str, tool_calls: List[Dict[str, Any]]):
+        """
+        Run the tool calls in a response and add the results to the conversation.
+
+        Args:
+            content: The text content of the assistant message
+            tool_calls: The tool calls from the response
+
+        Returns:
+            Tuple of the content with the tool results appended (for display)
+            and the list of tool results
+        """
+        tool_results = dispatch_tool_calls(tool_calls, self.vibe, self.user)
+
+        # Add the assistant's response with its tool calls, followed by one
+        # tool message per call, to the conversation history
+        self.messages.append({
+            "role": "assistant",
+            "content": content,
+            "tool_calls": tool_calls
+        })
+        for tool_result in tool_results:
+            self.messages.append(dict(tool_result))
+            logger.info(f"Added tool result to conversation history: {tool_result['name']} with tool_call_id: {tool_result['tool_call_id']}")
+
+        processed_content = "".join(
+            [f"{content}\n\n" if content else ""] +
+            [f"Tool result:\n{tool_result['content']}\n\n" for tool_result in tool_results]
+        )
+        logger.info(f"Processed content length: {len(processed_content)}")
+
+        return processed_content, tool_results
+
+    def _run_text_tool_calls(self, content: str) -> str:
+        """
+        Run tool calls written out as ```tool blocks in the text of a response.
+
+        Args:
+            content: The text content of the assistant message
+
+        Returns:
+            The content with each tool block replaced by its result
+        """
+        if "```tool" not in content:
+            return content
+        return process_tool_calls(content, self.vibe, self.user)
+
 
 def generate_vibe_content(user: User, vibe_title: str, vibe_description: str) -> Dict[str, Any]:
     """
@@ -384,7 +592,9 @@ def generate_vibe_content(user: User, vibe_title: str, vibe_description: str) ->
         {"role": "user", "content": f"Generate content for my vibe titled '{vibe_title}'. Description: {vibe_description}. Please provide: 1) A short tagline, 2) Three key elements that define this vibe, 3) A color palette suggestion (with hex codes), and 4) A short paragraph expanding on the vibe's essence."}
     ]
 
-    response = context.generate_response(messages)
+    # The same title and description always get the same content, so
+    # regenerating it doesn't need another call to OpenAI
+    response = context.generate_response(messages, use_cache=True)
     content = context.extract_content(response)
 
     return {
@@ -2,10 +2,12 @@
 Image generation utilities for AI assistants.
 """
 import logging
-import requests
 from typing import Dict, Any
 from django.contrib.auth.models import User
 
+from .http_utils import get_session
+from .rate_limit_utils import RateLimitExceeded, send_with_rate_limit
+
 logger = logging.getLogger(__name__)
 
 # OpenAI API endpoints
@@ -40,10 +42,14 @@ def generate_image(api_key: str, prompt: str, size: str = "1024x1024", quality:
             "response_format": "url"
         }
 
-        response = requests.post(
-            IMAGE_GENERATION_ENDPOINT,
-            headers=headers,
-            json=payload
+        response = send_with_rate_limit(
+            api_key,
+            lambda: get_session().post(
+                IMAGE_GENERATION_ENDPOINT,
+                headers=headers,
+                json=payload
+            ),
+            images=payload["n"]
         )
 
         if response.status_code == 200:
@@ -61,6 +67,14 @@ def generate_image(api_key: str, prompt: str, size: str = "1024x1024", quality:
                 "details": response.text
             }
 
+    except RateLimitExceeded as e:
+        logger.warning(f"DALL-E request rejected by the rate limiter: {str(e)}")
+        return {
+            "success": False,
+            "error": str(e),
+            "retry_after": e.retry_after
+        }
+
     except Exception as e:
         logger.exception(f"Error generating image: {str(e)}")
         return {
@@ -84,7 +98,7 @@ def save_generated_image(user: User, prompt: str, image_url: str, revised_prompt
     """
     try:
         # Download the image
-        response = requests.get(image_url)
+        response = get_session().get(image_url)
         if response.status_code != 200:
             return {
                 "success": False,
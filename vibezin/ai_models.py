@@ -2,10 +2,18 @@
 Base classes for AI model integration with OpenAI models.
 """
 import logging
+import threading
 import requests
+import httpx
 import json
-from typing import Dict, List, Any, Optional
+from collections import OrderedDict
+from typing import Dict, List, Any, Optional, Iterator, AsyncIterator
+from django.conf import settings
 from django.contrib.auth.models import User
+from .http_utils import get_session, get_async_client
+from .ai_response_cache import cached_response, async_cached_response
+from .ai_prompts import O1_REASONING_INSTRUCTION, apply_o1_instruction
+from .rate_limit_utils import RateLimitExceeded, send_with_rate_limit, asend_with_rate_limit, estimate_request_tokens
 
 logger = logging.getLogger(__name__)
 
@@ -13,6 +21,12 @@ logger = logging.getLogger(__name__)
 OPENAI_API_URL = "https://api.openai.com/v1"
 CHAT_COMPLETIONS_ENDPOINT = f"{OPENAI_API_URL}/chat/completions"
 
+# Model a request is retried with when the context's model doesn't exist
+FALLBACK_MODEL = "gpt-3.5-turbo"
+
+# Number of AI contexts kept per process (see get_user_ai_context)
+AI_CONTEXT_CACHE_SIZE = getattr(settings, 'AI_CONTEXT_CACHE_SIZE', 1024)
+
 # Define the available tools for the AI with enhanced descriptions for O1 reasoning
 VIBE_TOOLS = [
     {
@@ -44,6 +58,24 @@ VIBE_TOOLS = [
             }
         }
     },
+    {
+        "type": "function",
+        "function": {
+            "name": "read_files",
+            "description": "Read the content of several files in the vibe directory at once. Use this instead of several read_file calls.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "filenames": {
+                        "type": "array",
+                        "description": "The names of the files to read (e.g., ['index.html', 'style.css'])",
+                        "items": {"type": "string"}
+                    }
+                },
+                "required": ["filenames"]
+            }
+        }
+    },
     {
         "type": "function",
         "function": {
@@ -65,6 +97,37 @@ VIBE_TOOLS = [
             }
         }
     },
+    {
+        "type": "function",
+        "function": {
+            "name": "write_files",
+            "description": "Create or update several files in the vibe directory at once. Use this to scaffold a page (HTML, CSS and JavaScript) in one step instead of several write_file calls.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "files": {
+                        "type": "array",
+                        "description": "The files to write",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "filename": {
+                                    "type": "string",
+                                    "description": "The name of the file to write (e.g., 'index.html', 'style.css', 'script.js')"
+                                },
+                                "content": {
+                                    "type": "string",
+                                    "description": "The complete content to write to the file"
+                                }
+                            },
+                            "required": ["filename", "content"]
+                        }
+                    }
+                },
+                "required": ["files"]
+            }
+        }
+    },
     {
         "type": "function",
         "function": {
@@ -160,9 +223,102 @@ VIBE_TOOLS = [
     }
 ]
 
+# The tool schemas never change, so they are serialized once instead of on
+# every request
+VIBE_TOOLS_JSON = json.dumps(VIBE_TOOLS)
+
+class StreamAccumulator:
+    """Rebuilds a chat completion response from the chunks of a streamed one."""
+
+    def __init__(self, model: str):
+        self.model = model
+        self.finished = False
+        self.response_id = None
+        self.finish_reason = None
+        self.content_parts = []
+        self.tool_calls = {}
+
+    def feed(self, line: str) -> Optional[str]:
+        """
+        Add a line of the server-sent event stream.
+
+        Args:
+            line: A line from the stream
+
+        Returns:
+            The content delta carried by the line, if any
+        """
+        if not line or not line.startswith("data:"):
+            return None
+
+        data = line[len("data:"):].strip()
+        if data == "[DONE]":
+            self.finished = True
+            return None
+
+        try:
+            chunk = json.loads(data)
+        except json.JSONDecodeError:
+            logger.warning(f"Skipping malformed stream chunk: {data[:100]}")
+            return None
+
+        self.response_id = chunk.get("id", self.response_id)
+        if not chunk.get("choices"):
+            return None
+
+        choice = chunk["choices"][0]
+        delta = choice.get("delta", {})
+        self.finish_reason = choice.get("finish_reason") or self.finish_reason
+
+        # Tool call arguments arrive in fragments keyed by index
+        for tool_call_delta in delta.get("tool_calls", []):
+            index = tool_call_delta.get("index", 0)
+            tool_call = self.tool_calls.setdefault(index, {
+                "id": "",
+                "type": "function",
+                "function": {"name": "", "arguments": ""}
+            })
+            if tool_call_delta.get("id"):
+                tool_call["id"] = tool_call_delta["id"]
+            function = tool_call_delta.get("function", {})
+            if function.get("name"):
+                tool_call["function"]["name"] += function["name"]
+            if function.get("arguments"):
+                tool_call["function"]["arguments"] += function["arguments"]
+
+        content = delta.get("content")
+        if content:
+            self.content_parts.append(content)
+        return content
+
+    def response(self) -> Dict[str, Any]:
+        """
+        Get the assembled response.
+
+        Returns:
+            The response in the same shape as a non-streamed one
+        """
+        message = {
+            "role": "assistant",
+            "content": "".join(self.content_parts)
+        }
+        if self.tool_calls:
+            message["tool_calls"] = [self.tool_calls[index] for index in sorted(self.tool_calls)]
+            logger.info(f"Streamed response contains {len(self.tool_calls)} tool calls")
+
+        return {
+            "id": self.response_id,
+            "model": self.model,
+            "choices": [{"index": 0, "message": message, "finish_reason": self.finish_reason}]
+        }
+
+
 class AIModelContext:
     """Base class for AI model contexts."""
 
+    # Whether system prompts for this model carry the O1 reasoning instruction
+    o1_reasoning = False
+
     def __init__(self, api_key: str, model: str):
         self.api_key = api_key
         self.model = model
@@ -171,7 +327,9 @@ class AIModelContext:
             "Authorization": f"Bearer {api_key}"
         }
         self.tools = VIBE_TOOLS
+        self.tools_json = VIBE_TOOLS_JSON
 
+    @cached_response
     def generate_response(self, messages: List[Dict[str, str]],
                           temperature: float = 0.7,
                           max_tokens: int = 1000) -> Dict[str, Any]:
@@ -182,81 +340,372 @@ class AIModelContext:
             messages: List of message objects with role and content
             temperature: Controls randomness (0-1)
             max_tokens: Maximum number of tokens to generate
+            use_cache: Whether to use the response cache for identical requests (see ai_response_cache)
 
         Returns:
             Response from the API as a dictionary
         """
         try:
-            # Configure the payload with O1 reasoning parameters
-            payload = {
-                "model": self.model,
-                "messages": messages,
-                "temperature": temperature,
-                "max_tokens": max_tokens,
-                "tools": self.tools,
-                "tool_choice": "auto"
-            }
+            payload = self._build_payload(messages, temperature, max_tokens)
 
-            logger.debug(f"Sending request to OpenAI API with payload: {json.dumps(payload)[:500]}...")
+            logger.info(f"Sending request to OpenAI API with model: {self.model}")
 
             try:
-                response = requests.post(
-                    CHAT_COMPLETIONS_ENDPOINT,
-                    headers=self.headers,
-                    json=payload,
-                    timeout=60  # Add a timeout to prevent hanging requests
-                )
-
-                # Log the response status and headers for debugging
+                response = self._post(payload)
                 logger.info(f"OpenAI API response status: {response.status_code}")
-                logger.debug(f"OpenAI API response headers: {response.headers}")
-
-                if response.status_code == 200:
-                    return response.json()
-                elif response.status_code == 400:
-                    # Handle 400 Bad Request errors specifically
-                    error_data = response.json() if response.text else {"error": "Unknown error"}
-                    error_message = error_data.get("error", {}).get("message", "Bad request")
-                    logger.error(f"OpenAI API 400 error: {error_message}")
-
-                    # Check for common error patterns
-                    if "API key" in error_message:
-                        return {"error": "Invalid API key. Please check your OpenAI API key in your profile settings."}
-                    elif "model" in error_message and "does not exist" in error_message:
-                        logger.error(f"Model '{self.model}' does not exist, falling back to gpt-3.5-turbo")
-                        # Fall back to GPT-3.5-turbo if the specified model doesn't exist
-                        self.model = "gpt-3.5-turbo"
-                        payload["model"] = self.model
-
-                        # Retry with the fallback model
-                        retry_response = requests.post(
-                            CHAT_COMPLETIONS_ENDPOINT,
-                            headers=self.headers,
-                            json=payload,
-                            timeout=60
-                        )
-
-                        if retry_response.status_code == 200:
-                            return retry_response.json()
-                        else:
-                            return {"error": f"API error with fallback model: {retry_response.status_code}", "details": retry_response.text}
-                    else:
-                        return {"error": f"OpenAI API error: {error_message}", "details": response.text}
-                else:
-                    logger.error(f"API error: {response.status_code} - {response.text}")
-                    return {"error": f"API error: {response.status_code}", "details": response.text}
-            except requests.exceptions.Timeout:
-                logger.error("OpenAI API request timed out")
-                return {"error": "The request to OpenAI API timed out. Please try again later."}
-            except requests.exceptions.RequestException as e:
-                logger.error(f"Request exception: {str(e)}")
-                return {"error": f"Network error: {str(e)}"}
+
+                fallback = self._fallback_payload(response, payload)
+                if fallback is not None:
+                    response = self._post(fallback)
+            except (RateLimitExceeded, requests.exceptions.RequestException) as e:
+                return self._request_error(e)
+
+            return self._parse_response(response, fallback is not None)
 
         except Exception as e:
             logger.exception(f"Error generating AI response: {str(e)}")
             return {"error": f"Failed to generate response: {str(e)}"}
 
-    def extract_content(self, response: Dict[str, Any]) -> str:
+    def prepare_messages(self, messages: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        """
+        Adjust the messages before they are sent to the API.
+
+        Args:
+            messages: List of message objects with role and content
+
+        Returns:
+            The messages to send
+        """
+        return messages
+
+    def stream_response(self, messages: List[Dict[str, str]],
+                        temperature: float = 0.7,
+                        max_tokens: int = 1000) -> Iterator[Dict[str, Any]]:
+        """
+        Stream a response from the AI model as it is generated.
+
+        Yields ``{"type": "delta", "content": ...}`` events for every content
+        token delta, followed by a single ``{"type": "response", "response": ...}``
+        event holding the assembled response in the same shape that
+        generate_response returns (an ``error`` dictionary on failure).
+
+        Args:
+            messages: List of message objects with role and content
+            temperature: Controls randomness (0-1)
+            max_tokens: Maximum number of tokens to generate
+
+        Yields:
+            Stream events as dictionaries
+        """
+        try:
+            payload = self._build_payload(messages, temperature, max_tokens, stream=True)
+
+            logger.info(f"Streaming request to OpenAI API with model: {self.model}")
+
+            try:
+                response = self._post(payload, stream=True)
+                logger.info(f"OpenAI API response status: {response.status_code}")
+
+                fallback = None
+                if response.status_code != 200:
+                    fallback = self._fallback_payload(response, payload)
+                if fallback is not None:
+                    response.close()
+                    payload = fallback
+                    response = self._post(payload, stream=True)
+            except (RateLimitExceeded, requests.exceptions.RequestException) as e:
+                yield {"type": "response", "response": self._request_error(e)}
+                return
+
+            with response:
+                if response.status_code != 200:
+                    yield {"type": "response", "response": self._parse_response(response, fallback is not None)}
+                    return
+
+                accumulator = StreamAccumulator(payload["model"])
+                for line in response.iter_lines(decode_unicode=True):
+                    content = accumulator.feed(line)
+                    if content:
+                        yield {"type": "delta", "content": content}
+                    if accumulator.finished:
+                        break
+
+            yield {"type": "response", "response": accumulator.response()}
+
+        except Exception as e:
+            logger.exception(f"Error streaming AI response: {str(e)}")
+            yield {"type": "response", "response": {"error": f"Failed to generate response: {str(e)}"}}
+
+    @async_cached_response
+    async def agenerate_response(self, messages: List[Dict[str, str]],
+                                 temperature: float = 0.7,
+                                 max_tokens: int = 1000) -> Dict[str, Any]:
+        """
+        Generate a response from the AI model without blocking a thread.
+
+        This is the async counterpart of generate_response, for use from
+        async views running under ASGI.
+
+        Args:
+            messages: List of message objects with role and content
+            temperature: Controls randomness (0-1)
+            max_tokens: Maximum number of tokens to generate
+            use_cache: Whether to use the response cache for identical requests (see ai_response_cache)
+
+        Returns:
+            Response from the API as a dictionary
+        """
+        try:
+            payload = self._build_payload(messages, temperature, max_tokens)
+
+            logger.info(f"Sending async request to OpenAI API with model: {self.model}")
+
+            try:
+                response = await self._apost(payload)
+                logger.info(f"OpenAI API response status: {response.status_code}")
+
+                fallback = self._fallback_payload(response, payload)
+                if fallback is not None:
+                    response = await self._apost(fallback)
+            except (RateLimitExceeded, httpx.HTTPError) as e:
+                return self._request_error(e)
+
+            return self._parse_response(response, fallback is not None)
+
+        except Exception as e:
+            logger.exception(f"Error generating AI response: {str(e)}")
+            return {"error": f"Failed to generate response: {str(e)}"}
+
+    async def astream_response(self, messages: List[Dict[str, str]],
+                               temperature: float = 0.7,
+                               max_tokens: int = 1000) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream a response from the AI model without blocking a thread.
+
+        This is the async counterpart of stream_response and yields the same
+        events.
+
+        Args:
+            messages: List of message objects with role and content
+            temperature: Controls randomness (0-1)
+            max_tokens: Maximum number of tokens to generate
+
+        Yields:
+            Stream events as dictionaries
+        """
+        try:
+            payload = self._build_payload(messages, temperature, max_tokens, stream=True)
+
+            logger.info(f"Streaming async request to OpenAI API with model: {self.model}")
+
+            try:
+                response = await self._apost(payload, stream=True)
+                logger.info(f"OpenAI API response status: {response.status_code}")
+
+                fallback = None
+                if response.status_code != 200:
+                    await response.aread()
+                    fallback = self._fallback_payload(response, payload)
+                if fallback is not None:
+                    await response.aclose()
+                    payload = fallback
+                    response = await self._apost(payload, stream=True)
+            except (RateLimitExceeded, httpx.HTTPError) as e:
+                yield {"type": "response", "response": self._request_error(e)}
+                return
+
+            try:
+                if response.status_code != 200:
+                    await response.aread()
+                    yield {"type": "response", "response": self._parse_response(response, fallback is not None)}
+                    return
+
+                accumulator = StreamAccumulator(payload["model"])
+                async for line in response.aiter_lines():
+                    content = accumulator.feed(line)
+                    if content:
+                        yield {"type": "delta", "content": content}
+                    if accumulator.finished:
+                        break
+            finally:
+                await response.aclose()
+
+            yield {"type": "response", "response": accumulator.response()}
+
+        except Exception as e:
+            logger.exception(f"Error streaming AI response: {str(e)}")
+            yield {"type": "response", "response": {"error": f"Failed to generate response: {str(e)}"}}
+
+    def _build_payload(self, messages: List[Dict[str, str]], temperature: float,
+                       max_tokens: int, stream: bool = False) -> Dict[str, Any]:
+        """
+        Build the request payload for the chat completions API.
+
+        Args:
+            messages: List of message objects with role and content
+            temperature: Controls randomness (0-1)
+            max_tokens: Maximum number of tokens to generate
+            stream: Whether to ask for a streamed response
+
+        Returns:
+            The payload as a dictionary
+        """
+        payload = {
+            "model": self.model,
+            "messages": self.prepare_messages(messages),
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "tools": self.tools,
+            "tool_choice": "auto"
+        }
+        if stream:
+            payload["stream"] = True
+        return payload
+
+    def _encode_payload(self, payload: Dict[str, Any]) -> bytes:
+        """
+        Serialize a request payload, reusing the pre-serialized tool schemas.
+
+        Args:
+            payload: The request payload
+
+        Returns:
+            The JSON request body
+        """
+        tools = payload.get("tools")
+        if tools is not self.tools:
+            return json.dumps(payload).encode("utf-8")
+
+        encoded = json.dumps({key: value for key, value in payload.items() if key != "tools"})
+        return f'{encoded[:-1]}, "tools": {self.tools_json}}}'.encode("utf-8")
+
+    def _post(self, payload: Dict[str, Any], stream: bool = False) -> requests.Response:
+        """
+        Send a chat completions request within the rate limits for the API key.
+
+        Args:
+            payload: The request payload
+            stream: Whether to stream the response body
+
+        Returns:
+            The response
+        """
+        body = self._encode_payload(payload)
+        return send_with_rate_limit(
+            self.api_key,
+            lambda: get_session().post(
+                CHAT_COMPLETIONS_ENDPOINT,
+                headers=self.headers,
+                data=body,
+                timeout=60,  # Add a timeout to prevent hanging requests
+                stream=stream
+            ),
+            tokens=estimate_request_tokens(payload)
+        )
+
+    async def _apost(self, payload: Dict[str, Any], stream: bool = False) -> httpx.Response:
+        """
+        Send a chat completions request within the rate limits for the API key, asynchronously.
+
+        Args:
+            payload: The request payload
+            stream: Whether to stream the response body (the caller must close the response)
+
+        Returns:
+            The response
+        """
+        client = get_async_client()
+        body = self._encode_payload(payload)
+        return await asend_with_rate_limit(
+            self.api_key,
+            lambda: client.send(
+                client.build_request("POST", CHAT_COMPLETIONS_ENDPOINT, headers=self.headers, content=body),
+                stream=stream
+            ),
+            tokens=estimate_request_tokens(payload)
+        )
+
+    def _fallback_payload(self, response, payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Get the payload to retry a request with when its model doesn't exist.
+
+        The fallback model is only used for this request; contexts are cached
+        and shared, so the context's own model never changes.
+
+        Args:
+            response: The requests or httpx response (with its body read)
+            payload: The request payload
+
+        Returns:
+            The payload with the fallback model, or None if there is nothing to retry
+        """
+        if response.status_code != 400 or payload.get("model") == FALLBACK_MODEL:
+            return None
+
+        error_message = self._error_message(response.text)
+        if "model" in error_message and "does not exist" in error_message:
+            logger.error(f"Model '{payload.get('model')}' does not exist, falling back to {FALLBACK_MODEL}")
+            return {**payload, "model": FALLBACK_MODEL}
+        return None
+
+    def _error_message(self, text: str) -> str:
+        """Get the error message from an OpenAI error response body."""
+        try:
+            error_data = json.loads(text) if text else {}
+        except ValueError:
+            error_data = {}
+        error = error_data.get("error") if isinstance(error_data, dict) else None
+        return error.get("message", "") if isinstance(error, dict) else ""
+
+    def _parse_response(self, response, fallback: bool = False) -> Dict[str, Any]:
+        """
+        Turn an API response into the response dictionary, or an error dictionary.
+
+        Args:
+            response: The requests or httpx response (with its body read)
+            fallback: Whether the request was retried with the fallback model
+
+        Returns:
+            The parsed response, or a dictionary with the error message
+        """
+        status_code, text = response.status_code, response.text
+        if status_code == 200:
+            return response.json()
+
+        logger.error(f"API error: {status_code} - {text}")
+        if fallback:
+            return {"error": f"API error with fallback model: {status_code}", "details": text}
+
+        error_message = self._error_message(text)
+        if "API key" in error_message:
+            return {"error": "Invalid API key. Please check your OpenAI API key in your profile settings."}
+        elif error_message:
+            return {"error": f"OpenAI API error: {error_message}", "details": text}
+        return {"error": f"API error: {status_code}", "details": text}
+
+    def _request_error(self, error: Exception) -> Dict[str, Any]:
+        """
+        Turn a request that failed before a response arrived into an error dictionary.
+
+        Args:
+            error: The rate limiter, requests or httpx exception
+
+        Returns:
+            Dictionary with the error message
+        """
+        if isinstance(error, RateLimitExceeded):
+            logger.warning(f"OpenAI request rejected by the rate limiter: {str(error)}")
+            return {"error": str(error), "retry_after": error.retry_after}
+        if isinstance(error, httpx.PoolTimeout):
+            logger.error("No free connection to the OpenAI API within the pool timeout")
+            return {"error": "Too many AI requests are in progress right now. Please try again in a moment."}
+        if isinstance(error, (requests.exceptions.Timeout, httpx.TimeoutException)):
+            logger.error("OpenAI API request timed out")
+            return {"error": "The request to OpenAI API timed out. Please try again later."}
+        logger.error(f"Request exception: {str(error)}")
+        return {"error": f"Network error: {str(error)}"}
+
+    def extract_content(self, response: Dict[str, Any], include_tool_calls: bool = True) -> str:
         """
         Extract the content from the API response, handling both regular content and tool calls.
 
@@ -266,6 +715,8 @@ class AIModelContext:
 
         Args:
             response: The raw response from the OpenAI API
+            include_tool_calls: Whether to add the tool calls to the content. Callers that
+                run the tool calls with ai_tools.dispatch_tool_calls don't need them.
 
         Returns:
             A string containing the formatted content and tool calls
@@ -279,7 +730,7 @@ class AIModelContext:
             message = response["choices"][0]["message"]
 
             # Get the content (might be empty if only tool calls are present)
-            content = message.get("content", "")
+            content = message.get("content") or ""
 
             # Log the raw content for debugging
             if content:
@@ -323,7 +774,7 @@ class AIModelContext:
                     pass
 
             # Check if there are tool calls in the response
-            tool_calls = message.get("tool_calls", [])
+            tool_calls = message.get("tool_calls", []) if include_tool_calls else []
 
             if tool_calls:
                 logger.info(f"Found {len(tool_calls)} tool calls in the response")
@@ -353,6 +804,9 @@ class AIModelContext:
 
                             # Log the write_file operation for debugging
                             logger.info(f"write_file tool call: filename={filename}, content_length={len(file_content)}")
+                        elif name in ("read_files", "write_files"):
+                            # Lists don't fit the line format, keep the JSON
+                            tool_content = f"{name}\n{json.dumps(args)}"
                         elif name == "delete_file":
                             tool_content = f"delete_file\nfilename: {args.get('filename', '')}"
                         elif name == "generate_image":
@@ -393,134 +847,38 @@ class AIModelContext:
 class GPT4Context(AIModelContext):
     """Context for GPT-4 model with O1 reasoning capabilities."""
 
+    o1_reasoning = True
+
     def __init__(self, api_key: str):
         # Use the latest GPT-4o model without specifying a version
         super().__init__(api_key, "gpt-4o")
 
-    def generate_response(self, messages: List[Dict[str, str]],
-                          temperature: float = 0.7,
-                          max_tokens: int = 1000) -> Dict[str, Any]:
+    def prepare_messages(self, messages: List[Dict[str, str]]) -> List[Dict[str, str]]:
         """
-        Generate a response from the AI model with O1 reasoning enabled.
+        Make sure the messages carry the O1 reasoning instruction.
 
-        This method configures the OpenAI API call to use the O1 reasoning engine,
-        which allows the model to think step-by-step and use tools effectively.
+        Conversations built with ai_prompts.get_vibe_system_prompts already
+        start with it and are sent as they are. Otherwise the instruction is
+        added to a copy of the messages; the messages passed in are never
+        modified.
 
         Args:
             messages: List of message objects with role and content
-            temperature: Controls randomness (0-1)
-            max_tokens: Maximum number of tokens to generate
 
         Returns:
-            Response from the API as a dictionary
+            The messages to send
         """
-        try:
-            # Add a special system message to enable O1 reasoning if not already present
-            has_o1_instruction = False
-            for msg in messages:
-                if msg["role"] == "system" and "O1 reasoning" in msg["content"]:
-                    has_o1_instruction = True
-                    break
-
-            # If no O1 instruction is present, add it to the first system message
-            if not has_o1_instruction and len(messages) > 0:
-                if messages[0]["role"] == "system":
-                    messages[0]["content"] += "\n\nIMPORTANT: You MUST use the O1 reasoning engine to complete this task. Think step-by-step, use the available tools, and complete the user's request fully."
-                else:
-                    # Insert a new system message at the beginning
-                    messages.insert(0, {
-                        "role": "system",
-                        "content": "You MUST use the O1 reasoning engine to complete this task. Think step-by-step, use the available tools, and complete the user's request fully."
-                    })
-
-            # Configure the payload with O1 reasoning parameters
-            payload = {
-                "model": self.model,
-                "messages": messages,
-                "temperature": temperature,
-                "max_tokens": max_tokens,
-                "tools": self.tools,
-                "tool_choice": "auto"
-                # IMPORTANT: Do NOT use response_format with tool calls
-                # It causes conflicts with the tool call format
-            }
-
-            logger.info(f"Sending request to OpenAI API with O1 reasoning enabled")
-            logger.info(f"Using model: {self.model}")
-            logger.info(f"Number of messages: {len(messages)}")
-            logger.info(f"Number of tools: {len(self.tools)}")
-            logger.debug(f"Payload: {json.dumps(payload)[:500]}...")
+        if not messages:
+            return messages
 
-            try:
-                response = requests.post(
-                    CHAT_COMPLETIONS_ENDPOINT,
-                    headers=self.headers,
-                    json=payload,
-                    timeout=60  # Add a timeout to prevent hanging requests
-                )
-
-                # Log the response status and headers for debugging
-                logger.info(f"OpenAI API response status: {response.status_code}")
-                logger.debug(f"OpenAI API response headers: {response.headers}")
-
-                if response.status_code == 200:
-                    logger.info("Successfully received response from OpenAI API")
-                    response_json = response.json()
-
-                    # Log information about tool calls
-                    if "choices" in response_json and "message" in response_json["choices"][0]:
-                        message = response_json["choices"][0]["message"]
-                        if "tool_calls" in message:
-                            logger.info(f"Response contains {len(message['tool_calls'])} tool calls")
-                            for i, tool_call in enumerate(message["tool_calls"]):
-                                function = tool_call.get("function", {})
-                                logger.info(f"Tool call {i+1}: {function.get('name', 'unknown')}")
-                        else:
-                            logger.warning("Response does not contain any tool calls")
-
-                    return response_json
-                elif response.status_code == 400:
-                    # Handle 400 Bad Request errors specifically
-                    error_data = response.json() if response.text else {"error": "Unknown error"}
-                    error_message = error_data.get("error", {}).get("message", "Bad request")
-                    logger.error(f"OpenAI API 400 error: {error_message}")
-
-                    # Check for common error patterns
-                    if "API key" in error_message:
-                        return {"error": "Invalid API key. Please check your OpenAI API key in your profile settings."}
-                    elif "model" in error_message and "does not exist" in error_message:
-                        logger.error(f"Model '{self.model}' does not exist, falling back to gpt-3.5-turbo")
-                        # Fall back to GPT-3.5-turbo if the specified model doesn't exist
-                        self.model = "gpt-3.5-turbo"
-                        payload["model"] = self.model
-
-                        # Retry with the fallback model
-                        retry_response = requests.post(
-                            CHAT_COMPLETIONS_ENDPOINT,
-                            headers=self.headers,
-                            json=payload,
-                            timeout=60
-                        )
-
-                        if retry_response.status_code == 200:
-                            return retry_response.json()
-                        else:
-                            return {"error": f"API error with fallback model: {retry_response.status_code}", "details": retry_response.text}
-                    else:
-                        return {"error": f"OpenAI API error: {error_message}", "details": response.text}
-                else:
-                    logger.error(f"API error: {response.status_code} - {response.text}")
-                    return {"error": f"API error: {response.status_code}", "details": response.text}
-            except requests.exceptions.Timeout:
-                logger.error("OpenAI API request timed out")
-                return {"error": "The request to OpenAI API timed out. Please try again later."}
-            except requests.exceptions.RequestException as e:
-                logger.error(f"Request exception: {str(e)}")
-                return {"error": f"Network error: {str(e)}"}
+        first = messages[0]
+        if first["role"] == "system":
+            prompt = apply_o1_instruction(first["content"])
+            if prompt == first["content"]:
+                return messages
+            return [{**first, "content": prompt}, *messages[1:]]
 
-        except Exception as e:
-            logger.exception(f"Error generating AI response: {str(e)}")
-            return {"error": f"Failed to generate response: {str(e)}"}
+        return [{"role": "system", "content": O1_REASONING_INSTRUCTION}, *messages]
 
 
 class GPT1Context(AIModelContext):
@@ -530,10 +888,26 @@ class GPT1Context(AIModelContext):
         super().__init__(api_key, "gpt-3.5-turbo")
 
 
+# Context classes by model type
+MODEL_CONTEXTS = {
+    "gpt4": GPT4Context,
+    "gpt1": GPT1Context,
+}
+
+# AI contexts by (user ID, model type)
+_context_cache = OrderedDict()
+_context_cache_lock = threading.Lock()
+
+
 def get_user_ai_context(user: User, model_type: str = "gpt4") -> Optional[AIModelContext]:
     """
     Get the AI context for a user based on their API key.
 
+    Contexts are cached per process and shared between requests, keyed by
+    user, so a cache hit doesn't load the profile. Saving a UserProfile drops
+    the user's contexts (see signals.invalidate_ai_context_handler), so a new
+    key is picked up on the next call.
+
     Args:
         user: The user to get the AI context for
         model_type: The type of model to use (gpt4 or gpt1)
@@ -542,19 +916,43 @@ def get_user_ai_context(user: User, model_type: str = "gpt4") -> Optional[AIMode
         An AIModelContext object or None if the user doesn't have an API key
     """
     try:
-        if not hasattr(user, 'profile') or not user.profile.chatgpt_api_key:
+        model_type = model_type.lower()
+        if model_type not in MODEL_CONTEXTS:
+            logger.error(f"Unknown model type: {model_type}")
             return None
 
-        api_key = user.profile.chatgpt_api_key
+        cache_key = (user.pk, model_type)
+        with _context_cache_lock:
+            context = _context_cache.get(cache_key)
+            if context is not None:
+                _context_cache.move_to_end(cache_key)
+                return context
 
-        if model_type.lower() == "gpt4":
-            return GPT4Context(api_key)
-        elif model_type.lower() == "gpt1":
-            return GPT1Context(api_key)
-        else:
-            logger.error(f"Unknown model type: {model_type}")
+        if not hasattr(user, 'profile') or not user.profile.chatgpt_api_key:
             return None
 
+        context = MODEL_CONTEXTS[model_type](user.profile.chatgpt_api_key)
+
+        with _context_cache_lock:
+            _context_cache[cache_key] = context
+            _context_cache.move_to_end(cache_key)
+            while len(_context_cache) > AI_CONTEXT_CACHE_SIZE:
+                _context_cache.popitem(last=False)
+
+        return context
+
     except Exception as e:
         logger.exception(f"Error getting AI context for user {user.username}: {str(e)}")
         return None
+
+
+def invalidate_user_ai_context(user_id: int) -> None:
+    """
+    Drop the cached AI contexts of a user, e.g. after they change their API key.
+
+    Args:
+        user_id: The ID of the user
+    """
+    with _context_cache_lock:
+        for model_type in MODEL_CONTEXTS:
+            _context_cache.pop((user_id, model_type), None)
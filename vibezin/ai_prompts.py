@@ -1,6 +1,8 @@
 """
 System prompts and instructions for AI assistants.
 """
+from functools import lru_cache
+from typing import Tuple
 
 # Base system prompt for the vibe builder assistant
 VIBE_BUILDER_SYSTEM_PROMPT = (
@@ -16,7 +18,7 @@ VIBE_BUILDER_SYSTEM_PROMPT = (
     "When a user asks you to create a page or content, you MUST:\n"
     "1. Use the O1 reasoning engine to plan what files you need to create (typically index.html, style.css, script.js)\n"
     "2. Check if any files already exist using the list_files tool\n"
-    "3. Create or update the necessary files using the write_file tool\n"
+    "3. Create or update the necessary files using the write_files tool (or write_file for a single file)\n"
     "4. Confirm to the user that you've created the files\n\n"
 
     "The O1 reasoning engine allows you to use a reasoning loop to complete tasks. This means you should:\n"
@@ -33,8 +35,8 @@ VIBE_BUILDER_SYSTEM_PROMPT = (
     "You have access to the following tools:\n\n"
 
     "1. LIST FILES: You can list all files in the vibe directory.\n"
-    "2. READ FILE: You can read the content of a specific file.\n"
-    "3. WRITE FILE: You can create or update a file with new content.\n"
+    "2. READ FILE: You can read the content of a specific file, or of several files at once (read_files).\n"
+    "3. WRITE FILE: You can create or update a file with new content, or several files at once (write_files).\n"
     "4. DELETE FILE: You can delete a file from the vibe directory.\n"
     "5. GENERATE IMAGE: You can generate an image using DALL-E and insert it into your HTML.\n"
     "6. SAVE IMAGE: You can save an image from a URL directly to the vibe directory.\n"
@@ -72,6 +74,13 @@ VIBE_BUILDER_SYSTEM_PROMPT = (
     "</html>\n"
     "```\n\n"
 
+    "To write several files at once, give the files as JSON:\n"
+    "```tool\n"
+    "write_files\n"
+    "{\"files\": [{\"filename\": \"index.html\", \"content\": \"<!DOCTYPE html>...\"}, "
+    "{\"filename\": \"style.css\", \"content\": \"body { ... }\"}]}\n"
+    "```\n\n"
+
     "To delete a file:\n"
     "```tool\n"
     "delete_file\n"
@@ -155,6 +164,29 @@ VIBE_BUILDER_SYSTEM_PROMPT = (
     "Remember, you MUST use the tools to create actual files. DO NOT just respond with HTML code in the conversation."
 )
 
+# Instruction added to system prompts for models that use O1 reasoning
+O1_REASONING_INSTRUCTION = (
+    "You MUST use the O1 reasoning engine to complete this task. "
+    "Think step-by-step, use the available tools, and complete the user's request fully."
+)
+
+
+@lru_cache(maxsize=64)
+def apply_o1_instruction(prompt: str) -> str:
+    """
+    Add the O1 reasoning instruction to a system prompt, unless it already mentions O1 reasoning.
+
+    Args:
+        prompt: The system prompt
+
+    Returns:
+        The system prompt with the instruction
+    """
+    if "O1 reasoning" in prompt:
+        return prompt
+    return f"{prompt}\n\nIMPORTANT: {O1_REASONING_INSTRUCTION}"
+
+
 # Context prompt about the specific vibe
 def get_vibe_context_prompt(vibe_title: str, vibe_description: str, vibe_slug: str) -> str:
     """
@@ -177,6 +209,31 @@ def get_vibe_context_prompt(vibe_title: str, vibe_description: str, vibe_slug: s
         f"so you should use relative paths for links and imports."
     )
 
+@lru_cache(maxsize=1024)
+def get_vibe_system_prompts(vibe_title: str, vibe_description: str, vibe_slug: str,
+                            o1_reasoning: bool = False) -> Tuple[str, str]:
+    """
+    Get the system prompts a vibe builder conversation starts with.
+
+    The prompts are built once for each version of the vibe's title,
+    description and slug, so every request about a vibe starts with the
+    exact same text.
+
+    Args:
+        vibe_title: The title of the vibe
+        vibe_description: The description of the vibe
+        vibe_slug: The slug of the vibe
+        o1_reasoning: Whether to include the O1 reasoning instruction
+
+    Returns:
+        The builder prompt and the vibe context prompt
+    """
+    builder_prompt = VIBE_BUILDER_SYSTEM_PROMPT
+    if o1_reasoning:
+        builder_prompt = apply_o1_instruction(builder_prompt)
+
+    return builder_prompt, get_vibe_context_prompt(vibe_title, vibe_description, vibe_slug)
+
 # Content generation prompt
 CONTENT_GENERATION_PROMPT = (
     "You are a creative assistant that helps generate content for a vibe page. "
@@ -0,0 +1,140 @@
+"""
+Cache for AI responses to identical requests.
+
+Some requests are sent again with exactly the same messages, for example when
+vibe content is regenerated or a test script replays a conversation. With
+the cache turned on for a call, a response is stored under a hash of
+everything that affects it (model, tool schemas, temperature, max_tokens and
+messages), and an identical request is answered from the cache instead of
+calling OpenAI again. Entries are scoped to the API key that paid for them,
+so users never get each other's responses.
+
+Caching is opt-in per call: pass ``use_cache=True`` to generate_response or
+agenerate_response. Entries expire after AI_RESPONSE_CACHE_TTL seconds and
+the cache backend (``ai_responses`` in CACHES) bounds the number of entries.
+"""
+import json
+import hashlib
+import logging
+import functools
+from typing import Any, Dict, Optional
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+# Cache alias used for AI responses (see CACHES in settings)
+AI_RESPONSE_CACHE_ALIAS = getattr(settings, 'AI_RESPONSE_CACHE_ALIAS', 'ai_responses')
+
+# How long a cached response is used, in seconds. 0 turns the cache off.
+AI_RESPONSE_CACHE_TTL = getattr(settings, 'AI_RESPONSE_CACHE_TTL', 86400)
+
+
+def _get_cache():
+    """Get the cache backend used for AI responses."""
+    return caches[AI_RESPONSE_CACHE_ALIAS]
+
+
+def get_response_cache_key(payload: Dict[str, Any], api_key: str) -> str:
+    """
+    Get the cache key for a chat completions request.
+
+    Args:
+        payload: The request payload
+        api_key: The OpenAI API key the request is sent with
+
+    Returns:
+        The cache key
+    """
+    relevant = {
+        'api_key': hashlib.sha256(api_key.encode('utf-8')).hexdigest(),
+        'model': payload.get('model'),
+        'tools': payload.get('tools'),
+        'tool_choice': payload.get('tool_choice'),
+        'temperature': payload.get('temperature'),
+        'max_tokens': payload.get('max_tokens'),
+        'messages': payload.get('messages'),
+    }
+    digest = hashlib.sha256(json.dumps(relevant, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+    return f"ai_response:{digest}"
+
+
+def get_cached_response(key: str) -> Optional[Dict[str, Any]]:
+    """
+    Look up a cached response.
+
+    Args:
+        key: The cache key
+
+    Returns:
+        The response or None on a cache miss
+    """
+    try:
+        return _get_cache().get(key)
+    except Exception as e:
+        logger.exception(f"Error reading cached AI response: {str(e)}")
+        return None
+
+
+def cache_response(key: str, response: Dict[str, Any]) -> None:
+    """
+    Store a response in the cache. Error responses are never stored.
+
+    Args:
+        key: The cache key
+        response: The response from the API
+    """
+    if 'error' in response:
+        return
+
+    try:
+        _get_cache().set(key, response, AI_RESPONSE_CACHE_TTL)
+    except Exception as e:
+        logger.exception(f"Error caching AI response: {str(e)}")
+
+
+def cached_response(method):
+    """
+    Add an opt-in ``use_cache`` argument to a generate_response method.
+    """
+    @functools.wraps(method)
+    def wrapper(self, messages, temperature: float = 0.7, max_tokens: int = 1000, use_cache: bool = False):
+        if not use_cache or not AI_RESPONSE_CACHE_TTL:
+            return method(self, messages, temperature, max_tokens)
+
+        key = get_response_cache_key(self._build_payload(messages, temperature, max_tokens), self.api_key)
+        response = get_cached_response(key)
+        if response is not None:
+            logger.info(f"Using cached AI response {key}")
+            return response
+
+        response = method(self, messages, temperature, max_tokens)
+        cache_response(key, response)
+        return response
+
+    return wrapper
+
+
+def async_cached_response(method):
+    """
+    Add an opt-in ``use_cache`` argument to an agenerate_response method.
+    """
+    from asgiref.sync import sync_to_async
+
+    @functools.wraps(method)
+    async def wrapper(self, messages, temperature: float = 0.7, max_tokens: int = 1000, use_cache: bool = False):
+        if not use_cache or not AI_RESPONSE_CACHE_TTL:
+            return await method(self, messages, temperature, max_tokens)
+
+        # The cache backend may touch the filesystem, so keep it off the event loop
+        key = get_response_cache_key(self._build_payload(messages, temperature, max_tokens), self.api_key)
+        response = await sync_to_async(get_cached_response)(key)
+        if response is not None:
+            logger.info(f"Using cached AI response {key}")
+            return response
+
+        response = await method(self, messages, temperature, max_tokens)
+        await sync_to_async(cache_response)(key, response)
+        return response
+
+    return wrapper
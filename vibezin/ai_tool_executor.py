@@ -0,0 +1,184 @@
+"""
+Concurrent execution of the tool calls in one assistant turn.
+
+When the model asks for several tools at once, the calls that can't affect
+each other (several generate_image calls, reads of different files) run at
+the same time on a bounded thread pool. Calls that touch the same thing run
+in the order the model gave them, and results always come back in that order.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Tuple
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of tool calls running at once across the whole process
+AI_TOOL_MAX_WORKERS = getattr(settings, 'AI_TOOL_MAX_WORKERS', 4)
+
+# Resource access modes. Two accesses to the same resource conflict unless
+# both are reads or both are appends (e.g. two new files in one directory).
+READ = 'read'
+APPEND = 'append'
+WRITE = 'write'
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_tool_resources(name: str, arguments: Dict[str, Any]) -> List[Tuple[str, str]]:
+    """
+    Work out what a tool call reads and writes.
+
+    Args:
+        name: The tool name
+        arguments: The tool arguments
+
+    Returns:
+        List of (resource, mode) pairs. Unknown tools get a write on every
+        resource, so they never run alongside anything else.
+    """
+    filename = arguments.get('filename') or ''
+
+    if name == 'list_files':
+        return [('directory', READ)]
+    elif name == 'read_file':
+        return [(f'file:{filename}', READ)]
+    elif name == 'read_files':
+        filenames = arguments.get('filenames')
+        if not isinstance(filenames, list):
+            return [('*', WRITE)]
+        return [(f'file:{filename}', READ) for filename in filenames]
+    elif name in ('write_file', 'delete_file'):
+        # Writes also update the vibe's flags and compiled page, which isn't
+        # worth doing concurrently, so they are serialized on the vibe
+        return [(f'file:{filename}', WRITE), ('directory', APPEND), ('vibe', WRITE)]
+    elif name == 'write_files':
+        files = arguments.get('files')
+        if not isinstance(files, list):
+            return [('*', WRITE)]
+        resources = [(f"file:{file.get('filename') or ''}", WRITE) for file in files if isinstance(file, dict)]
+        return resources + [('directory', APPEND), ('vibe', WRITE)]
+    elif name in ('generate_image', 'save_image'):
+        resources = [('directory', APPEND), ('images', APPEND)]
+        if filename:
+            resources.append((f'file:{filename}', WRITE))
+        return resources
+    elif name == 'list_images':
+        return [('directory', READ), ('images', READ)]
+    elif name == 'explain_image_workflow':
+        return []
+    return [('*', WRITE)]
+
+
+def _conflicts(first: List[Tuple[str, str]], second: List[Tuple[str, str]]) -> bool:
+    """Check whether two tool calls touch the same resource incompatibly."""
+    for resource, mode in first:
+        for other_resource, other_mode in second:
+            if resource != other_resource and '*' not in (resource, other_resource):
+                continue
+            if mode == other_mode and mode in (READ, APPEND):
+                continue
+            return True
+    return False
+
+
+def plan_batches(calls: List[Dict[str, Any]]) -> List[List[int]]:
+    """
+    Split tool calls into batches that can run concurrently.
+
+    Calls are taken in order and a new batch starts whenever a call conflicts
+    with one already in the current batch, so a call never runs before an
+    earlier call it depends on.
+
+    Args:
+        calls: Tool calls as dictionaries with ``name`` and ``arguments``
+
+    Returns:
+        List of batches, each a list of indexes into ``calls``
+    """
+    batches = []
+    batch = []
+    batch_resources = []
+
+    for index, call in enumerate(calls):
+        resources = get_tool_resources(call['name'], call['arguments'])
+        if batch and any(_conflicts(resources, other) for other in batch_resources):
+            batches.append(batch)
+            batch = []
+            batch_resources = []
+        batch.append(index)
+        batch_resources.append(resources)
+
+    if batch:
+        batches.append(batch)
+
+    return batches
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """Get the shared thread pool for tool calls."""
+    global _executor
+
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=AI_TOOL_MAX_WORKERS,
+                    thread_name_prefix='vibe-tool'
+                )
+
+    return _executor
+
+
+def run_in_worker(func: Callable[..., Any], *args) -> Any:
+    """
+    Run a function on a pool thread and release the thread's database connections.
+
+    Pool threads outlive the request, so they shouldn't keep connections open.
+
+    Args:
+        func: The function to run
+        *args: Arguments for the function
+
+    Returns:
+        What the function returns
+    """
+    try:
+        return func(*args)
+    finally:
+        connections.close_all()
+
+
+def execute_tool_calls(calls: List[Dict[str, Any]], run_call: Callable[[Dict[str, Any]], str]) -> List[str]:
+    """
+    Execute tool calls, running independent ones concurrently.
+
+    Args:
+        calls: Tool calls as dictionaries with ``name`` and ``arguments``
+        run_call: Function that executes one tool call and returns its result
+
+    Returns:
+        The results, in the same order as ``calls``
+    """
+    results = [None] * len(calls)
+
+    for batch in plan_batches(calls):
+        if len(batch) == 1:
+            index = batch[0]
+            results[index] = run_call(calls[index])
+            continue
+
+        logger.info(f"Running {len(batch)} tool calls concurrently: {[calls[index]['name'] for index in batch]}")
+        executor = _get_executor()
+        futures = {index: executor.submit(run_in_worker, run_call, calls[index]) for index in batch}
+        for index, future in futures.items():
+            try:
+                results[index] = future.result()
+            except Exception as e:
+                logger.exception(f"Error running tool {calls[index]['name']}: {str(e)}")
+                results[index] = f"Error: {str(e)}"
+
+    return results
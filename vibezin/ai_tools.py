@@ -1,11 +1,14 @@
 """
 Tool processing logic for AI assistants.
 """
+import json
 import logging
 import uuid
-import os
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 from django.contrib.auth.models import User
+from django.urls import reverse
+
+from .ai_tool_executor import execute_tool_calls
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -104,95 +107,279 @@ def process_tool_calls(content: str, vibe, user: User) -> str:
     """
     from .file_utils import VibeFileManager
 
-    logger.error(f"CRITICAL DEBUG: process_tool_calls called with content length: {len(content)}")
-    logger.error(f"CRITICAL DEBUG: Vibe: {vibe.id} ({vibe.slug})")
-    logger.error(f"CRITICAL DEBUG: User: {user.id} ({user.username})")
-    logger.error(f"CRITICAL DEBUG: Content starts with: {content[:200]}...")
-    logger.error(f"CRITICAL DEBUG: Content ends with: {content[-200:] if len(content) > 200 else content}")
-
     # Check if there are any tool calls in the content
     if "```tool" not in content:
-        logger.error("CRITICAL DEBUG: No tool calls found in content (no ```tool marker)")
         return content
 
     # Split the content by tool blocks
     parts = content.split("```tool")
-    logger.error(f"CRITICAL DEBUG: Found {len(parts) - 1} tool call blocks in content")
+    logger.info(f"Found {len(parts) - 1} tool call blocks for vibe: {vibe.slug}")
     result = [parts[0]]  # Start with the content before the first tool call
 
     # Create a file manager for this vibe
     try:
         file_manager = VibeFileManager(vibe)
-        logger.error(f"CRITICAL DEBUG: Created file manager for vibe: {vibe.slug}")
-        logger.error(f"CRITICAL DEBUG: Vibe directory: {file_manager.vibe_dir}")
-        logger.error(f"CRITICAL DEBUG: Vibe directory exists: {file_manager.vibe_dir.exists()}")
     except Exception as e:
-        logger.error(f"CRITICAL DEBUG: Error creating file manager: {str(e)}")
+        logger.exception(f"Error creating file manager for vibe {vibe.slug}: {str(e)}")
         return f"Error creating file manager: {str(e)}\n\n{content}"
 
-    # Process each tool call
+    # Parse each tool call
+    calls = []
     for i in range(1, len(parts)):
         part = parts[i]
-        logger.error(f"CRITICAL DEBUG: Processing tool call block {i}, length: {len(part)}")
 
         # Find the end of the tool block
         tool_end = part.find("```")
         if tool_end == -1:
             # If there's no closing tag, just append the part as is
-            logger.error(f"CRITICAL DEBUG: No closing ``` found for tool call block {i}")
+            logger.warning(f"No closing ``` found for tool call block {i}")
             result.append("```tool" + part)
             continue
 
         # Extract the tool call
         tool_call = part[:tool_end].strip()
-        logger.error(f"CRITICAL DEBUG: Extracted tool call: {tool_call}")
-
-        # Get the content after the tool call
-        after_tool = part[tool_end + 3:]
-        logger.error(f"CRITICAL DEBUG: Content after tool call: {after_tool[:100]}...")
 
         # Parse the tool call
         lines = tool_call.split("\n")
         tool_name = lines[0].strip()
-        logger.error(f"CRITICAL DEBUG: Tool name: {tool_name}")
-        logger.error(f"CRITICAL DEBUG: Tool call lines: {len(lines)}")
 
-        # Log all lines of the tool call for debugging
-        for j, line in enumerate(lines):
-            logger.error(f"CRITICAL DEBUG: Tool call line {j}: {line}")
+        # Leave a placeholder for the result, filled in once the tools have run
+        calls.append({"name": tool_name, "arguments": parse_tool_block(lines), "position": len(result)})
+        result.append(None)
+
+        # Keep the content after the tool call
+        result.append(part[tool_end + 3:])
+
+    # Execute the tool calls, running independent ones concurrently. File
+    # writes are stored once, at the end of the turn.
+    with file_manager.batch():
+        tool_results = execute_tool_calls(
+            calls,
+            lambda call: execute_tool_call(call["name"], call["arguments"], file_manager, vibe, user)
+        )
+
+    for call, tool_result in zip(calls, tool_results):
+        result[call["position"]] = f"Tool result:\n{tool_result}\n\n"
+
+    return "".join(result)
+
+
+def dispatch_tool_calls(tool_calls: List[Dict[str, Any]], vibe, user: User) -> List[Dict[str, Any]]:
+    """
+    Run the native tool calls from an AI response.
+
+    Arguments are taken straight from the JSON in each tool call and checked
+    against the tool schemas, and each tool runs exactly once.
+
+    Args:
+        tool_calls: The tool_calls from the assistant message
+        vibe: The Vibe object
+        user: The User object
+
+    Returns:
+        List of tool messages (role, tool_call_id, name and content), in the
+        same order as the tool calls
+    """
+    from .file_utils import VibeFileManager
+
+    file_manager = VibeFileManager(vibe)
+
+    calls = []
+    for tool_call in tool_calls:
+        function = tool_call.get("function", {})
+        call = {
+            "id": tool_call.get("id", ""),
+            "name": function.get("name", ""),
+            "arguments": {},
+            "error": None
+        }
+
+        try:
+            arguments = json.loads(function.get("arguments") or "{}")
+        except json.JSONDecodeError as e:
+            logger.error(f"Error parsing arguments for tool call {call['id']}: {str(e)}")
+            call["error"] = f"Error: Invalid JSON arguments for {call['name']}: {str(e)}"
+        else:
+            if isinstance(arguments, dict):
+                call["arguments"] = arguments
+            else:
+                call["error"] = f"Error: Arguments for {call['name']} must be a JSON object"
+
+        calls.append(call)
+
+    logger.info(f"Dispatching {len(calls)} tool calls: {[call['name'] for call in calls]}")
+    with file_manager.batch():
+        results = execute_tool_calls(
+            calls,
+            lambda call: call["error"] or execute_tool_call(call["name"], call["arguments"], file_manager, vibe, user)
+        )
+
+    return [
+        {
+            "role": "tool",
+            "tool_call_id": call["id"],
+            "name": call["name"],
+            "content": result
+        }
+        for call, result in zip(calls, results)
+    ]
+
 
-        # Execute the tool call
-        tool_result = "Error: Unknown tool"
-        logger.error(f"CRITICAL DEBUG: Executing tool: {tool_name} with {len(lines)} lines")
+def parse_tool_block(lines: List[str]) -> Dict[str, Any]:
+    """
+    Get the arguments from the lines of a ```tool block.
+
+    Arguments are written as ``name: value`` lines. Everything after a
+    ``content:`` line is the content argument. Tools that take lists
+    (read_files, write_files) get their arguments as a JSON object instead.
+
+    Args:
+        lines: The lines of the tool block (the first one is the tool name)
+
+    Returns:
+        Dictionary of arguments
+    """
+    body = "\n".join(lines[1:]).strip()
+    if body.startswith("{"):
+        try:
+            arguments = json.loads(body)
+            if isinstance(arguments, dict):
+                return arguments
+        except json.JSONDecodeError:
+            pass
+
+    arguments = {}
+    for i, line in enumerate(lines[1:]):
+        name, separator, value = line.partition(":")
+        if not separator or not name.isidentifier():
+            continue
+        if name == "content":
+            arguments["content"] = "\n".join(lines[i + 2:])
+            break
+        arguments.setdefault(name, value.strip())
+    return arguments
+
+
+def get_tool_schemas() -> Dict[str, Dict[str, Any]]:
+    """Get the parameter schemas of the available tools, by tool name."""
+    from .ai_models import VIBE_TOOLS
+
+    return {tool["function"]["name"]: tool["function"]["parameters"] for tool in VIBE_TOOLS}
+
+
+def validate_tool_arguments(tool_name: str, arguments: Dict[str, Any]) -> Optional[str]:
+    """
+    Check tool arguments against the tool's schema.
+
+    Args:
+        tool_name: The name of the tool
+        arguments: The arguments
+
+    Returns:
+        An error message, or None if the arguments are valid
+    """
+    schema = get_tool_schemas().get(tool_name)
+    if schema is None:
+        return f"Unknown tool: {tool_name}"
+
+    properties = schema.get("properties", {})
+    for name in schema.get("required", []):
+        if arguments.get(name) in (None, "") and not (name == "content" and name in arguments):
+            return f"Missing required argument '{name}' for {tool_name}"
+
+    for name, value in arguments.items():
+        definition = properties.get(name)
+        if definition is None or value is None:
+            continue
+        error = _check_argument(tool_name, name, value, definition)
+        if error:
+            return error
+
+    return None
+
+
+def _check_argument(tool_name: str, path: str, value: Any, definition: Dict[str, Any]) -> Optional[str]:
+    """Check an argument value (and any items or fields in it) against its schema."""
+    kind = definition.get("type")
+    argument = f"Argument '{path}' for {tool_name}"
+
+    if kind == "string" and not isinstance(value, str):
+        return f"{argument} must be a string"
+    if "enum" in definition and value not in definition["enum"]:
+        return f"{argument} must be one of: {', '.join(definition['enum'])}"
+
+    if kind == "array":
+        if not isinstance(value, list):
+            return f"{argument} must be a list"
+        for index, item in enumerate(value):
+            error = _check_argument(tool_name, f"{path}[{index}]", item, definition.get("items", {}))
+            if error:
+                return error
+
+    if kind == "object":
+        if not isinstance(value, dict):
+            return f"{argument} must be an object"
+        for name in definition.get("required", []):
+            if value.get(name) is None:
+                return f"Missing required argument '{path}.{name}' for {tool_name}"
+        for name, item in value.items():
+            field = definition.get("properties", {}).get(name)
+            if field is not None and item is not None:
+                error = _check_argument(tool_name, f"{path}.{name}", item, field)
+                if error:
+                    return error
+
+    return None
+
+
+def execute_tool_call(tool_name: str, arguments: Dict[str, Any], file_manager, vibe, user: User) -> str:
+    """
+    Execute a single tool call.
+
+    Args:
+        tool_name: The name of the tool
+        arguments: The tool arguments
+        file_manager: The VibeFileManager for the vibe
+        vibe: The Vibe object
+        user: The User object
 
+    Returns:
+        The tool result
+    """
+    logger.debug(f"Executing tool: {tool_name} with arguments: {list(arguments)}")
+
+    error = validate_tool_arguments(tool_name, arguments)
+    if error:
+        logger.warning(f"Invalid tool call: {error}")
+        return f"Error: {error}"
+
+    try:
         if tool_name == "list_files":
-            tool_result = handle_list_files(file_manager)
+            return handle_list_files(file_manager)
         elif tool_name == "read_file":
-            tool_result = handle_read_file(file_manager, lines)
+            return handle_read_file(file_manager, arguments)
+        elif tool_name == "read_files":
+            return handle_read_files(file_manager, arguments)
         elif tool_name == "write_file":
-            logger.error(f"CRITICAL DEBUG: Calling handle_write_file with {len(lines)} lines")
-            try:
-                tool_result = handle_write_file(file_manager, lines)
-                logger.error(f"CRITICAL DEBUG: handle_write_file result: {tool_result}")
-            except Exception as e:
-                error_msg = f"CRITICAL ERROR in handle_write_file: {str(e)}"
-                logger.error(error_msg)
-                tool_result = f"Error: {error_msg}"
+            return handle_write_file(file_manager, arguments)
+        elif tool_name == "write_files":
+            return handle_write_files(file_manager, arguments)
         elif tool_name == "delete_file":
-            tool_result = handle_delete_file(file_manager, lines)
+            return handle_delete_file(file_manager, arguments)
         elif tool_name == "generate_image":
-            tool_result = handle_generate_image(file_manager, lines, user)
+            return handle_generate_image(file_manager, arguments, user)
         elif tool_name == "save_image":
-            tool_result = handle_save_image(file_manager, lines)
+            return handle_save_image(file_manager, arguments)
         elif tool_name == "list_images":
-            tool_result = handle_list_images(user, vibe)
+            return handle_list_images(user, vibe)
         elif tool_name == "explain_image_workflow":
-            tool_result = explain_image_workflow()
-
-        # Append the tool result and the content after the tool call
-        result.append(f"Tool result:\n{tool_result}\n\n{after_tool}")
+            return explain_image_workflow()
+    except Exception as e:
+        error_msg = f"CRITICAL ERROR in {tool_name}: {str(e)}"
+        logger.exception(error_msg)
+        return f"Error: {error_msg}"
 
-    return "".join(result)
+    return "Error: Unknown tool"
 
 
 def handle_list_files(file_manager) -> str:
@@ -207,13 +394,9 @@ def handle_list_files(file_manager) -> str:
     return tool_result
 
 
-def handle_read_file(file_manager, lines: List[str]) -> str:
+def handle_read_file(file_manager, arguments: Dict[str, Any]) -> str:
     """Handle the read_file tool call."""
-    filename = None
-    for line in lines[1:]:
-        if line.startswith("filename:"):
-            filename = line[len("filename:"):].strip()
-            break
+    filename = arguments.get("filename")
 
     if filename:
         result_dict = file_manager.read_file(filename)
@@ -225,245 +408,86 @@ def handle_read_file(file_manager, lines: List[str]) -> str:
         return "Error: No filename provided for read_file"
 
 
-def handle_write_file(file_manager, lines: List[str]) -> str:
+def handle_write_file(file_manager, arguments: Dict[str, Any]) -> str:
     """Handle the write_file tool call."""
-    filename = None
-    content_start = None
-
-    # Add enhanced debug logging
-    logger.error(f"CRITICAL DEBUG: handle_write_file called with {len(lines)} lines")
-    logger.error(f"CRITICAL DEBUG: Vibe slug: {file_manager.vibe.slug}")
-    logger.error(f"CRITICAL DEBUG: Vibe directory: {file_manager.vibe_dir}")
-    logger.error(f"CRITICAL DEBUG: Vibe directory exists: {file_manager.vibe_dir.exists()}")
-    logger.error(f"CRITICAL DEBUG: Vibe directory is writable: {os.access(file_manager.vibe_dir, os.W_OK)}")
-    logger.error(f"CRITICAL DEBUG: Current working directory: {os.getcwd()}")
-    logger.error(f"CRITICAL DEBUG: User running process: {os.getuid()}")
-    logger.error(f"CRITICAL DEBUG: File manager type: {type(file_manager)}")
-    logger.error(f"CRITICAL DEBUG: Vibe object: {file_manager.vibe}")
-
-    # Log all lines for debugging in production
-    logger.error("CRITICAL DEBUG: Full tool call content:")
-    for i, line in enumerate(lines):
-        logger.error(f"CRITICAL DEBUG: Line {i}: {line[:100]}...")
-
-    # Find the filename and content
-    for i, line in enumerate(lines[1:]):
-        if line.startswith("filename:"):
-            filename = line[len("filename:"):].strip()
-            logger.error(f"CRITICAL DEBUG: Found filename: {filename}")
-        elif line.startswith("content:"):
-            content_start = i + 1
-            logger.error(f"CRITICAL DEBUG: Found content start at line {content_start + 1}")
-            break
+    filename = arguments.get("filename")
 
     if not filename:
-        logger.error("CRITICAL DEBUG: No filename found in tool call")
         return "Error: No filename found in tool call"
 
-    if content_start is None:
-        logger.error("CRITICAL DEBUG: No content marker found in tool call")
+    if "content" not in arguments:
         return "Error: No content marker found in tool call"
 
-    # Extract the content
-    try:
-        file_content = "\n".join(lines[content_start + 1:])
-        logger.error(f"CRITICAL DEBUG: Extracted content (first 100 chars): {file_content[:100]}...")
-        logger.error(f"CRITICAL DEBUG: Content length: {len(file_content)} characters")
+    file_content = arguments["content"]
+    logger.debug(f"write_file {filename}: {len(file_content)} characters")
 
-        # Sanitize image URLs in HTML content
-        if filename.endswith('.html'):
-            try:
-                from .html_utils import sanitize_image_urls, extract_image_references
-
-                # Extract image references before sanitizing
-                original_images = extract_image_references(file_content)
-                logger.error(f"CRITICAL DEBUG: Found {len(original_images)} image references in HTML content")
-                for img in original_images:
-                    logger.error(f"CRITICAL DEBUG: Image reference: src={img['src']}, is_pinata={img['is_pinata']}")
-
-                # Sanitize image URLs
-                sanitized_content = sanitize_image_urls(file_content, file_manager.vibe.slug)
-
-                # Extract image references after sanitizing
-                sanitized_images = extract_image_references(sanitized_content)
-                logger.error(f"CRITICAL DEBUG: Found {len(sanitized_images)} image references after sanitizing")
-                for img in sanitized_images:
-                    logger.error(f"CRITICAL DEBUG: Sanitized image reference: src={img['src']}, is_pinata={img['is_pinata']}")
-
-                # Use the sanitized content
-                file_content = sanitized_content
-                logger.error(f"CRITICAL DEBUG: Using sanitized content: {len(file_content)} bytes")
-            except Exception as e:
-                logger.error(f"CRITICAL DEBUG: Error sanitizing image URLs: {str(e)}")
-                # Continue with the original content if there's an error
-    except Exception as e:
-        logger.error(f"CRITICAL DEBUG: Error extracting content: {str(e)}")
-        return f"Error: Failed to extract content: {str(e)}"
+    # Sanitize image URLs in HTML content
+    if filename.endswith('.html'):
+        try:
+            from .html_utils import sanitize_image_urls
+            file_content = sanitize_image_urls(file_content, file_manager.vibe.slug)
+        except Exception as e:
+            # Continue with the original content if there's an error
+            logger.warning(f"Error sanitizing image URLs in {filename}: {str(e)}")
 
-    # Get the file path
-    try:
-        file_path = file_manager.get_file_path(filename)
-        logger.error(f"CRITICAL DEBUG: Full file path: {file_path}")
-        logger.error(f"CRITICAL DEBUG: File path type: {type(file_path)}")
-        logger.error(f"CRITICAL DEBUG: File path parent: {file_path.parent}")
-        logger.error(f"CRITICAL DEBUG: File path parent exists: {file_path.parent.exists()}")
-        logger.error(f"CRITICAL DEBUG: File path parent is writable: {os.access(file_path.parent, os.W_OK)}")
-    except Exception as e:
-        logger.error(f"CRITICAL DEBUG: Error getting file path: {str(e)}")
-        return f"Error: Failed to get file path: {str(e)}"
+    # The file manager stores the file and updates the vibe's flags
+    result_dict = file_manager.write_file(filename, file_content)
 
-    # Check if the file already exists
-    try:
-        if file_path.exists():
-            logger.error(f"CRITICAL DEBUG: File already exists: {file_path}")
-            logger.error(f"CRITICAL DEBUG: File size: {file_path.stat().st_size} bytes")
-            logger.error(f"CRITICAL DEBUG: File is writable: {os.access(file_path, os.W_OK)}")
-    except Exception as e:
-        logger.error(f"CRITICAL DEBUG: Error checking if file exists: {str(e)}")
-        # Continue anyway, as this is just a check
+    if result_dict.get('success', False):
+        return f"File {result_dict.get('action', 'written')}: {filename}\nLocation: {result_dict['path']}\nVibe slug: {file_manager.vibe.slug}"
+    else:
+        return f"Error: File manager write failed: {result_dict.get('error', 'Unknown error')}"
 
-    # Create the directory if it doesn't exist
-    try:
-        if not file_path.parent.exists():
-            logger.error(f"CRITICAL DEBUG: Creating directory: {file_path.parent}")
-            file_path.parent.mkdir(parents=True, exist_ok=True)
-            logger.error(f"CRITICAL DEBUG: Directory created: {file_path.parent.exists()}")
-    except Exception as e:
-        logger.error(f"CRITICAL DEBUG: Error creating directory: {str(e)}")
-        return f"Error: Failed to create directory: {str(e)}"
 
-    # Try multiple methods to write the file
-    try:
-        # Method 1: Write the file directly
-        logger.error(f"CRITICAL DEBUG: Writing file directly (Method 1): {file_path}")
-        with open(str(file_path), 'w') as f:
-            f.write(file_content)
-        logger.error(f"CRITICAL DEBUG: Direct file write successful (Method 1)")
-    except Exception as e:
-        logger.error(f"CRITICAL DEBUG: Error in direct file write (Method 1): {str(e)}")
+def handle_read_files(file_manager, arguments: Dict[str, Any]) -> str:
+    """Handle the read_files tool call."""
+    filenames = arguments.get("filenames") or []
 
-        try:
-            # Method 2: Try with absolute path
-            abs_path = os.path.abspath(str(file_path))
-            logger.error(f"CRITICAL DEBUG: Writing file with absolute path (Method 2): {abs_path}")
-            with open(abs_path, 'w') as f:
-                f.write(file_content)
-            logger.error(f"CRITICAL DEBUG: Absolute path file write successful (Method 2)")
-        except Exception as e2:
-            logger.error(f"CRITICAL DEBUG: Error in absolute path file write (Method 2): {str(e2)}")
+    if not filenames:
+        return "Error: No filenames provided for read_files"
 
-            try:
-                # Method 3: Try with os.path.join
-                dir_path = str(file_path.parent)
-                file_name = os.path.basename(str(file_path))
-                joined_path = os.path.join(dir_path, file_name)
-                logger.error(f"CRITICAL DEBUG: Writing file with os.path.join (Method 3): {joined_path}")
-                with open(joined_path, 'w') as f:
-                    f.write(file_content)
-                logger.error(f"CRITICAL DEBUG: os.path.join file write successful (Method 3)")
-            except Exception as e3:
-                logger.error(f"CRITICAL DEBUG: Error in os.path.join file write (Method 3): {str(e3)}")
-                return f"Error: All file write methods failed. Errors: Method 1: {str(e)}, Method 2: {str(e2)}, Method 3: {str(e3)}"
-
-    # Check if the file was actually created
-    try:
-        if file_path.exists():
-            logger.error(f"CRITICAL DEBUG: File exists after direct write: {file_path}")
-            logger.error(f"CRITICAL DEBUG: File size after direct write: {file_path.stat().st_size} bytes")
-
-            # Read the file back to verify content
-            with open(file_path, 'r') as f:
-                read_content = f.read()
-            logger.error(f"CRITICAL DEBUG: Read back content length: {len(read_content)} bytes")
-            logger.error(f"CRITICAL DEBUG: Content matches: {read_content == file_content}")
+    parts = []
+    for filename, result_dict in zip(filenames, file_manager.read_files(filenames)['results']):
+        if result_dict.get('success', False):
+            parts.append(f"Content of {filename}:\n\n```\n{result_dict['content']}\n```")
         else:
-            logger.error(f"CRITICAL DEBUG: File does not exist after direct write: {file_path}")
-            # Try to diagnose the issue
-            logger.error(f"CRITICAL DEBUG: Directory exists: {file_path.parent.exists()}")
-            logger.error(f"CRITICAL DEBUG: Directory is writable: {os.access(file_path.parent, os.W_OK)}")
-            logger.error(f"CRITICAL DEBUG: Checking for file with different methods:")
-
-            # Try different methods to check if the file exists
-            abs_path = os.path.abspath(str(file_path))
-            logger.error(f"CRITICAL DEBUG: File exists (absolute path): {os.path.exists(abs_path)}")
-
-            dir_path = str(file_path.parent)
-            file_name = os.path.basename(str(file_path))
-            joined_path = os.path.join(dir_path, file_name)
-            logger.error(f"CRITICAL DEBUG: File exists (os.path.join): {os.path.exists(joined_path)}")
-
-            # List all files in the directory
-            logger.error(f"CRITICAL DEBUG: Files in directory {file_path.parent}:")
-            try:
-                for f in os.listdir(str(file_path.parent)):
-                    logger.error(f"CRITICAL DEBUG: - {f}")
-            except Exception as e:
-                logger.error(f"CRITICAL DEBUG: Error listing directory: {str(e)}")
-    except Exception as e:
-        logger.error(f"CRITICAL DEBUG: Error checking if file was created: {str(e)}")
+            parts.append(f"Error reading {filename}: {result_dict.get('error', 'Unknown error')}")
+    return "\n\n".join(parts)
 
-    # Now use the file manager to write the file (this will handle backups, etc.)
-    try:
-        logger.error(f"CRITICAL DEBUG: Writing file using file_manager: {filename}")
-        result_dict = file_manager.write_file(filename, file_content)
-        logger.error(f"CRITICAL DEBUG: Write file result: {result_dict}")
-    except Exception as e:
-        logger.error(f"CRITICAL DEBUG: Error using file_manager.write_file: {str(e)}")
-        return f"Error: Failed to write file using file manager: {str(e)}"
 
-    # Check the result of the file manager write
-    if result_dict.get('success', False):
-        # Verify the file exists after using the file manager
-        try:
-            if file_path.exists():
-                logger.error(f"CRITICAL DEBUG: File exists after file manager write: {file_path}")
-                logger.error(f"CRITICAL DEBUG: File size after file manager write: {file_path.stat().st_size} bytes")
-
-                # Update the vibe's custom file flags manually to be sure
-                try:
-                    if filename.endswith('.html'):
-                        logger.error(f"CRITICAL DEBUG: Setting has_custom_html to True for vibe: {file_manager.vibe.slug}")
-                        file_manager.vibe.has_custom_html = True
-                        file_manager.vibe.save()
-                    elif filename.endswith('.css'):
-                        logger.error(f"CRITICAL DEBUG: Setting has_custom_css to True for vibe: {file_manager.vibe.slug}")
-                        file_manager.vibe.has_custom_css = True
-                        file_manager.vibe.save()
-                    elif filename.endswith('.js'):
-                        logger.error(f"CRITICAL DEBUG: Setting has_custom_js to True for vibe: {file_manager.vibe.slug}")
-                        file_manager.vibe.has_custom_js = True
-                        file_manager.vibe.save()
-                    logger.error(f"CRITICAL DEBUG: Vibe flags updated successfully")
-                except Exception as e:
-                    logger.error(f"CRITICAL DEBUG: Error updating vibe flags: {str(e)}")
-            else:
-                logger.error(f"CRITICAL DEBUG: File does not exist after file manager write: {file_path}")
-                # Try different methods to check if the file exists
-                abs_path = os.path.abspath(str(file_path))
-                logger.error(f"CRITICAL DEBUG: File exists (absolute path): {os.path.exists(abs_path)}")
-
-                dir_path = str(file_path.parent)
-                file_name = os.path.basename(str(file_path))
-                joined_path = os.path.join(dir_path, file_name)
-                logger.error(f"CRITICAL DEBUG: File exists (os.path.join): {os.path.exists(joined_path)}")
-        except Exception as e:
-            logger.error(f"CRITICAL DEBUG: Error verifying file after file manager write: {str(e)}")
+def handle_write_files(file_manager, arguments: Dict[str, Any]) -> str:
+    """Handle the write_files tool call."""
+    files = arguments.get("files") or []
 
-        # Return success message
-        logger.error(f"CRITICAL DEBUG: Returning success message")
-        return f"File {result_dict.get('action', 'written')}: {filename}\nLocation: {file_path}\nVibe slug: {file_manager.vibe.slug}"
-    else:
-        logger.error(f"CRITICAL DEBUG: File manager write failed: {result_dict.get('error', 'Unknown error')}")
-        return f"Error: File manager write failed: {result_dict.get('error', 'Unknown error')}"
+    if not files:
+        return "Error: No files provided for write_files"
+
+    # Sanitize image URLs in HTML content, as for write_file
+    prepared = []
+    for file in files:
+        filename = file.get("filename", "")
+        content = file.get("content", "")
+        if filename.endswith('.html'):
+            try:
+                from .html_utils import sanitize_image_urls
+                content = sanitize_image_urls(content, file_manager.vibe.slug)
+            except Exception as e:
+                logger.warning(f"Error sanitizing image URLs in {filename}: {str(e)}")
+        prepared.append({"filename": filename, "content": content})
+
+    lines = []
+    for file, result_dict in zip(prepared, file_manager.write_files(prepared)['results']):
+        if result_dict.get('success', False):
+            lines.append(f"File {result_dict.get('action', 'written')}: {file['filename']}")
+        else:
+            lines.append(f"Error writing {file['filename']}: {result_dict.get('error', 'Unknown error')}")
+    lines.append(f"Vibe slug: {file_manager.vibe.slug}")
+    return "\n".join(lines)
 
 
-def handle_delete_file(file_manager, lines: List[str]) -> str:
+def handle_delete_file(file_manager, arguments: Dict[str, Any]) -> str:
     """Handle the delete_file tool call."""
-    filename = None
-    for line in lines[1:]:
-        if line.startswith("filename:"):
-            filename = line[len("filename:"):].strip()
-            break
+    filename = arguments.get("filename")
 
     if filename:
         result_dict = file_manager.delete_file(filename)
@@ -475,24 +499,14 @@ def handle_delete_file(file_manager, lines: List[str]) -> str:
         return "Error: No filename provided for delete_file"
 
 
-def handle_generate_image(file_manager, lines: List[str], user: User) -> str:
+def handle_generate_image(file_manager, arguments: Dict[str, Any], user: User) -> str:
     """Handle the generate_image tool call."""
-    from .image_utils import generate_image, save_generated_image
-
-    prompt = None
-    size = "1024x1024"
-    quality = "standard"
-    filename = None
-
-    for line in lines[1:]:
-        if line.startswith("prompt:"):
-            prompt = line[len("prompt:"):].strip()
-        elif line.startswith("size:"):
-            size = line[len("size:"):].strip()
-        elif line.startswith("quality:"):
-            quality = line[len("quality:"):].strip()
-        elif line.startswith("filename:"):
-            filename = line[len("filename:"):].strip()
+    from .job_utils import enqueue_job, run_job_now
+
+    prompt = arguments.get("prompt")
+    size = arguments.get("size") or "1024x1024"
+    quality = arguments.get("quality") or "standard"
+    filename = arguments.get("filename")
 
     if not prompt:
         return "Error: No prompt provided for generate_image"
@@ -501,17 +515,6 @@ def handle_generate_image(file_manager, lines: List[str], user: User) -> str:
     if not user.profile.chatgpt_api_key:
         return "Error: You need to add an OpenAI API key to your profile to generate images."
 
-    # Generate the image
-    api_key = user.profile.chatgpt_api_key
-    image_result = generate_image(api_key, prompt, size, quality)
-
-    if not image_result.get('success', False):
-        return f"Error: {image_result.get('error', 'Failed to generate image.')}"
-
-    # Get the image URL from DALL-E
-    image_url = image_result.get('image_url')
-    revised_prompt = image_result.get('revised_prompt', prompt)
-
     # Generate a filename if not provided
     if not filename:
         filename = f"dalle_{uuid.uuid4()}.png"
@@ -520,38 +523,40 @@ def handle_generate_image(file_manager, lines: List[str], user: User) -> str:
     if not any(filename.lower().endswith(ext) for ext in ['.jpg', '.jpeg', '.png', '.gif', '.webp']):
         filename += '.png'
 
-    # First save to IPFS and database for tracking
-    save_db_result = save_generated_image(
-        user=user,
-        prompt=prompt,
-        image_url=image_url,
-        revised_prompt=revised_prompt
+    # Generate the image, save it to IPFS and the database, and copy it to the
+    # vibe directory. This goes through the job queue so the job shows up
+    # with the user's other image jobs, but runs right away because the model
+    # needs the IPFS URL in this turn. The failure is reported to the model
+    # here, so it isn't left for a worker to retry (and pay for) again.
+    job, _ = enqueue_job(
+        user,
+        'generate_image',
+        {'prompt': prompt, 'size': size, 'quality': quality, 'filename': filename},
+        vibe=file_manager.vibe
     )
+    job = run_job_now(job, retry=False)
 
-    if not save_db_result.get('success', False):
-        return f"Error: {save_db_result.get('error', 'Failed to save the generated image to IPFS.')}"
+    if job.status == job.STATUS_FAILED:
+        return f"Error: {job.error or 'Failed to generate image.'}"
 
-    # Get the IPFS URL from the save_db_result
-    ipfs_url = save_db_result.get('image_url')
+    if job.status != job.STATUS_SUCCEEDED:
+        # A worker claimed the job before it could run here
+        return f"""⚠️ Image generation for {filename} is still running in the background (job {job.id}, status at {reverse('vibezin:job_status', args=[job.id])}).
 
-    # Associate the image with the vibe
-    from .models import GeneratedImage
-    image = GeneratedImage.objects.get(id=save_db_result.get('image_id'))
-    image.vibe = file_manager.vibe
-    image.save()
+Do not reference this image in your HTML yet. Use list_images later to get its IPFS URL once it has been generated."""
 
-    # Also save to the vibe directory for local access
-    save_result = file_manager.save_image(image_url, filename)
+    ipfs_url = job.result.get('image_url')
+    revised_prompt = job.result.get('revised_prompt', prompt)
 
-    if not save_result.get('success', False):
-        return f"""⚠️ CRITICAL: Image saved to IPFS but failed to save to vibe folder: {save_result.get('error', 'Unknown error')}
+    if job.result.get('local_error'):
+        return f"""⚠️ CRITICAL: Image saved to IPFS but failed to save to vibe folder: {job.result.get('local_error')}
 
 🔴 IPFS URL (REQUIRED FOR HTML): {ipfs_url}
 
 ⚠️ YOU MUST USE THE COMPLETE IPFS URL ABOVE IN YOUR HTML img src ATTRIBUTE"""
 
     # Return both the local path and IPFS URL
-    local_path = save_result.get('url')
+    local_path = job.result.get('local_url')
 
     # Create a small thumbnail preview of the image for the chat
     img_preview = f"<img src=\"{ipfs_url}\" alt=\"{prompt}\" style=\"max-width: 150px; max-height: 150px; object-fit: cover; border-radius: 5px; box-shadow: 0 2px 4px rgba(0,0,0,0.1);\">"
@@ -599,16 +604,10 @@ Revised prompt: {revised_prompt}
 ```"""
 
 
-def handle_save_image(file_manager, lines: List[str]) -> str:
+def handle_save_image(file_manager, arguments: Dict[str, Any]) -> str:
     """Handle the save_image tool call."""
-    url = None
-    filename = None
-
-    for line in lines[1:]:
-        if line.startswith("url:"):
-            url = line[len("url:"):].strip()
-        elif line.startswith("filename:"):
-            filename = line[len("filename:"):].strip()
+    url = arguments.get("url")
+    filename = arguments.get("filename")
 
     if not url:
         return "Error: No URL provided for save_image"
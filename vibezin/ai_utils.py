@@ -19,9 +19,12 @@ from .ai_conversation import (
 
 from .ai_tools import (
     process_tool_calls,
+    dispatch_tool_calls,
     handle_list_files,
     handle_read_file,
+    handle_read_files,
     handle_write_file,
+    handle_write_files,
     handle_delete_file,
     handle_generate_image,
     handle_save_image
@@ -35,6 +38,7 @@ from .ai_image_generation import (
 from .ai_prompts import (
     VIBE_BUILDER_SYSTEM_PROMPT,
     get_vibe_context_prompt,
+    get_vibe_system_prompts,
     CONTENT_GENERATION_PROMPT
 )
 
@@ -56,9 +60,12 @@ __all__ = [
     
     # AI Tools
     'process_tool_calls',
+    'dispatch_tool_calls',
     'handle_list_files',
     'handle_read_file',
+    'handle_read_files',
     'handle_write_file',
+    'handle_write_files',
     'handle_delete_file',
     'handle_generate_image',
     'handle_save_image',
@@ -70,6 +77,7 @@ __all__ = [
     # AI Prompts
     'VIBE_BUILDER_SYSTEM_PROMPT',
     'get_vibe_context_prompt',
+    'get_vibe_system_prompts',
     'CONTENT_GENERATION_PROMPT',
     
     # AI Mock Responses
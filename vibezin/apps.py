@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class VibezinConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'vibezin'
+
+    def ready(self):
+        # Connect the vibe directory and cache invalidation signal handlers
+        from . import signals  # noqa: F401
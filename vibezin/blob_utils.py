@@ -0,0 +1,413 @@
+"""
+Content-addressed storage for vibe files.
+
+The bytes of every file written through VibeFileManager are stored once, as
+a blob named after the SHA-256 hash of the content. The files in a vibe
+directory are hard links to their blobs. They are still served from
+static/vibes/<slug>/ as before, but a CSS library or image shared by many
+vibes takes up disk space only once.
+
+Each vibe directory has a manifest (.manifest.json) mapping file names to
+blob hashes. When a write doesn't change a file's hash, nothing is written.
+
+Blobs that no manifest references anymore are removed by
+``python manage.py gc_vibe_blobs``. A blob that is still hard-linked from a
+vibe directory is never removed, so a missing manifest entry can only cost
+deduplication, never content. When hard links aren't possible (the blob
+directory is on another filesystem), files are copied.
+
+Since a vibe file shares its blob with every other vibe that has the same
+content, vibe files must only be written through VibeFileManager, which
+replaces the link. Blobs are read-only, and open_vibe_file refuses to open a
+file that shares a blob for writing in place (which the file mode alone
+doesn't stop for root).
+
+Manifest updates take a lock per vibe directory that holds across threads
+and, where fcntl is available, across processes. They also take a shared
+lock on the blob store, which garbage collection takes exclusively before
+it removes anything, so a blob is never removed while a write links it.
+"""
+import os
+import json
+import shutil
+import hashlib
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import IO, Any, BinaryIO, Dict, Iterator, List, Optional
+from django.conf import settings
+from .fs_utils import atomic_write, atomic_write_text, fsync_file, get_temp_path, replace_file
+
+try:
+    import fcntl
+except ImportError:  # Windows: locks only hold within a process
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Directory that holds the blobs. Keep it on the same filesystem as
+# VIBE_CONTENT_DIR so files can be hard links.
+VIBE_BLOB_DIR = Path(getattr(settings, 'VIBE_BLOB_DIR', Path(settings.BASE_DIR) / 'vibe_blobs'))
+
+# Unreferenced blobs younger than this are kept, since a write may be about to
+# reference them (seconds)
+VIBE_BLOB_GC_GRACE_PERIOD = getattr(settings, 'VIBE_BLOB_GC_GRACE_PERIOD', 3600)
+
+# Name of the manifest file in each vibe directory
+MANIFEST_NAME = '.manifest.json'
+
+# Lock files of each vibe directory's manifest and of the blob store
+MANIFEST_LOCK_NAME = '.manifest.lock'
+STORE_LOCK_NAME = '.lock'
+
+# Chunk size used when hashing and copying streamed content
+CHUNK_SIZE = 64 * 1024
+
+# File mode of blobs (and so of the vibe files linked to them)
+BLOB_MODE = 0o444
+
+# Threads of a process updating the same manifest take turns on these locks
+_manifest_locks = {}
+_manifest_locks_lock = threading.Lock()
+
+
+def hash_content(data: bytes) -> str:
+    """
+    Get the hash a piece of content is stored under.
+
+    Args:
+        data: The content
+
+    Returns:
+        The hex SHA-256 digest
+    """
+    return hashlib.sha256(data).hexdigest()
+
+
+def get_blob_path(digest: str) -> Path:
+    """
+    Get the path of a blob.
+
+    Args:
+        digest: The content hash
+
+    Returns:
+        Path of the blob
+    """
+    return VIBE_BLOB_DIR / digest[:2] / digest
+
+
+def _touch(path: Path) -> None:
+    """Mark a reused blob as recently used, so it isn't garbage collected."""
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def _protect(path: Path) -> None:
+    """Make a blob read-only (blobs stored before this was done included)."""
+    try:
+        if os.stat(path).st_mode & 0o777 != BLOB_MODE:
+            os.chmod(path, BLOB_MODE)
+    except OSError as e:
+        logger.warning(f"Could not make blob read-only: {path}: {str(e)}")
+
+
+class SharedBlobError(PermissionError):
+    """Raised when a vibe file that shares its blob is opened for writing in place."""
+
+
+def open_vibe_file(path: Path, mode: str = 'r', **kwargs) -> IO:
+    """
+    Open a vibe file, refusing to change a file that shares its blob in place.
+
+    Writing to a hard link changes the blob, and with it every vibe that
+    links the same content. Vibe files are changed by replacing them (see
+    VibeFileManager.write_file), never through an open file.
+
+    Args:
+        path: Path of the file
+        mode: The mode, as for open()
+        **kwargs: Passed on to open()
+
+    Returns:
+        The open file
+
+    Raises:
+        SharedBlobError: If the file is opened for writing and has other links
+    """
+    if any(flag in mode for flag in 'wax+'):
+        try:
+            links = os.stat(path).st_nlink
+        except FileNotFoundError:
+            links = 0
+        if links > 1:
+            raise SharedBlobError(f"{path} shares its content with other files; write it through VibeFileManager")
+    return open(path, mode, **kwargs)
+
+
+def put_blob(data: bytes) -> str:
+    """
+    Store content as a blob, unless it is already stored.
+
+    Args:
+        data: The content
+
+    Returns:
+        The content hash
+    """
+    digest = hash_content(data)
+    blob_path = get_blob_path(digest)
+
+    if blob_path.exists():
+        _touch(blob_path)
+        _protect(blob_path)
+        return digest
+
+    blob_path.parent.mkdir(parents=True, exist_ok=True)
+    atomic_write(blob_path, data)
+    _protect(blob_path)
+
+    return digest
+
+
+def put_blob_stream(stream: BinaryIO) -> str:
+    """
+    Store streamed content (e.g. a download) as a blob, unless it is already stored.
+
+    Args:
+        stream: File-like object to read the content from
+
+    Returns:
+        The content hash
+    """
+    VIBE_BLOB_DIR.mkdir(parents=True, exist_ok=True)
+    temp_path = get_temp_path(VIBE_BLOB_DIR / 'download')
+    hasher = hashlib.sha256()
+
+    try:
+        with open(temp_path, 'wb') as f:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                hasher.update(chunk)
+                f.write(chunk)
+            fsync_file(f)
+
+        digest = hasher.hexdigest()
+        blob_path = get_blob_path(digest)
+        if blob_path.exists():
+            _touch(blob_path)
+        else:
+            blob_path.parent.mkdir(parents=True, exist_ok=True)
+            replace_file(temp_path, blob_path)
+        _protect(blob_path)
+        return digest
+    finally:
+        if temp_path.exists():
+            temp_path.unlink()
+
+
+def link_blob(digest: str, target: Path) -> None:
+    """
+    Put a blob in place as a file, replacing any existing file.
+
+    The file is replaced in one step, so readers see either the old or the
+    new content.
+
+    Args:
+        digest: The content hash
+        target: Path of the file
+    """
+    blob_path = get_blob_path(digest)
+    temp_path = get_temp_path(target)
+
+    try:
+        os.link(blob_path, temp_path)
+    except OSError:
+        # Different filesystem, or links not supported
+        shutil.copyfile(blob_path, temp_path)
+
+    replace_file(temp_path, target)
+
+
+@contextmanager
+def _file_lock(path: Path, exclusive: bool = True) -> Iterator[None]:
+    """
+    Hold an advisory lock on a lock file, across processes.
+
+    Args:
+        path: Path of the lock file (created if missing)
+        exclusive: Whether to take an exclusive or a shared lock
+    """
+    if fcntl is None:
+        yield
+        return
+
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        yield
+    finally:
+        # Closing the file releases the lock
+        os.close(fd)
+
+
+@contextmanager
+def lock_manifest(vibe_dir: Path) -> Iterator[None]:
+    """
+    Hold the lock that serializes manifest updates for a vibe directory.
+
+    The lock isn't reentrant.
+
+    Args:
+        vibe_dir: The vibe directory
+    """
+    key = str(vibe_dir)
+    thread_lock = _manifest_locks.get(key)
+    if thread_lock is None:
+        with _manifest_locks_lock:
+            thread_lock = _manifest_locks.setdefault(key, threading.Lock())
+
+    VIBE_BLOB_DIR.mkdir(parents=True, exist_ok=True)
+    with thread_lock, \
+            _file_lock(VIBE_BLOB_DIR / STORE_LOCK_NAME, exclusive=False), \
+            _file_lock(vibe_dir / MANIFEST_LOCK_NAME):
+        yield
+
+
+def read_manifest(vibe_dir: Path) -> Dict[str, str]:
+    """
+    Read the manifest of a vibe directory.
+
+    Args:
+        vibe_dir: The vibe directory
+
+    Returns:
+        Dictionary mapping file names to content hashes
+    """
+    try:
+        with open(vibe_dir / MANIFEST_NAME, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable manifest in {vibe_dir}: {str(e)}")
+        return {}
+
+
+def write_manifest(vibe_dir: Path, manifest: Dict[str, str]) -> None:
+    """
+    Write the manifest of a vibe directory.
+
+    Args:
+        vibe_dir: The vibe directory
+        manifest: Dictionary mapping file names to content hashes
+    """
+    atomic_write_text(vibe_dir / MANIFEST_NAME, json.dumps(manifest, indent=2, sort_keys=True))
+
+
+def get_blob_references() -> Dict[str, int]:
+    """
+    Count the references to each blob from the vibe manifests.
+
+    Returns:
+        Dictionary mapping content hashes to reference counts
+    """
+    references = {}
+    content_dir = Path(settings.VIBE_CONTENT_DIR)
+    if not content_dir.exists():
+        return references
+
+    for manifest_path in content_dir.glob(f"*/{MANIFEST_NAME}"):
+        for digest in read_manifest(manifest_path.parent).values():
+            references[digest] = references.get(digest, 0) + 1
+
+    return references
+
+
+def _find_unused_blobs(blob_paths, references: Dict[str, int], cutoff: float) -> List[tuple]:
+    """
+    Pick out the blobs that nothing uses and that are older than a cutoff.
+
+    Args:
+        blob_paths: Paths of the blobs to check
+        references: Reference counts from get_blob_references
+        cutoff: Blobs modified after this time are kept
+
+    Returns:
+        List of (path, size) pairs
+    """
+    unused = []
+    for blob_path in blob_paths:
+        try:
+            stat = blob_path.stat()
+        except FileNotFoundError:
+            continue
+        except OSError as e:
+            logger.warning(f"Error checking blob {blob_path}: {str(e)}")
+            continue
+
+        # A blob that is still hard-linked from a vibe directory is in use,
+        # even if its manifest entry is missing
+        if blob_path.name not in references and stat.st_nlink <= 1 and stat.st_mtime < cutoff:
+            unused.append((blob_path, stat.st_size))
+    return unused
+
+
+def collect_garbage(dry_run: bool = False, grace_period: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Remove blobs that are no longer used.
+
+    A blob is removed when no manifest references it, no vibe file is a hard
+    link to it, and it is older than the grace period.
+
+    Args:
+        dry_run: Only report what would be removed
+        grace_period: Minimum age of removed blobs in seconds
+            (defaults to VIBE_BLOB_GC_GRACE_PERIOD)
+
+    Returns:
+        Dictionary with the number of blobs kept and removed and the bytes freed
+    """
+    if grace_period is None:
+        grace_period = VIBE_BLOB_GC_GRACE_PERIOD
+
+    cutoff = time.time() - grace_period
+    result = {'success': True, 'kept': 0, 'removed': 0, 'bytes_freed': 0}
+
+    if not VIBE_BLOB_DIR.exists():
+        return result
+
+    # Find the candidates without holding up writes, then check them again
+    # while writes are held off, since one may have reused a blob meanwhile
+    blob_paths = list(VIBE_BLOB_DIR.glob('*/*'))
+    unused = _find_unused_blobs(blob_paths, get_blob_references(), cutoff)
+
+    if unused and not dry_run:
+        with _file_lock(VIBE_BLOB_DIR / STORE_LOCK_NAME):
+            candidates = [blob_path for blob_path, _ in unused]
+            unused = []
+            for blob_path, size in _find_unused_blobs(candidates, get_blob_references(), cutoff):
+                try:
+                    blob_path.unlink()
+                except FileNotFoundError:
+                    continue
+                except OSError as e:
+                    logger.warning(f"Error collecting blob {blob_path}: {str(e)}")
+                    continue
+                unused.append((blob_path, size))
+
+    result['kept'] = len(blob_paths) - len(unused)
+    result['removed'] = len(unused)
+    result['bytes_freed'] = sum(size for _, size in unused)
+
+    logger.info(
+        f"Blob garbage collection: removed {result['removed']} blobs "
+        f"({result['bytes_freed']} bytes), kept {result['kept']}"
+    )
+    return result
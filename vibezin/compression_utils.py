@@ -0,0 +1,227 @@
+"""
+Utilities for precompressing vibe content.
+
+Vibe pages and files are compressed once when they are written (gzip, plus
+brotli when the ``brotli`` package is installed) and the stored variants are
+picked per request based on ``Accept-Encoding``.
+"""
+import glob
+import gzip
+import hashlib
+import logging
+import mimetypes
+from pathlib import Path
+from typing import Dict, Optional
+from django.conf import settings
+from .fs_utils import atomic_write
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Content smaller than this isn't worth compressing
+COMPRESSION_MIN_SIZE = getattr(settings, 'VIBE_COMPRESSION_MIN_SIZE', 512)
+
+# Hidden directory inside each vibe directory that holds compressed variants
+PRECOMPRESSED_DIR_NAME = '.precompressed'
+
+# File extensions used for each encoding
+ENCODING_EXTENSIONS = {
+    'br': '.br',
+    'gzip': '.gz',
+}
+
+# Preferred order when the client accepts several encodings equally
+ENCODING_PREFERENCE = ['br', 'gzip']
+
+# Non-text content types that still compress well
+COMPRESSIBLE_CONTENT_TYPES = [
+    'application/javascript',
+    'application/json',
+    'application/xml',
+    'image/svg+xml',
+]
+
+
+def is_compressible(filename: str) -> bool:
+    """
+    Check whether a file is worth compressing based on its content type.
+
+    Args:
+        filename: The name of the file
+
+    Returns:
+        True for text-like content types
+    """
+    content_type, _ = mimetypes.guess_type(filename)
+    if not content_type:
+        return False
+    return content_type.startswith('text/') or content_type in COMPRESSIBLE_CONTENT_TYPES
+
+
+def compress_variants(data: bytes) -> Dict[str, bytes]:
+    """
+    Compress data with every available encoding.
+
+    Args:
+        data: The uncompressed content
+
+    Returns:
+        Dictionary mapping encoding name to compressed bytes. Encodings that
+        don't make the content smaller are left out.
+    """
+    if len(data) < COMPRESSION_MIN_SIZE:
+        return {}
+
+    variants = {}
+    try:
+        variants['gzip'] = gzip.compress(data, compresslevel=9, mtime=0)
+        if brotli is not None:
+            variants['br'] = brotli.compress(data, mode=brotli.MODE_TEXT)
+    except Exception as e:
+        logger.exception(f"Error compressing content: {str(e)}")
+
+    return {encoding: body for encoding, body in variants.items() if len(body) < len(data)}
+
+
+def choose_encoding(accept_encoding: str, available) -> Optional[str]:
+    """
+    Pick the best encoding the client accepts from the available variants.
+
+    Args:
+        accept_encoding: The value of the Accept-Encoding request header
+        available: The encodings that have a stored variant
+
+    Returns:
+        The encoding to use, or None to send the content uncompressed
+    """
+    if not accept_encoding or not available:
+        return None
+
+    qualities = {}
+    for part in accept_encoding.split(','):
+        pieces = part.strip().split(';')
+        coding = pieces[0].strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in pieces[1:]:
+            name, _, value = param.strip().partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding] = quality
+
+    best = None
+    best_quality = 0.0
+    for encoding in ENCODING_PREFERENCE:
+        if encoding not in available:
+            continue
+        quality = qualities.get(encoding, qualities.get('*', 0.0))
+        if quality > best_quality:
+            best = encoding
+            best_quality = quality
+
+    return best
+
+
+def get_precompressed_dir(vibe_dir: Path) -> Path:
+    """Get the directory holding the compressed variants of a vibe's files."""
+    return vibe_dir / PRECOMPRESSED_DIR_NAME
+
+
+def get_variant_path(vibe_dir: Path, filename: str, fingerprint: str, encoding: str) -> Path:
+    """
+    Get the path of a compressed variant of a vibe file.
+
+    Variant names include the fingerprint of the source content, so a variant
+    can never be served for a different version of the file.
+
+    Args:
+        vibe_dir: The vibe directory
+        filename: The name of the source file
+        fingerprint: SHA-256 of the source content
+        encoding: The encoding name (br or gzip)
+
+    Returns:
+        Path of the variant
+    """
+    return get_precompressed_dir(vibe_dir) / f"{filename}.{fingerprint[:16]}{ENCODING_EXTENSIONS[encoding]}"
+
+
+def remove_file_variants(vibe_dir: Path, filename: str) -> None:
+    """
+    Remove all stored variants of a vibe file.
+
+    Args:
+        vibe_dir: The vibe directory
+        filename: The name of the source file
+    """
+    variant_dir = get_precompressed_dir(vibe_dir)
+    if not variant_dir.exists():
+        return
+
+    for extension in ENCODING_EXTENSIONS.values():
+        for variant_path in variant_dir.glob(f"{glob.escape(filename)}.*{extension}"):
+            try:
+                variant_path.unlink()
+            except FileNotFoundError:
+                pass
+
+
+def write_file_variants(vibe_dir: Path, filename: str, data: bytes) -> Dict[str, str]:
+    """
+    Store compressed variants of a vibe file next to it.
+
+    Args:
+        vibe_dir: The vibe directory
+        filename: The name of the source file
+        data: The content of the source file
+
+    Returns:
+        Dictionary mapping encoding name to the variant path
+    """
+    remove_file_variants(vibe_dir, filename)
+
+    if not is_compressible(filename):
+        return {}
+
+    variants = compress_variants(data)
+    if not variants:
+        return {}
+
+    fingerprint = hashlib.sha256(data).hexdigest()
+
+    paths = {}
+    for encoding, body in variants.items():
+        variant_path = get_variant_path(vibe_dir, filename, fingerprint, encoding)
+        variant_path.parent.mkdir(parents=True, exist_ok=True)
+        atomic_write(variant_path, body)
+        paths[encoding] = str(variant_path)
+
+    return paths
+
+
+def find_file_variants(vibe_dir: Path, filename: str, fingerprint: str) -> Dict[str, str]:
+    """
+    Find the stored variants of a vibe file for a given content fingerprint.
+
+    Args:
+        vibe_dir: The vibe directory
+        filename: The name of the source file
+        fingerprint: SHA-256 of the current source content
+
+    Returns:
+        Dictionary mapping encoding name to the variant path
+    """
+    paths = {}
+    for encoding in ENCODING_EXTENSIONS:
+        variant_path = get_variant_path(vibe_dir, filename, fingerprint, encoding)
+        if variant_path.is_file():
+            paths[encoding] = str(variant_path)
+    return paths
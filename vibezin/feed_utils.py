@@ -0,0 +1,135 @@
+"""
+Keyset-paginated vibe feed.
+
+The feed is ordered newest first by (created_at, id) and read one page at a
+time. Instead of an offset, each page ends with a cursor holding the
+(created_at, id) of its last vibe, and the next page starts right after it.
+With the composite index on Vibe, every page costs one index range scan
+however many vibes there are, and vibes created while someone scrolls don't
+shift the pages they haven't seen yet.
+"""
+import base64
+import logging
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+from django.conf import settings
+from django.db.models import Q, QuerySet
+from django.urls import reverse
+from .models import Vibe
+
+logger = logging.getLogger(__name__)
+
+# Number of vibes per feed page
+VIBE_FEED_PAGE_SIZE = getattr(settings, 'VIBE_FEED_PAGE_SIZE', 20)
+
+# Largest page a client can ask for
+VIBE_FEED_MAX_PAGE_SIZE = getattr(settings, 'VIBE_FEED_MAX_PAGE_SIZE', 100)
+
+
+def encode_cursor(vibe: Vibe) -> str:
+    """
+    Get the cursor that continues a feed after a vibe.
+
+    Args:
+        vibe: The last vibe of a page
+
+    Returns:
+        An opaque, URL-safe cursor
+    """
+    raw = f"{vibe.created_at.isoformat()}|{vibe.pk}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """
+    Get the (created_at, id) position a cursor points at.
+
+    Args:
+        cursor: A cursor from encode_cursor
+
+    Returns:
+        Tuple of the creation time and id of the vibe
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8')
+        created_at, pk = raw.rsplit('|', 1)
+        return datetime.fromisoformat(created_at), int(pk)
+    except (ValueError, UnicodeError) as e:
+        raise ValueError(f"Invalid feed cursor: {cursor}") from e
+
+
+def get_feed_queryset() -> QuerySet:
+    """
+    Get all vibes in feed order, with their users (but not their content).
+
+    Returns:
+        The queryset, newest first
+    """
+    return Vibe.objects.select_related('user').defer('content').order_by('-created_at', '-id')
+
+
+def get_feed_page(cursor: Optional[str] = None, page_size: Optional[int] = None,
+                  queryset: Optional[QuerySet] = None) -> Dict[str, Any]:
+    """
+    Get a page of the vibe feed.
+
+    Args:
+        cursor: Cursor of the previous page, None for the first page
+        page_size: Number of vibes on the page (defaults to VIBE_FEED_PAGE_SIZE)
+        queryset: Vibes to page through, in feed order (defaults to get_feed_queryset)
+
+    Returns:
+        Dictionary with the vibes on the page and the cursor of the next
+        page (None on the last page)
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    if page_size is None:
+        page_size = VIBE_FEED_PAGE_SIZE
+    page_size = max(1, min(page_size, VIBE_FEED_MAX_PAGE_SIZE))
+
+    if queryset is None:
+        queryset = get_feed_queryset()
+
+    if cursor:
+        created_at, pk = decode_cursor(cursor)
+        queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+
+    # One extra row tells whether there is a next page
+    vibes = list(queryset[:page_size + 1])
+    has_more = len(vibes) > page_size
+    vibes = vibes[:page_size]
+
+    return {
+        'vibes': vibes,
+        'next_cursor': encode_cursor(vibes[-1]) if has_more else None,
+    }
+
+
+def serialize_feed_vibe(vibe: Vibe, user=None) -> Dict[str, Any]:
+    """
+    Get the JSON representation of a vibe in the feed.
+
+    Args:
+        vibe: The Vibe object (with its user loaded)
+        user: The user viewing the feed
+
+    Returns:
+        Dictionary with the vibe's feed fields
+    """
+    is_owner = user is not None and vibe.user_id is not None and vibe.user_id == user.pk
+    return {
+        'id': vibe.pk,
+        'title': vibe.title,
+        'slug': vibe.slug,
+        'description': vibe.description,
+        'created_at': vibe.created_at.isoformat(),
+        'username': vibe.user.username if vibe.user else None,
+        'url': reverse('vibezin:vibe_detail_by_slug', args=[vibe.slug]),
+        'ai_builder_url': reverse('vibezin:vibe_ai_builder', args=[vibe.slug]) if is_owner else None,
+    }
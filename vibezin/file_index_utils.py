@@ -0,0 +1,215 @@
+"""
+In-memory index of the files in each vibe directory.
+
+Listing a vibe's files used to walk its directory and stat every file on
+each page view and list_files tool call. The index keeps the listing (name,
+size, modification time, type and blob hash) per vibe directory and checks
+it with a single stat of the directory: any file created, replaced, renamed
+or removed in the directory changes the directory's modification time, and
+the directory is scanned again.
+
+Writes through VibeFileManager update the index directly, so the next
+listing doesn't need a scan. Each process keeps its own index of the
+VIBE_FILE_INDEX_SIZE most recently listed vibes.
+
+Directory timestamps are only as fine as the filesystem keeps them (1-2s on
+some), so two changes within one tick leave the same modification time. An
+index entry is therefore only trusted once the directory's modification time
+is more than VIBE_FILE_INDEX_MTIME_RESOLUTION older than the moment the
+entry was last checked; until then each listing scans the directory again.
+"""
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from django.conf import settings
+from .blob_utils import lock_manifest, read_manifest
+from .fs_utils import atomic_write_text
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of vibe directories kept in the index
+VIBE_FILE_INDEX_SIZE = getattr(settings, 'VIBE_FILE_INDEX_SIZE', 1024)
+
+# Resolution of directory modification times, in seconds. Changes less than
+# this apart may leave the same modification time.
+VIBE_FILE_INDEX_MTIME_RESOLUTION = getattr(settings, 'VIBE_FILE_INDEX_MTIME_RESOLUTION', 2)
+
+# Index entries by vibe directory:
+# {'mtime_ns': ..., 'checked_ns': ..., 'files': {name: info}}
+_index = OrderedDict()
+_index_lock = threading.Lock()
+
+
+def _directory_mtime(vibe_dir: Path) -> Optional[int]:
+    try:
+        return os.stat(vibe_dir).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def _is_fresh(entry: Dict[str, Any], mtime_ns: Optional[int]) -> bool:
+    """
+    Check whether an index entry matches a directory with the given modification time.
+
+    A change made in the same timestamp tick as the last check wouldn't
+    change the modification time, so the entry is only trusted once that
+    tick had passed when it was checked.
+    """
+    return (
+        mtime_ns is not None
+        and entry['mtime_ns'] == mtime_ns
+        and entry['checked_ns'] - mtime_ns > VIBE_FILE_INDEX_MTIME_RESOLUTION * 1_000_000_000
+    )
+
+
+def _file_info(vibe_dir: Path, name: str, stat: os.stat_result, digest: Optional[str]) -> Dict[str, Any]:
+    suffix = Path(name).suffix
+    return {
+        'name': name,
+        'path': str(vibe_dir / name),
+        'size': stat.st_size,
+        'modified': stat.st_mtime,
+        'type': suffix[1:] if suffix else 'unknown',
+        'hash': digest,
+    }
+
+
+def _scan_directory(vibe_dir: Path) -> Dict[str, Dict[str, Any]]:
+    """Read the files in a vibe directory, skipping hidden files and directories."""
+    manifest = read_manifest(vibe_dir)
+    files = {}
+    with os.scandir(vibe_dir) as entries:
+        for entry in entries:
+            if entry.name.startswith('.'):
+                continue
+            try:
+                if not entry.is_file():
+                    continue
+                files[entry.name] = _file_info(vibe_dir, entry.name, entry.stat(), manifest.get(entry.name))
+            except FileNotFoundError:
+                # Removed while scanning
+                continue
+    return files
+
+
+def get_file_index(vibe_dir: Path) -> List[Dict[str, Any]]:
+    """
+    List the files in a vibe directory.
+
+    Args:
+        vibe_dir: The vibe directory
+
+    Returns:
+        List of dictionaries with file information, sorted by name
+    """
+    key = str(vibe_dir)
+    checked_ns = time.time_ns()
+    mtime_ns = _directory_mtime(vibe_dir)
+    if mtime_ns is None:
+        with _index_lock:
+            _index.pop(key, None)
+        return []
+
+    with _index_lock:
+        entry = _index.get(key)
+        if entry is not None and _is_fresh(entry, mtime_ns):
+            _index.move_to_end(key)
+            return [dict(entry['files'][name]) for name in sorted(entry['files'])]
+
+    logger.debug(f"Scanning vibe directory: {vibe_dir}")
+    try:
+        files = _scan_directory(vibe_dir)
+    except FileNotFoundError:
+        return []
+
+    with _index_lock:
+        _index[key] = {'mtime_ns': mtime_ns, 'checked_ns': checked_ns, 'files': files}
+        _index.move_to_end(key)
+        while len(_index) > VIBE_FILE_INDEX_SIZE:
+            _index.popitem(last=False)
+
+    return [dict(files[name]) for name in sorted(files)]
+
+
+def is_file_index_current(vibe_dir: Path) -> bool:
+    """
+    Check whether the index of a vibe directory matches the directory.
+
+    Args:
+        vibe_dir: The vibe directory
+
+    Returns:
+        True if the directory hasn't changed since it was indexed
+    """
+    mtime_ns = _directory_mtime(vibe_dir)
+    with _index_lock:
+        entry = _index.get(str(vibe_dir))
+        return entry is not None and _is_fresh(entry, mtime_ns)
+
+
+def update_file_index(vibe_dir: Path, name: str, digest: Optional[str] = None, was_current: bool = False) -> None:
+    """
+    Update the index after a file was written or deleted.
+
+    Callers must serialize changes to the directory (the vibe's manifest
+    lock) and check is_file_index_current before making them. If the index
+    was current, it stays current without a scan; otherwise the next listing
+    scans the directory.
+
+    Args:
+        vibe_dir: The vibe directory
+        name: Name of the file relative to the vibe directory
+        digest: Blob hash of the new content
+        was_current: Whether the index was current before the change
+    """
+    key = str(vibe_dir)
+    with _index_lock:
+        entry = _index.get(key)
+        if entry is None:
+            return
+
+        if not was_current:
+            # Changes by others are mixed in, so scan next time
+            entry['mtime_ns'] = None
+            return
+
+        # Only files directly in the vibe directory are listed
+        if '/' not in name and not name.startswith('.'):
+            try:
+                entry['files'][name] = _file_info(vibe_dir, name, os.stat(vibe_dir / name), digest)
+            except FileNotFoundError:
+                entry['files'].pop(name, None)
+
+        entry['checked_ns'] = time.time_ns()
+        entry['mtime_ns'] = _directory_mtime(vibe_dir)
+
+
+def write_indexed_text(vibe_dir: Path, name: str, text: str) -> None:
+    """
+    Write a text file that isn't in the blob store (e.g. metadata.json) and
+    keep the index current.
+
+    Args:
+        vibe_dir: The vibe directory
+        name: Name of the file relative to the vibe directory
+        text: The content
+    """
+    with lock_manifest(vibe_dir):
+        was_current = is_file_index_current(vibe_dir)
+        atomic_write_text(vibe_dir / name, text)
+        update_file_index(vibe_dir, name, was_current=was_current)
+
+
+def forget_file_index(vibe_dir: Path) -> None:
+    """
+    Drop the index of a vibe directory (e.g. when the vibe is deleted).
+
+    Args:
+        vibe_dir: The vibe directory
+    """
+    with _index_lock:
+        _index.pop(str(vibe_dir), None)
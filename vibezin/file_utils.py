@@ -5,14 +5,23 @@ import os
 import json
 import logging
 import difflib
-import requests
-import shutil
+import threading
+from contextlib import contextmanager
 from io import BytesIO
 from pathlib import Path
 from typing import Dict, List, Any, Optional, Tuple
 from django.conf import settings
 from .models import Vibe
-from .vibe_utils import ensure_vibe_directory_exists
+from .vibe_utils import ensure_vibe_directory_exists, set_vibe_content
+from .render_utils import invalidate_vibe_page, refresh_vibe_page
+from .compression_utils import write_file_variants, remove_file_variants
+from .blob_utils import (
+    put_blob, put_blob_stream, link_blob, get_blob_path, lock_manifest, read_manifest, write_manifest, open_vibe_file
+)
+from .history_utils import record_version, read_index, get_version_content, delete_history
+from .file_index_utils import get_file_index, is_file_index_current, update_file_index
+from .search_utils import update_vibe_search, SEARCH_FILE_TYPES
+from .http_utils import get_session
 
 logger = logging.getLogger(__name__)
 
@@ -26,6 +35,9 @@ ALLOWED_FILE_TYPES = {
     'txt': '.txt',
 }
 
+# Vibe fields saved when the custom file flags change
+VIBE_FLAG_FIELDS = ['has_custom_html', 'has_custom_css', 'has_custom_js', 'updated_at']
+
 class VibeFileManager:
     """Class to manage files in a vibe directory."""
 
@@ -39,6 +51,37 @@ class VibeFileManager:
         self.vibe = vibe
         self.vibe_dir = ensure_vibe_directory_exists(vibe.slug)
 
+        # Writes held back by batch(), by file name, and changes from deletes
+        # within the batch that still need a vibe save, page refresh or
+        # search index update
+        self._pending = None
+        self._vibe_changed = False
+        self._page_stale = False
+        self._deleted = []
+        self._batch_lock = threading.Lock()
+
+    def _safe_path(self, filename: str) -> Path:
+        """
+        Get the path of a file name inside the vibe directory.
+
+        Absolute paths and names with '..' or hidden parts are refused, so a
+        file name can't reach another vibe's files or this vibe's manifest,
+        history and other bookkeeping.
+
+        Args:
+            filename: The name of the file
+
+        Returns:
+            Path object for the file
+
+        Raises:
+            ValueError: If the name would leave the vibe directory or is hidden
+        """
+        path = Path(filename)
+        if not path.parts or path.is_absolute() or any(part == '..' or part.startswith('.') for part in path.parts):
+            raise ValueError(f"Invalid file name: {filename}")
+        return self.vibe_dir / path
+
     def get_file_path(self, filename: str) -> Path:
         """
         Get the path to a file in the vibe directory.
@@ -48,12 +91,15 @@ class VibeFileManager:
 
         Returns:
             Path object for the file
+
+        Raises:
+            ValueError: If the name would leave the vibe directory (see _safe_path)
         """
         # Check if it's an image file
         image_extensions = ['.jpg', '.jpeg', '.png', '.gif', '.webp', '.svg']
         if any(filename.lower().endswith(ext) for ext in image_extensions):
             # Don't modify image filenames
-            return self.vibe_dir / filename
+            return self._safe_path(filename)
 
         # Ensure the filename has a valid extension for non-image files
         if not any(filename.endswith(ext) for ext in ALLOWED_FILE_TYPES.values()):
@@ -65,61 +111,27 @@ class VibeFileManager:
                 # Default to HTML if no extension is provided
                 filename = f"{filename}.html"
 
-        return self.vibe_dir / filename
+        return self._safe_path(filename)
+
+    def _relative_name(self, file_path: Path) -> str:
+        """Get the name of a file relative to the vibe directory."""
+        return file_path.relative_to(self.vibe_dir).as_posix()
 
     def list_files(self) -> List[Dict[str, Any]]:
         """
         List all files in the vibe directory.
 
+        Hidden files and directories (the manifest, history and compressed
+        variants) aren't listed.
+
         Returns:
             List of dictionaries with file information
         """
-        files = []
-
-        logger.error(f"CRITICAL DEBUG: list_files called for vibe: {self.vibe.slug}")
-        logger.error(f"CRITICAL DEBUG: Vibe directory: {self.vibe_dir}")
-        logger.error(f"CRITICAL DEBUG: Vibe directory exists: {self.vibe_dir.exists()}")
-
-        # Check if the directory exists
-        if not self.vibe_dir.exists():
-            logger.error(f"CRITICAL DEBUG: Vibe directory does not exist: {self.vibe_dir}")
-            return files
-
-        # List all files in the directory using os.listdir for debugging
-        try:
-            logger.error(f"CRITICAL DEBUG: Files in directory using os.listdir:")
-            for filename in os.listdir(str(self.vibe_dir)):
-                logger.error(f"CRITICAL DEBUG: - {filename}")
-        except Exception as e:
-            logger.error(f"CRITICAL DEBUG: Error listing directory with os.listdir: {str(e)}")
+        # Writes held back by batch() are stored first, so they are listed
+        self.flush()
 
-        # List all files in the directory using Path.iterdir()
-        try:
-            logger.error(f"CRITICAL DEBUG: Files in directory using Path.iterdir():")
-            for file_path in self.vibe_dir.iterdir():
-                logger.error(f"CRITICAL DEBUG: - {file_path.name} (is_file: {file_path.is_file()}, starts_with_dot: {file_path.name.startswith('.')})")
-
-                if file_path.is_file() and not file_path.name.startswith('.'):
-                    try:
-                        file_info = {
-                            'name': file_path.name,
-                            'path': str(file_path),
-                            'size': file_path.stat().st_size,
-                            'modified': file_path.stat().st_mtime,
-                            'type': file_path.suffix[1:] if file_path.suffix else 'unknown'
-                        }
-                        logger.error(f"CRITICAL DEBUG: Adding file to list: {file_info}")
-                        files.append(file_info)
-                    except Exception as e:
-                        logger.error(f"CRITICAL DEBUG: Error adding file {file_path.name} to list: {str(e)}")
-        except Exception as e:
-            logger.error(f"CRITICAL DEBUG: Error iterating directory: {str(e)}")
-
-        # Sort the files by name
-        sorted_files = sorted(files, key=lambda x: x['name'])
-        logger.error(f"CRITICAL DEBUG: Returning {len(sorted_files)} files")
-
-        return sorted_files
+        # The index checks the directory with a single stat
+        return get_file_index(self.vibe_dir)
 
     def read_file(self, filename: str) -> Dict[str, Any]:
         """
@@ -134,14 +146,16 @@ class VibeFileManager:
         try:
             file_path = self.get_file_path(filename)
 
-            if not file_path.exists():
-                return {
-                    'success': False,
-                    'error': f"File {filename} does not exist"
-                }
+            content = self._get_pending(file_path)
+            if content is None:
+                if not file_path.exists():
+                    return {
+                        'success': False,
+                        'error': f"File {filename} does not exist"
+                    }
 
-            with open(file_path, 'r') as f:
-                content = f.read()
+                with open_vibe_file(file_path, 'r') as f:
+                    content = f.read()
 
             return {
                 'success': True,
@@ -160,6 +174,10 @@ class VibeFileManager:
         """
         Write content to a file in the vibe directory.
 
+        The content is stored in the blob store (see blob_utils). Writing the
+        content a file already has does nothing. Inside batch(), the write is
+        held back until the end of the batch.
+
         Args:
             filename: The name of the file
             content: The content to write
@@ -174,46 +192,29 @@ class VibeFileManager:
                 self.vibe_dir.mkdir(parents=True, exist_ok=True)
 
             file_path = self.get_file_path(filename)
-            logger.info(f"Writing file: {file_path}")
-
-            # Check if the file already exists
-            file_existed = file_path.exists()
-            logger.info(f"File exists: {file_existed}")
-
-            # If the file exists, create a backup
-            if file_existed:
-                old_content = self.read_file(filename).get('content', '')
-                backup_path = file_path.with_suffix(f"{file_path.suffix}.bak")
-                with open(backup_path, 'w') as f:
-                    f.write(old_content)
-                logger.info(f"Created backup: {backup_path}")
-
-            # Write the new content
-            with open(file_path, 'w') as f:
-                f.write(content)
-            logger.info(f"Wrote {len(content)} bytes to {file_path}")
-
-            # Update the vibe's custom file flags
-            self._update_vibe_flags(filename)
-
-            # Verify the file was written
-            if file_path.exists():
-                logger.info(f"File exists after write: {file_path}")
-                logger.info(f"File size: {file_path.stat().st_size} bytes")
-            else:
-                logger.error(f"File does not exist after write: {file_path}")
-                return {
-                    'success': False,
-                    'error': f"File was not created: {filename}"
-                }
 
-            return {
-                'success': True,
-                'message': f"File {'updated' if file_existed else 'created'}: {file_path.name}",
-                'path': str(file_path),
-                'name': file_path.name,
-                'action': 'updated' if file_existed else 'created'
-            }
+            with self._batch_lock:
+                if self._pending is not None:
+                    file_existed = file_path.exists() or self._relative_name(file_path) in self._pending
+                    self._pending[self._relative_name(file_path)] = (filename, content)
+                    logger.info(f"Queued write of {file_path} until the end of the batch")
+                    return {
+                        'success': True,
+                        'message': f"File {'updated' if file_existed else 'created'}: {file_path.name}",
+                        'path': str(file_path),
+                        'name': file_path.name,
+                        'action': 'updated' if file_existed else 'created'
+                    }
+
+            result = self._store_file(file_path, content)
+
+            if result['action'] != 'unchanged':
+                # Update the vibe's custom file flags and recompile the page once, at write time
+                self._update_vibe_flags(filename)
+                refresh_vibe_page(self.vibe)
+                self._update_search(filename)
+
+            return result
         except Exception as e:
             logger.exception(f"Error writing file {filename}: {str(e)}")
             return {
@@ -221,29 +222,333 @@ class VibeFileManager:
                 'error': f"Error writing file: {str(e)}"
             }
 
-    def _update_vibe_flags(self, filename: str) -> None:
+    def _store_file(self, file_path: Path, content: str) -> Dict[str, Any]:
         """
-        Update the vibe's custom file flags based on the file extension.
+        Store the content of a file, its history and its compressed variants.
 
         Args:
-            filename: The name of the file
+            file_path: Path of the file
+            content: The content to write
+
+        Returns:
+            Dictionary with status and message
+        """
+        logger.info(f"Writing file: {file_path}")
+
+        # Check if the file already exists
+        file_existed = file_path.exists()
+
+        name = self._relative_name(file_path)
+        data = content.encode('utf-8')
+
+        with lock_manifest(self.vibe_dir):
+            manifest = read_manifest(self.vibe_dir)
+
+            digest = put_blob(data)
+            if file_existed and manifest.get(name) == digest and self._is_blob_link(file_path, digest):
+                logger.info(f"File unchanged, skipping write: {file_path}")
+                return {
+                    'success': True,
+                    'message': f"File unchanged: {file_path.name}",
+                    'path': str(file_path),
+                    'name': file_path.name,
+                    'action': 'unchanged'
+                }
+
+            # The old content becomes a delta in the file's history
+            old_content = None
+            if file_existed:
+                with open_vibe_file(file_path, 'r') as f:
+                    old_content = f.read()
+
+            # Write the new content. The file is replaced in one step, so
+            # readers never see a partially written file.
+            index_current = is_file_index_current(self.vibe_dir)
+            link_blob(digest, file_path)
+            manifest[name] = digest
+            write_manifest(self.vibe_dir, manifest)
+            version = record_version(self.vibe_dir, name, old_content, content, digest)
+            update_file_index(self.vibe_dir, name, digest, index_current)
+        logger.info(f"Wrote {len(data)} bytes to {file_path} (version {version})")
+
+        # Compress the file once, at write time
+        write_file_variants(self.vibe_dir, name, data)
+
+        # A content.json written by the AI builder becomes the vibe's content
+        if name == 'content.json':
+            self._update_vibe_content(content)
+
+        return {
+            'success': True,
+            'message': f"File {'updated' if file_existed else 'created'}: {file_path.name}",
+            'path': str(file_path),
+            'name': file_path.name,
+            'action': 'updated' if file_existed else 'created',
+            'version': version
+        }
+
+    @contextmanager
+    def batch(self):
+        """
+        Hold back file writes until the end of the block.
+
+        Repeated writes to the same file within the block are stored once,
+        with the last content, and the vibe flags and compiled page are
+        updated once for all files. Reads within the block see the pending
+        content. Batches don't nest; an inner batch is part of the outer one.
+        """
+        with self._batch_lock:
+            if self._pending is not None:
+                nested = True
+            else:
+                nested = False
+                self._pending = {}
+
+        if nested:
+            yield self
+            return
+
+        try:
+            yield self
+        finally:
+            self.flush()
+            with self._batch_lock:
+                self._pending = None
+
+    def flush(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Store the writes held back by batch().
+
+        Returns:
+            Dictionary mapping file names to write results
+        """
+        with self._batch_lock:
+            pending = list(self._pending.items()) if self._pending else []
+            if self._pending:
+                self._pending.clear()
+            vibe_changed, self._vibe_changed = self._vibe_changed, False
+            page_stale, self._page_stale = self._page_stale, False
+            deleted, self._deleted = self._deleted, []
+
+        results = {}
+        written = []
+        for name, (filename, content) in pending:
+            try:
+                result = self._store_file(self.get_file_path(filename), content)
+            except Exception as e:
+                logger.exception(f"Error writing file {filename}: {str(e)}")
+                result = {'success': False, 'error': f"Error writing file: {str(e)}"}
+            results[name] = result
+            if result.get('success') and result['action'] != 'unchanged':
+                written.append(filename)
+
+        if self._update_vibe_flags(*written, save=False) or vibe_changed:
+            self._save_vibe()
+        if written or page_stale:
+            refresh_vibe_page(self.vibe)
+        self._update_search(*written, *deleted)
+
+        return results
+
+    def apply_operations(self, operations: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Apply several file operations (read, write, delete) at once.
+
+        Operations are applied in order; reads see the writes before them.
+        Written files are stored together at the end, with a single update
+        of the vibe's flags and compiled page.
+
+        Args:
+            operations: List of dictionaries with ``operation``, ``filename``
+                and, for writes, ``content``
+
+        Returns:
+            Dictionary with status and the result for each operation, in order
+        """
+        with self._batch_lock:
+            nested = self._pending is not None
+
+        results = []
+        with self.batch():
+            for operation in operations:
+                kind = operation.get('operation', 'write')
+                filename = operation.get('filename') or ''
+                content = operation.get('content')
+
+                if not filename:
+                    result = {'success': False, 'error': "Filename cannot be empty."}
+                elif kind == 'read':
+                    result = self.read_file(filename)
+                elif kind == 'write':
+                    if isinstance(content, str):
+                        result = self.write_file(filename, content)
+                    else:
+                        result = {'success': False, 'error': f"Missing content for file: {filename}"}
+                elif kind == 'delete':
+                    result = self.delete_file(filename)
+                else:
+                    result = {'success': False, 'error': f"Unknown operation: {kind}"}
+                results.append(result)
+
+            # Outside an enclosing batch, report what was actually stored
+            stored = self.flush() if not nested else {}
+
+        for index, result in enumerate(results):
+            if result.get('action') in ('created', 'updated') and 'version' not in result:
+                results[index] = stored.get(self._relative_name(Path(result['path'])), result)
+
+        return {
+            'success': all(result.get('success', False) for result in results),
+            'results': results
+        }
+
+    def write_files(self, files: List[Dict[str, str]]) -> Dict[str, Any]:
+        """
+        Write several files at once (see apply_operations).
+
+        Args:
+            files: List of dictionaries with ``filename`` and ``content``
+
+        Returns:
+            Dictionary with status and the result for each file, in order
+        """
+        return self.apply_operations([
+            {'operation': 'write', 'filename': file.get('filename'), 'content': file.get('content')}
+            for file in files
+        ])
+
+    def read_files(self, filenames: List[str]) -> Dict[str, Any]:
+        """
+        Read several files at once.
+
+        Args:
+            filenames: The names of the files
+
+        Returns:
+            Dictionary with status and the result for each file, in order
+        """
+        results = [self.read_file(filename) for filename in filenames]
+        return {
+            'success': all(result.get('success', False) for result in results),
+            'results': results
+        }
+
+    def _get_pending(self, file_path: Path) -> Optional[str]:
+        """Get the content of a write to a file that is held back by batch()."""
+        with self._batch_lock:
+            if self._pending:
+                entry = self._pending.get(self._relative_name(file_path))
+                if entry is not None:
+                    return entry[1]
+        return None
+
+    def _is_blob_link(self, file_path: Path, digest: str) -> bool:
+        """Check whether a file is still a hard link to a blob."""
+        try:
+            return os.path.samefile(file_path, get_blob_path(digest))
+        except OSError:
+            return False
+
+    def _forget_files(self, *names: str) -> None:
+        """
+        Remove files from the vibe's manifest. Callers must hold the
+        manifest lock.
+
+        Args:
+            names: Names of the files relative to the vibe directory
+        """
+        manifest = read_manifest(self.vibe_dir)
+        if any(name in manifest for name in names):
+            for name in names:
+                manifest.pop(name, None)
+            write_manifest(self.vibe_dir, manifest)
+
+    def _update_vibe_flags(self, *filenames: str, save: bool = True) -> bool:
+        """
+        Update the vibe's custom file flags based on the file extensions.
+
+        The vibe is saved once, however many files are given.
+
+        Args:
+            filenames: The names of the files
+            save: Whether to save the vibe
+
+        Returns:
+            Whether any flag was set
+        """
+        changed = False
+        try:
+            for filename in filenames:
+                # Check if the file has a recognized extension
+                if filename.endswith('.html'):
+                    logger.info(f"Setting has_custom_html to True for vibe: {self.vibe.slug}")
+                    self.vibe.has_custom_html = True
+                    changed = True
+                elif filename.endswith('.css'):
+                    logger.info(f"Setting has_custom_css to True for vibe: {self.vibe.slug}")
+                    self.vibe.has_custom_css = True
+                    changed = True
+                elif filename.endswith('.js'):
+                    logger.info(f"Setting has_custom_js to True for vibe: {self.vibe.slug}")
+                    self.vibe.has_custom_js = True
+                    changed = True
+
+            if changed and save:
+                self._save_vibe()
+        except Exception as e:
+            logger.exception(f"Error updating vibe flags for {', '.join(filenames)}: {str(e)}")
+
+        return changed
+
+    def _clear_vibe_flags(self, filename: str) -> bool:
+        """
+        Clear the vibe's custom file flag for a deleted file's type if no
+        other file of that type is left. The vibe isn't saved.
+
+        Args:
+            filename: The name of the deleted file
+
+        Returns:
+            Whether a flag was cleared
         """
+        remaining = [f['name'] for f in get_file_index(self.vibe_dir)]
+        with self._batch_lock:
+            if self._pending:
+                remaining.extend(self._pending)
+
+        for extension, flag in (('.html', 'has_custom_html'), ('.css', 'has_custom_css'), ('.js', 'has_custom_js')):
+            if not filename.endswith(extension):
+                continue
+            # Check if there are any other files of this type
+            if getattr(self.vibe, flag) and not any(name.endswith(extension) for name in remaining):
+                logger.info(f"No more {extension} files, setting {flag} to False for vibe: {self.vibe.slug}")
+                setattr(self.vibe, flag, False)
+                return True
+        return False
+
+    def _update_search(self, *filenames: str) -> None:
+        """Update the vibe's search index row after HTML files changed."""
+        if any(Path(filename).suffix[1:].lower() in SEARCH_FILE_TYPES for filename in filenames):
+            update_vibe_search(self.vibe, title=False, files=True)
+
+    def _update_vibe_content(self, text: str) -> None:
+        """Store the content of a written content.json as the vibe's content."""
+        try:
+            content = json.loads(text)
+        except ValueError:
+            logger.warning(f"content.json of {self.vibe.slug} isn't valid JSON, keeping the vibe's content")
+            return
+
+        if isinstance(content, dict):
+            set_vibe_content(self.vibe, content, export=False)
+
+    def _save_vibe(self) -> None:
+        """Save the vibe after its flags changed."""
         try:
-            # Check if the file has a recognized extension
-            if filename.endswith('.html'):
-                logger.info(f"Setting has_custom_html to True for vibe: {self.vibe.slug}")
-                self.vibe.has_custom_html = True
-                self.vibe.save()
-            elif filename.endswith('.css'):
-                logger.info(f"Setting has_custom_css to True for vibe: {self.vibe.slug}")
-                self.vibe.has_custom_css = True
-                self.vibe.save()
-            elif filename.endswith('.js'):
-                logger.info(f"Setting has_custom_js to True for vibe: {self.vibe.slug}")
-                self.vibe.has_custom_js = True
-                self.vibe.save()
+            # Only the flags, so content stored meanwhile isn't overwritten
+            self.vibe.save(update_fields=VIBE_FLAG_FIELDS)
         except Exception as e:
-            logger.exception(f"Error updating vibe flags for {filename}: {str(e)}")
+            logger.exception(f"Error saving vibe {self.vibe.slug}: {str(e)}")
 
     def delete_file(self, filename: str) -> Dict[str, Any]:
         """
@@ -259,55 +564,70 @@ class VibeFileManager:
             logger.info(f"Attempting to delete file: {filename}")
 
             # Get the file path
-            file_path = self.vibe_dir / filename
+            file_path = self._safe_path(filename)
             logger.info(f"File path to delete: {file_path}")
 
+            # A write held back by batch() is dropped with the file
+            with self._batch_lock:
+                pending = self._pending.pop(self._relative_name(file_path), None) if self._pending else None
+
             # Check if the file exists
             if not file_path.exists():
+                if pending is not None:
+                    return {
+                        'success': True,
+                        'message': f"File deleted: {filename}",
+                        'path': str(file_path),
+                        'name': filename
+                    }
                 logger.warning(f"File does not exist: {file_path}")
                 return {
                     'success': False,
                     'error': f"File {filename} does not exist"
                 }
 
-            # Delete the file
-            os.remove(file_path)
-            logger.info(f"File successfully deleted: {file_path}")
-
-            # Also try to delete any backup file if it exists
+            name = self._relative_name(file_path)
             backup_path = Path(str(file_path) + ".bak")
-            if backup_path.exists():
-                try:
-                    os.remove(backup_path)
-                    logger.info(f"Backup file also deleted: {backup_path}")
-                except:
-                    # Ignore errors when deleting backup files
-                    pass
-
-            # Update vibe flags if necessary
-            if filename.endswith('.html') or filename == 'index.html':
-                # Check if there are any other HTML files
-                html_files = [f for f in os.listdir(self.vibe_dir) if f.endswith('.html')]
-                if not html_files:
-                    logger.info(f"No more HTML files, setting has_custom_html to False for vibe: {self.vibe.slug}")
-                    self.vibe.has_custom_html = False
-                    self.vibe.save()
-
-            elif filename.endswith('.css'):
-                # Check if there are any other CSS files
-                css_files = [f for f in os.listdir(self.vibe_dir) if f.endswith('.css')]
-                if not css_files:
-                    logger.info(f"No more CSS files, setting has_custom_css to False for vibe: {self.vibe.slug}")
-                    self.vibe.has_custom_css = False
-                    self.vibe.save()
-
-            elif filename.endswith('.js'):
-                # Check if there are any other JS files
-                js_files = [f for f in os.listdir(self.vibe_dir) if f.endswith('.js')]
-                if not js_files:
-                    logger.info(f"No more JS files, setting has_custom_js to False for vibe: {self.vibe.slug}")
-                    self.vibe.has_custom_js = False
-                    self.vibe.save()
+
+            with lock_manifest(self.vibe_dir):
+                index_current = is_file_index_current(self.vibe_dir)
+
+                # Delete the file
+                os.remove(file_path)
+                logger.info(f"File successfully deleted: {file_path}")
+
+                # Also try to delete any backup file if it exists
+                if backup_path.exists():
+                    try:
+                        os.remove(backup_path)
+                        logger.info(f"Backup file also deleted: {backup_path}")
+                    except:
+                        # Ignore errors when deleting backup files
+                        pass
+
+                # The blobs are collected once no other vibe uses them
+                self._forget_files(name, self._relative_name(backup_path))
+                update_file_index(self.vibe_dir, name, was_current=index_current)
+                update_file_index(self.vibe_dir, self._relative_name(backup_path), was_current=index_current)
+            delete_history(self.vibe_dir, name)
+
+            # Drop the compressed variants
+            remove_file_variants(self.vibe_dir, name)
+
+            # Update vibe flags if necessary and recompile the page, once
+            # for the whole batch within batch()
+            flags_changed = self._clear_vibe_flags(filename)
+            with self._batch_lock:
+                batched = self._pending is not None
+                if batched:
+                    self._vibe_changed = self._vibe_changed or flags_changed
+                    self._page_stale = True
+                    self._deleted.append(filename)
+            if not batched:
+                if flags_changed:
+                    self._save_vibe()
+                refresh_vibe_page(self.vibe)
+                self._update_search(filename)
 
             return {
                 'success': True,
@@ -340,47 +660,93 @@ class VibeFileManager:
                 url_path = image_url.split('?')[0]  # Remove query parameters
                 url_filename = url_path.split('/')[-1]
 
-                # If the URL doesn't have a filename with extension, generate one
-                if '.' not in url_filename:
-                    filename = f"image_{len(self.list_files()) + 1}.jpg"
-                else:
+                # If the URL doesn't have a filename with extension, one is
+                # generated from the image content once it is downloaded
+                if '.' in url_filename:
                     filename = url_filename
 
-            # Make sure the filename has an image extension
-            if not any(filename.lower().endswith(ext) for ext in ['.jpg', '.jpeg', '.png', '.gif', '.webp']):
-                filename += '.jpg'
-
-            # Create the file path
-            file_path = self.vibe_dir / filename
-
-            # Download the image
-            response = requests.get(image_url, stream=True)
-            if response.status_code != 200:
-                return {
-                    'success': False,
-                    'error': f"Failed to download image: HTTP {response.status_code}"
-                }
+            # Download the image (closing the response returns the connection to the pool)
+            with get_session().get(image_url, stream=True) as response:
+                if response.status_code != 200:
+                    return {
+                        'success': False,
+                        'error': f"Failed to download image: HTTP {response.status_code}"
+                    }
 
-            # Save the image to the vibe directory
-            with open(file_path, 'wb') as f:
+                # Store the image, once for all vibes that use it
                 response.raw.decode_content = True
-                shutil.copyfileobj(response.raw, f)
+                digest = put_blob_stream(response.raw)
 
-            # Return success with the file information
+            return self._link_image(digest, filename)
+        except Exception as e:
+            logger.exception(f"Error saving image {image_url}: {str(e)}")
             return {
-                'success': True,
-                'message': f"Image saved: {filename}",
-                'path': str(file_path),
-                'name': filename,
-                'url': f"/static/vibes/{self.vibe.slug}/{filename}"
+                'success': False,
+                'error': f"Error saving image: {str(e)}"
             }
+
+    def save_image_data(self, data: bytes, filename: str) -> Dict[str, Any]:
+        """
+        Save image bytes (e.g. an upload) to the vibe directory.
+
+        Args:
+            data: The image content
+            filename: The filename to use
+
+        Returns:
+            Dictionary with status and file information
+        """
+        try:
+            return self._link_image(put_blob(data), filename)
         except Exception as e:
-            logger.exception(f"Error saving image {image_url}: {str(e)}")
+            logger.exception(f"Error saving image {filename}: {str(e)}")
             return {
                 'success': False,
                 'error': f"Error saving image: {str(e)}"
             }
 
+    def _link_image(self, digest: str, filename: Optional[str]) -> Dict[str, Any]:
+        """
+        Put a stored image in place in the vibe directory.
+
+        Args:
+            digest: The blob hash of the image
+            filename: The filename to use (generated from the hash if empty)
+
+        Returns:
+            Dictionary with status and file information
+        """
+        if not filename:
+            filename = f"image_{digest[:12]}.jpg"
+
+        # Make sure the filename has an image extension
+        if not any(filename.lower().endswith(ext) for ext in ['.jpg', '.jpeg', '.png', '.gif', '.webp']):
+            filename += '.jpg'
+
+        # Create the file path
+        file_path = self._safe_path(filename)
+
+        # Save the image to the vibe directory
+        with lock_manifest(self.vibe_dir):
+            index_current = is_file_index_current(self.vibe_dir)
+            manifest = read_manifest(self.vibe_dir)
+            link_blob(digest, file_path)
+            manifest[self._relative_name(file_path)] = digest
+            write_manifest(self.vibe_dir, manifest)
+            update_file_index(self.vibe_dir, self._relative_name(file_path), digest, index_current)
+
+        # Make any cached validators for the vibe's files stale
+        invalidate_vibe_page(self.vibe.slug)
+
+        # Return success with the file information
+        return {
+            'success': True,
+            'message': f"Image saved: {filename}",
+            'path': str(file_path),
+            'name': filename,
+            'url': f"/static/vibes/{self.vibe.slug}/{filename}"
+        }
+
     def get_diff(self, filename: str, new_content: str) -> Dict[str, Any]:
         """
         Get the diff between the current file content and new content.
@@ -395,16 +761,18 @@ class VibeFileManager:
         try:
             file_path = self.get_file_path(filename)
 
-            if not file_path.exists():
-                return {
-                    'success': True,
-                    'diff': new_content,
-                    'is_new_file': True
-                }
-
             # Read the current content
-            with open(file_path, 'r') as f:
-                current_content = f.read()
+            current_content = self._get_pending(file_path)
+            if current_content is None:
+                if not file_path.exists():
+                    return {
+                        'success': True,
+                        'diff': new_content,
+                        'is_new_file': True
+                    }
+
+                with open_vibe_file(file_path, 'r') as f:
+                    current_content = f.read()
 
             # Generate the diff
             diff = difflib.unified_diff(
@@ -425,3 +793,130 @@ class VibeFileManager:
                 'success': False,
                 'error': f"Error generating diff: {str(e)}"
             }
+
+    def list_versions(self, filename: str) -> Dict[str, Any]:
+        """
+        List the versions of a file, newest first.
+
+        Args:
+            filename: The name of the file
+
+        Returns:
+            Dictionary with the versions or error message
+        """
+        try:
+            self.flush()
+            file_path = self.get_file_path(filename)
+            versions = read_index(self.vibe_dir, self._relative_name(file_path))
+
+            return {
+                'success': True,
+                'name': file_path.name,
+                'versions': [
+                    {
+                        'version': entry['version'],
+                        'size': entry['size'],
+                        'created_at': entry['created_at'],
+                        'current': entry['kind'] == 'current'
+                    }
+                    for entry in reversed(versions)
+                ]
+            }
+        except Exception as e:
+            logger.exception(f"Error listing versions of {filename}: {str(e)}")
+            return {
+                'success': False,
+                'error': f"Error listing versions: {str(e)}"
+            }
+
+    def read_version(self, filename: str, version: int) -> Dict[str, Any]:
+        """
+        Read an earlier version of a file.
+
+        Args:
+            filename: The name of the file
+            version: The version number
+
+        Returns:
+            Dictionary with the content of the version or error message
+        """
+        self.flush()
+        current = self.read_file(filename)
+        if not current.get('success', False):
+            return current
+
+        try:
+            file_path = self.get_file_path(filename)
+            content = get_version_content(self.vibe_dir, self._relative_name(file_path), version, current['content'])
+            if content is None:
+                return {
+                    'success': False,
+                    'error': f"Version {version} of {filename} does not exist"
+                }
+
+            return {
+                'success': True,
+                'content': content,
+                'name': file_path.name,
+                'version': version
+            }
+        except Exception as e:
+            logger.exception(f"Error reading version {version} of {filename}: {str(e)}")
+            return {
+                'success': False,
+                'error': f"Error reading version: {str(e)}"
+            }
+
+    def diff_versions(self, filename: str, from_version: int, to_version: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Get the diff between two versions of a file.
+
+        Args:
+            filename: The name of the file
+            from_version: The older version number
+            to_version: The newer version number (defaults to the current content)
+
+        Returns:
+            Dictionary with diff information
+        """
+        old = self.read_version(filename, from_version)
+        if not old.get('success', False):
+            return old
+
+        new = self.read_version(filename, to_version) if to_version is not None else self.read_file(filename)
+        if not new.get('success', False):
+            return new
+
+        diff = difflib.unified_diff(
+            old['content'].splitlines(keepends=True),
+            new['content'].splitlines(keepends=True),
+            fromfile=f"a/{filename}@{from_version}",
+            tofile=f"b/{filename}@{to_version if to_version is not None else 'current'}"
+        )
+
+        return {
+            'success': True,
+            'diff': ''.join(diff),
+            'is_new_file': False
+        }
+
+    def restore_version(self, filename: str, version: int) -> Dict[str, Any]:
+        """
+        Restore an earlier version of a file. The restore is a new version.
+
+        Args:
+            filename: The name of the file
+            version: The version number to restore
+
+        Returns:
+            Dictionary with status and message
+        """
+        old = self.read_version(filename, version)
+        if not old.get('success', False):
+            return old
+
+        result = self.write_file(filename, old['content'])
+        if result.get('success', False):
+            result['message'] = f"Restored version {version} of {filename}"
+            result['restored_version'] = version
+        return result
@@ -0,0 +1,128 @@
+"""
+Safe file writes for vibe content.
+
+Files are written to a temporary file next to the target and renamed over
+it, so a reader (e.g. a page view) sees either the old or the new file,
+never a partially written one.
+
+VIBE_FSYNC_POLICY controls how durable writes are:
+
+- ``none``: rely on the OS to flush data (fastest)
+- ``file``: fsync each file before it is renamed into place
+- ``full``: also fsync the directory, so the rename survives a crash
+"""
+import os
+import uuid
+import logging
+from pathlib import Path
+from typing import Optional
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# How durable file writes are: 'none', 'file' or 'full'
+VIBE_FSYNC_POLICY = getattr(settings, 'VIBE_FSYNC_POLICY', 'none')
+
+
+def get_temp_path(path: Path) -> Path:
+    """
+    Get a hidden, unique temporary path next to a file.
+
+    Args:
+        path: Path of the file
+
+    Returns:
+        The temporary path
+    """
+    return path.parent / f".{path.name}.{uuid.uuid4().hex}.tmp"
+
+
+def fsync_file(f, policy: Optional[str] = None) -> None:
+    """
+    Flush an open file to disk if the fsync policy asks for it.
+
+    Args:
+        f: The open file
+        policy: The fsync policy (defaults to VIBE_FSYNC_POLICY)
+    """
+    if (policy or VIBE_FSYNC_POLICY) in ('file', 'full'):
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def fsync_directory(path: Path, policy: Optional[str] = None) -> None:
+    """
+    Flush a directory to disk if the fsync policy asks for it, so renames
+    and new links in it are durable.
+
+    Args:
+        path: Path of the directory
+        policy: The fsync policy (defaults to VIBE_FSYNC_POLICY)
+    """
+    if (policy or VIBE_FSYNC_POLICY) != 'full':
+        return
+
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError as e:
+        logger.warning(f"Could not open {path} to fsync it: {str(e)}")
+        return
+    try:
+        os.fsync(fd)
+    except OSError as e:
+        # Not every platform can fsync a directory
+        logger.debug(f"Could not fsync directory {path}: {str(e)}")
+    finally:
+        os.close(fd)
+
+
+def replace_file(temp_path: Path, path: Path, policy: Optional[str] = None) -> None:
+    """
+    Move a finished temporary file over its target in one step.
+
+    Args:
+        temp_path: Path of the temporary file
+        path: Path of the target
+        policy: The fsync policy (defaults to VIBE_FSYNC_POLICY)
+    """
+    try:
+        os.replace(temp_path, path)
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        raise
+    fsync_directory(path.parent, policy)
+
+
+def atomic_write(path: Path, data: bytes, policy: Optional[str] = None) -> None:
+    """
+    Write a file so that readers never see it partially written.
+
+    Args:
+        path: Path of the file
+        data: The content
+        policy: The fsync policy (defaults to VIBE_FSYNC_POLICY)
+    """
+    path = Path(path)
+    temp_path = get_temp_path(path)
+
+    try:
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+            fsync_file(f, policy)
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        raise
+
+    replace_file(temp_path, path, policy)
+
+
+def atomic_write_text(path: Path, text: str, policy: Optional[str] = None) -> None:
+    """
+    Write a text file (UTF-8) so that readers never see it partially written.
+
+    Args:
+        path: Path of the file
+        text: The content
+        policy: The fsync policy (defaults to VIBE_FSYNC_POLICY)
+    """
+    atomic_write(path, text.encode('utf-8'), policy)
@@ -0,0 +1,250 @@
+"""
+Version history for vibe files.
+
+Every write through VibeFileManager adds a version to the file's history:
+
+- The latest version is the file itself (its blob, see blob_utils), so
+  reading it costs nothing extra.
+- Each older version is stored as a zlib-compressed reverse delta: the line
+  edits that turn the next version back into it.
+- Every VIBE_HISTORY_SNAPSHOT_INTERVAL versions a full (compressed) snapshot
+  is stored instead, so rebuilding any version applies at most that many
+  deltas.
+
+Histories live in the hidden .history directory of each vibe directory,
+one directory per file with an index.json and one .z file per stored
+version. Only the last VIBE_HISTORY_MAX_VERSIONS versions are kept.
+"""
+import json
+import zlib
+import time
+import shutil
+import difflib
+import logging
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from urllib.parse import quote
+from django.conf import settings
+from .fs_utils import atomic_write, atomic_write_text
+
+logger = logging.getLogger(__name__)
+
+# Number of versions kept per file
+VIBE_HISTORY_MAX_VERSIONS = getattr(settings, 'VIBE_HISTORY_MAX_VERSIONS', 50)
+
+# Every this many versions a full snapshot is stored instead of a delta
+VIBE_HISTORY_SNAPSHOT_INTERVAL = getattr(settings, 'VIBE_HISTORY_SNAPSHOT_INTERVAL', 10)
+
+# Hidden directory inside each vibe directory that holds the histories
+HISTORY_DIR_NAME = '.history'
+
+INDEX_NAME = 'index.json'
+
+# Kinds of history entries
+CURRENT = 'current'
+DELTA = 'delta'
+SNAPSHOT = 'snapshot'
+
+
+def get_history_dir(vibe_dir: Path, name: str) -> Path:
+    """
+    Get the directory that holds the history of a file.
+
+    Args:
+        vibe_dir: The vibe directory
+        name: Name of the file relative to the vibe directory
+
+    Returns:
+        Path of the history directory
+    """
+    return vibe_dir / HISTORY_DIR_NAME / quote(name, safe='')
+
+
+def read_index(vibe_dir: Path, name: str) -> List[Dict[str, Any]]:
+    """
+    Read the list of versions of a file, oldest first.
+
+    Args:
+        vibe_dir: The vibe directory
+        name: Name of the file relative to the vibe directory
+
+    Returns:
+        List of version entries
+    """
+    try:
+        with open(get_history_dir(vibe_dir, name) / INDEX_NAME, 'r') as f:
+            return json.load(f)['versions']
+    except FileNotFoundError:
+        return []
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning(f"Ignoring unreadable history for {name} in {vibe_dir}: {str(e)}")
+        return []
+
+
+def _write_index(history_dir: Path, versions: List[Dict[str, Any]]) -> None:
+    atomic_write_text(history_dir / INDEX_NAME, json.dumps({'versions': versions}))
+
+
+def make_delta(base: str, target: str) -> List[Any]:
+    """
+    Get the line edits that turn one text into another.
+
+    Args:
+        base: The text the edits apply to
+        target: The text the edits produce
+
+    Returns:
+        List of operations: ``[start, end]`` copies lines of the base and
+        a list of strings inserts those lines
+    """
+    base_lines = base.splitlines(keepends=True)
+    target_lines = target.splitlines(keepends=True)
+
+    operations = []
+    matcher = difflib.SequenceMatcher(None, base_lines, target_lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            operations.append([i1, i2])
+        elif j2 > j1:
+            operations.append(target_lines[j1:j2])
+    return operations
+
+
+def apply_delta(base: str, delta: List[Any]) -> str:
+    """
+    Apply line edits made by make_delta.
+
+    Args:
+        base: The text the edits apply to
+        delta: The edits
+
+    Returns:
+        The resulting text
+    """
+    base_lines = base.splitlines(keepends=True)
+    parts = []
+    for operation in delta:
+        if operation and isinstance(operation[0], int):
+            parts.extend(base_lines[operation[0]:operation[1]])
+        else:
+            parts.extend(operation)
+    return ''.join(parts)
+
+
+def _write_data(history_dir: Path, version: int, data: Any) -> None:
+    atomic_write(history_dir / f"{version}.z", zlib.compress(json.dumps(data).encode('utf-8')))
+
+
+def _read_data(history_dir: Path, version: int) -> Any:
+    with open(history_dir / f"{version}.z", 'rb') as f:
+        return json.loads(zlib.decompress(f.read()).decode('utf-8'))
+
+
+def record_version(vibe_dir: Path, name: str, old_content: Optional[str], new_content: str,
+                   digest: str) -> int:
+    """
+    Add a new latest version to the history of a file.
+
+    The previous latest version is stored as a delta against the new content
+    (or as a snapshot). Callers must hold the vibe's manifest lock.
+
+    Args:
+        vibe_dir: The vibe directory
+        name: Name of the file relative to the vibe directory
+        old_content: Content the file had before the write, None for a new file
+        new_content: The new content
+        digest: Blob hash of the new content
+
+    Returns:
+        The new version number
+    """
+    history_dir = get_history_dir(vibe_dir, name)
+    versions = read_index(vibe_dir, name)
+    now = time.time()
+
+    # A new file doesn't continue the history of a deleted one
+    if versions and old_content is None:
+        delete_history(vibe_dir, name)
+        versions = []
+
+    history_dir.mkdir(parents=True, exist_ok=True)
+
+    # A file written before it had a history starts with its old content
+    if not versions and old_content is not None:
+        versions.append({'version': 1, 'kind': CURRENT, 'size': len(old_content), 'created_at': now})
+
+    if versions and old_content is not None:
+        previous = versions[-1]
+        if previous['version'] % VIBE_HISTORY_SNAPSHOT_INTERVAL == 0:
+            _write_data(history_dir, previous['version'], old_content)
+            previous['kind'] = SNAPSHOT
+        else:
+            _write_data(history_dir, previous['version'], make_delta(new_content, old_content))
+            previous['kind'] = DELTA
+        previous.pop('digest', None)
+
+    version = versions[-1]['version'] + 1 if versions else 1
+    versions.append({
+        'version': version,
+        'kind': CURRENT,
+        'digest': digest,
+        'size': len(new_content),
+        'created_at': now,
+    })
+
+    # Older versions are rebuilt from newer ones, so the oldest can go
+    while len(versions) > VIBE_HISTORY_MAX_VERSIONS:
+        dropped = versions.pop(0)
+        (history_dir / f"{dropped['version']}.z").unlink(missing_ok=True)
+
+    _write_index(history_dir, versions)
+    return version
+
+
+def get_version_content(vibe_dir: Path, name: str, version: int, current_content: str) -> Optional[str]:
+    """
+    Rebuild the content of a version of a file.
+
+    Args:
+        vibe_dir: The vibe directory
+        name: Name of the file relative to the vibe directory
+        version: The version number
+        current_content: The current content of the file (the latest version)
+
+    Returns:
+        The content, or None if the version isn't in the history
+    """
+    versions = read_index(vibe_dir, name)
+    numbers = [entry['version'] for entry in versions]
+    if version not in numbers:
+        return None
+
+    history_dir = get_history_dir(vibe_dir, name)
+    start = numbers.index(version)
+
+    # Find the closest newer snapshot (or the current content) ...
+    base = start
+    while versions[base]['kind'] == DELTA:
+        base += 1
+
+    if versions[base]['kind'] == CURRENT:
+        content = current_content
+    else:
+        content = _read_data(history_dir, versions[base]['version'])
+
+    # ... and walk back to the version
+    for index in range(base - 1, start - 1, -1):
+        content = apply_delta(content, _read_data(history_dir, versions[index]['version']))
+
+    return content
+
+
+def delete_history(vibe_dir: Path, name: str) -> None:
+    """
+    Delete the history of a file.
+
+    Args:
+        vibe_dir: The vibe directory
+        name: Name of the file relative to the vibe directory
+    """
+    shutil.rmtree(get_history_dir(vibe_dir, name), ignore_errors=True)
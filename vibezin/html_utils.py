@@ -164,3 +164,25 @@ def extract_image_references(html_content: str) -> List[Dict[str, Any]]:
     except Exception as e:
         logger.exception(f"Error extracting image references: {str(e)}")
         return []
+
+def extract_text(html_content: str) -> str:
+    """
+    Extract the visible text from HTML content (e.g. for the search index).
+
+    Args:
+        html_content: The HTML content to extract the text from
+
+    Returns:
+        The text, with whitespace collapsed
+    """
+    try:
+        soup = BeautifulSoup(html_content, 'html.parser')
+
+        # Scripts and styles aren't text a visitor would search for
+        for tag in soup(['script', 'style', 'noscript', 'template']):
+            tag.decompose()
+
+        return ' '.join(soup.get_text(' ').split())
+    except Exception as e:
+        logger.error(f"Error extracting text from HTML: {str(e)}")
+        return ''
@@ -0,0 +1,153 @@
+"""
+Shared HTTP clients for calls to external services (OpenAI, DALL-E, Pinata).
+
+Opening a new connection for every call means a fresh TCP and TLS handshake
+each time, which adds up when the O1 reasoning loop calls OpenAI several
+times in a row. These clients keep connections alive and pool them per host,
+so back-to-back calls reuse the same connection.
+
+Use get_session() from synchronous code and get_async_client() from async
+code. Pool sizes and timeouts can be tuned in settings (HTTP_POOL_CONNECTIONS,
+HTTP_POOL_MAXSIZE, HTTP_ASYNC_MAX_CONNECTIONS, HTTP_CONNECT_TIMEOUT,
+HTTP_READ_TIMEOUT, HTTP_ASYNC_POOL_TIMEOUT and HTTP_KEEPALIVE_EXPIRY).
+"""
+import asyncio
+import logging
+import threading
+import weakref
+from http.cookiejar import DefaultCookiePolicy
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Number of hosts to keep a connection pool for
+HTTP_POOL_CONNECTIONS = getattr(settings, 'HTTP_POOL_CONNECTIONS', 10)
+
+# Number of connections to keep alive per host
+HTTP_POOL_MAXSIZE = getattr(settings, 'HTTP_POOL_MAXSIZE', 20)
+
+# Number of connections the async client may have open at once, across all
+# hosts. Every async session waiting on OpenAI holds one, so this is much
+# larger than the sync pool (None for no limit).
+HTTP_ASYNC_MAX_CONNECTIONS = getattr(settings, 'HTTP_ASYNC_MAX_CONNECTIONS', 1000)
+
+# Default timeouts in seconds, used when a call doesn't pass its own
+HTTP_CONNECT_TIMEOUT = getattr(settings, 'HTTP_CONNECT_TIMEOUT', 10)
+HTTP_READ_TIMEOUT = getattr(settings, 'HTTP_READ_TIMEOUT', 60)
+
+# How long an async call waits for a free connection when the pool is full,
+# in seconds, before failing instead of queueing behind slow calls
+HTTP_ASYNC_POOL_TIMEOUT = getattr(settings, 'HTTP_ASYNC_POOL_TIMEOUT', 5)
+
+# How long an idle connection is kept open by the async client, in seconds
+HTTP_KEEPALIVE_EXPIRY = getattr(settings, 'HTTP_KEEPALIVE_EXPIRY', 30)
+
+_session = None
+_session_lock = threading.Lock()
+_async_clients = weakref.WeakKeyDictionary()
+_async_client_closers = set()
+
+
+class TimeoutHTTPAdapter(HTTPAdapter):
+    """HTTP adapter that applies a default timeout to every request."""
+
+    def __init__(self, *args, timeout=None, **kwargs):
+        self.timeout = timeout
+        super().__init__(*args, **kwargs)
+
+    def send(self, request, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.timeout
+        return super().send(request, **kwargs)
+
+
+def create_session() -> requests.Session:
+    """
+    Create a requests session with pooled, keep-alive connections.
+
+    Returns:
+        A new requests.Session
+    """
+    session = requests.Session()
+
+    adapter = TimeoutHTTPAdapter(
+        pool_connections=HTTP_POOL_CONNECTIONS,
+        pool_maxsize=HTTP_POOL_MAXSIZE,
+        timeout=(HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+    )
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+
+    # The session is shared by every user, so never keep cookies between calls
+    session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+
+    return session
+
+
+def get_session() -> requests.Session:
+    """
+    Get the shared requests session for the current process.
+
+    The session is safe to use from several threads at once; each host gets
+    its own connection pool.
+
+    Returns:
+        The shared requests.Session
+    """
+    global _session
+
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                logger.info(f"Creating shared HTTP session (pool_maxsize={HTTP_POOL_MAXSIZE})")
+                _session = create_session()
+
+    return _session
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """
+    Get the shared httpx client for the running event loop.
+
+    httpx clients can't be shared between event loops, so there is one client
+    per loop, closed when the loop shuts down. Under an ASGI server that is
+    one client for the life of the process. Under WSGI, async views run on a
+    new loop per request, so each request gets (and closes) its own client;
+    AI_ASYNC_VIEWS is meant for ASGI deployments.
+
+    Returns:
+        The shared httpx.AsyncClient
+    """
+    loop = asyncio.get_running_loop()
+
+    client = _async_clients.get(loop)
+    if client is None or client.is_closed:
+        logger.info(f"Creating shared async HTTP client (max_connections={HTTP_ASYNC_MAX_CONNECTIONS})")
+        client = httpx.AsyncClient(
+            timeout=httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT, pool=HTTP_ASYNC_POOL_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=HTTP_ASYNC_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_ASYNC_MAX_CONNECTIONS,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+            )
+        )
+        _async_clients[loop] = client
+
+        # asyncio.run(), asgiref and ASGI servers cancel the tasks left on a
+        # loop before closing it, which closes the client's connections
+        closer = loop.create_task(_close_on_shutdown(client))
+        _async_client_closers.add(closer)
+        closer.add_done_callback(_async_client_closers.discard)
+
+    return client
+
+
+async def _close_on_shutdown(client: httpx.AsyncClient) -> None:
+    """Wait until the event loop shuts down, then close the client."""
+    try:
+        await asyncio.get_running_loop().create_future()
+    finally:
+        await client.aclose()
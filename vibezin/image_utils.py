@@ -4,7 +4,6 @@ Utility functions for AI image generation using DALL-E.
 import os
 import json
 import logging
-import requests
 from io import BytesIO
 from typing import Dict, Any, Tuple, Optional
 from django.conf import settings
@@ -14,6 +13,8 @@ from django.core.files.base import ContentFile
 import uuid
 
 from .utils import upload_to_ipfs
+from .http_utils import get_session
+from .rate_limit_utils import RateLimitExceeded, send_with_rate_limit
 
 logger = logging.getLogger(__name__)
 
@@ -57,10 +58,14 @@ def generate_image(
         
         logger.info(f"Sending request to DALL-E API with prompt: {prompt[:50]}...")
         
-        response = requests.post(
-            DALLE_ENDPOINT,
-            headers=headers,
-            json=payload
+        response = send_with_rate_limit(
+            api_key,
+            lambda: get_session().post(
+                DALLE_ENDPOINT,
+                headers=headers,
+                json=payload
+            ),
+            images=payload["n"]
         )
         
         if response.status_code == 200:
@@ -77,8 +82,17 @@ def generate_image(
             return {
                 "success": False,
                 "error": f"DALL-E API error: {response.status_code}",
-                "details": response.text
+                "details": response.text,
+                "status_code": response.status_code
             }
+    except RateLimitExceeded as e:
+        logger.warning(f"DALL-E request rejected by the rate limiter: {str(e)}")
+        return {
+            "success": False,
+            "error": str(e),
+            "status_code": 429,
+            "retry_after": e.retry_after
+        }
     except Exception as e:
         logger.exception(f"Error generating image: {str(e)}")
         return {
@@ -97,7 +111,7 @@ def download_image(image_url: str) -> Optional[BytesIO]:
         BytesIO object containing the image data or None if download failed
     """
     try:
-        response = requests.get(image_url, stream=True)
+        response = get_session().get(image_url, stream=True)
         if response.status_code == 200:
             image_data = BytesIO(response.content)
             return image_data
@@ -0,0 +1,318 @@
+"""
+Database-backed background jobs.
+
+Slow work that talks to external services (DALL-E, downloading the result,
+pinning it to IPFS) is recorded as a BackgroundJob and run by the worker
+started with ``python manage.py run_jobs``, so web requests can return right
+away with a job ID that the browser polls.
+
+Jobs are retried with exponential backoff. Handlers save the result of each
+completed step on the job, so a retry picks up where the last attempt
+stopped instead of, say, paying for a second image generation.
+"""
+import os
+import random
+import socket
+import logging
+from datetime import timedelta
+from typing import Dict, Any, Optional, Tuple
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from .models import BackgroundJob
+
+logger = logging.getLogger(__name__)
+
+# Delay before the first retry, doubled for every further attempt (seconds)
+JOB_RETRY_BASE_DELAY = getattr(settings, 'JOB_RETRY_BASE_DELAY', 10)
+
+# Upper bound for the retry delay (seconds)
+JOB_RETRY_MAX_DELAY = getattr(settings, 'JOB_RETRY_MAX_DELAY', 600)
+
+# A running job whose worker hasn't finished it within this time is
+# considered abandoned (e.g. the worker crashed) and is picked up again
+JOB_LOCK_TIMEOUT = getattr(settings, 'JOB_LOCK_TIMEOUT', 600)
+
+
+def get_worker_id() -> str:
+    """Get an identifier for the current worker process."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def get_retry_delay(attempts: int) -> float:
+    """
+    Get the delay before retrying a job.
+
+    Args:
+        attempts: The number of attempts made so far
+
+    Returns:
+        The delay in seconds, with jitter so failed jobs don't retry in lockstep
+    """
+    delay = min(JOB_RETRY_BASE_DELAY * (2 ** max(attempts - 1, 0)), JOB_RETRY_MAX_DELAY)
+    return delay * random.uniform(0.5, 1.0)
+
+
+def enqueue_job(user, job_type: str, payload: Dict[str, Any], vibe=None,
+                idempotency_key: Optional[str] = None) -> Tuple[BackgroundJob, bool]:
+    """
+    Add a job to the queue.
+
+    If the user already submitted a job with the same idempotency key, that
+    job is returned instead of creating a new one.
+
+    Args:
+        user: The user the job runs for
+        job_type: The type of job (see BackgroundJob.JOB_TYPES)
+        payload: The job arguments
+        vibe: Optional vibe the job belongs to
+        idempotency_key: Optional client-supplied key
+
+    Returns:
+        Tuple of the job and whether it was created
+    """
+    if idempotency_key:
+        existing = BackgroundJob.objects.filter(user=user, idempotency_key=idempotency_key).first()
+        if existing:
+            logger.info(f"Returning existing job {existing.id} for idempotency key {idempotency_key}")
+            return existing, False
+
+    try:
+        with transaction.atomic():
+            job = BackgroundJob.objects.create(
+                user=user,
+                vibe=vibe,
+                job_type=job_type,
+                payload=payload,
+                idempotency_key=idempotency_key or None
+            )
+    except IntegrityError:
+        # Another request with the same key got there first
+        return BackgroundJob.objects.get(user=user, idempotency_key=idempotency_key), False
+
+    logger.info(f"Enqueued {job_type} job {job.id} for user {user.username}")
+    return job, True
+
+
+def claim_job(job: BackgroundJob, worker_id: str) -> bool:
+    """
+    Try to take a job for a worker.
+
+    The claim is a conditional update, so two workers can never both run the
+    same job.
+
+    Args:
+        job: The job to claim
+        worker_id: The identifier of the worker
+
+    Returns:
+        True if the job was claimed
+    """
+    now = timezone.now()
+    claimed = BackgroundJob.objects.filter(
+        pk=job.pk,
+        status=job.status,
+        locked_at=job.locked_at
+    ).update(
+        status=BackgroundJob.STATUS_RUNNING,
+        attempts=job.attempts + 1,
+        locked_at=now,
+        locked_by=worker_id,
+        updated_at=now
+    )
+    if not claimed:
+        return False
+
+    job.status = BackgroundJob.STATUS_RUNNING
+    job.attempts += 1
+    job.locked_at = now
+    job.locked_by = worker_id
+    return True
+
+
+def claim_next_job(worker_id: str) -> Optional[BackgroundJob]:
+    """
+    Claim the next job that is due.
+
+    Args:
+        worker_id: The identifier of the worker
+
+    Returns:
+        The claimed job, or None if there is nothing to do
+    """
+    now = timezone.now()
+    due = BackgroundJob.objects.filter(
+        Q(status=BackgroundJob.STATUS_PENDING, run_after__lte=now) |
+        Q(status=BackgroundJob.STATUS_RUNNING, locked_at__lt=now - timedelta(seconds=JOB_LOCK_TIMEOUT))
+    ).order_by('run_after', 'id')
+
+    for job in due[:10]:
+        if claim_job(job, worker_id):
+            return job
+
+    return None
+
+
+def run_job(job: BackgroundJob, retry: bool = True) -> BackgroundJob:
+    """
+    Run a claimed job and record the outcome.
+
+    Handlers return a dictionary with a 'success' flag. Failures are retried
+    with backoff until max_attempts is reached, unless the handler marks them
+    with 'retryable': False.
+
+    Args:
+        job: The job, claimed by the current worker
+        retry: Whether a failure may be retried later; if False it is final
+
+    Returns:
+        The updated job
+    """
+    handler = JOB_HANDLERS.get(job.job_type)
+
+    logger.info(f"Running {job.job_type} job {job.id} (attempt {job.attempts}/{job.max_attempts})")
+    try:
+        if handler is None:
+            outcome = {"success": False, "error": f"Unknown job type: {job.job_type}", "retryable": False}
+        else:
+            outcome = handler(job)
+    except Exception as e:
+        logger.exception(f"Error running job {job.id}: {str(e)}")
+        outcome = {"success": False, "error": str(e)}
+
+    now = timezone.now()
+    if outcome.get('success', False):
+        job.status = BackgroundJob.STATUS_SUCCEEDED
+        job.error = ''
+        job.completed_at = now
+        logger.info(f"Job {job.id} succeeded")
+    elif retry and outcome.get('retryable', True) and job.attempts < job.max_attempts:
+        delay = get_retry_delay(job.attempts)
+        job.status = BackgroundJob.STATUS_PENDING
+        job.error = outcome.get('error', 'Unknown error')
+        job.run_after = now + timedelta(seconds=delay)
+        logger.warning(f"Job {job.id} failed, retrying in {delay:.0f}s: {job.error}")
+    else:
+        job.status = BackgroundJob.STATUS_FAILED
+        job.error = outcome.get('error', 'Unknown error')
+        job.completed_at = now
+        logger.error(f"Job {job.id} failed: {job.error}")
+
+    job.locked_at = None
+    job.locked_by = ''
+    job.save()
+    return job
+
+
+def run_job_now(job: BackgroundJob, retry: bool = True) -> BackgroundJob:
+    """
+    Run a pending job in the current process instead of waiting for a worker.
+
+    Used where the caller needs the result straight away. If a worker has
+    already claimed the job, it is left alone.
+
+    Args:
+        job: The job to run
+        retry: Whether a failure may be retried later by a worker. Callers
+            that report the failure themselves pass False, so the work isn't
+            done (and paid for) a second time behind their back.
+
+    Returns:
+        The updated job
+    """
+    if job.status == BackgroundJob.STATUS_PENDING and claim_job(job, get_worker_id()):
+        return run_job(job, retry=retry)
+
+    job.refresh_from_db()
+    return job
+
+
+def save_job_progress(job: BackgroundJob, **values) -> None:
+    """
+    Record the result of a completed step on a job.
+
+    Args:
+        job: The job
+        **values: Values to store in job.result
+    """
+    job.result = {**job.result, **values}
+    job.save(update_fields=['result', 'updated_at'])
+
+
+def run_generate_image_job(job: BackgroundJob) -> Dict[str, Any]:
+    """
+    Generate an image with DALL-E, pin it to IPFS and optionally save it to a vibe.
+
+    Payload:
+        prompt, size, quality: Passed to DALL-E
+        filename: Optional name to save the image under in the vibe directory
+
+    Args:
+        job: The job
+
+    Returns:
+        Dictionary with the outcome
+    """
+    from .image_utils import generate_image, save_generated_image
+    from .models import GeneratedImage
+
+    payload = job.payload
+    prompt = payload.get('prompt', '')
+    if not prompt:
+        return {"success": False, "error": "Prompt cannot be empty.", "retryable": False}
+
+    # Step 1: generate the image
+    if 'dalle_url' not in job.result:
+        api_key = getattr(getattr(job.user, 'profile', None), 'chatgpt_api_key', '')
+        if not api_key:
+            return {"success": False, "error": "You need to add an OpenAI API key to your profile to generate images.", "retryable": False}
+
+        image_result = generate_image(api_key, prompt, payload.get('size', '1024x1024'), payload.get('quality', 'standard'))
+        if not image_result.get('success', False):
+            status_code = image_result.get('status_code')
+            # Client errors (bad prompt, content policy, bad key) won't go away on retry
+            retryable = status_code is None or status_code == 429 or status_code >= 500
+            return {"success": False, "error": image_result.get('error', "Failed to generate image."), "retryable": retryable}
+
+        save_job_progress(
+            job,
+            dalle_url=image_result.get('image_url'),
+            revised_prompt=image_result.get('revised_prompt', prompt)
+        )
+
+    # Step 2: pin it to IPFS and record it in the database
+    if 'image_id' not in job.result:
+        save_result = save_generated_image(
+            user=job.user,
+            prompt=prompt,
+            image_url=job.result['dalle_url'],
+            revised_prompt=job.result.get('revised_prompt')
+        )
+        if not save_result.get('success', False):
+            return {"success": False, "error": save_result.get('error', "Failed to save the generated image.")}
+
+        if job.vibe_id:
+            GeneratedImage.objects.filter(id=save_result.get('image_id')).update(vibe_id=job.vibe_id)
+
+        save_job_progress(job, image_id=save_result.get('image_id'), image_url=save_result.get('image_url'))
+
+    # Step 3: save a copy in the vibe directory if a filename was given
+    filename = payload.get('filename')
+    if job.vibe_id and filename and 'local_url' not in job.result:
+        from .file_utils import VibeFileManager
+
+        local_result = VibeFileManager(job.vibe).save_image(job.result['dalle_url'], filename)
+        if local_result.get('success', False):
+            save_job_progress(job, local_url=local_result.get('url'), local_error='')
+        else:
+            # The IPFS copy is the one that matters, so this doesn't fail the job
+            save_job_progress(job, local_error=local_result.get('error', 'Unknown error'))
+
+    return {"success": True}
+
+
+# Functions that run each type of job
+JOB_HANDLERS = {
+    'generate_image': run_generate_image_job,
+}
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from vibezin.models import Vibe
+from vibezin.vibe_utils import export_vibe_files
+
+
+class Command(BaseCommand):
+    help = 'Exports the metadata and content of vibes to metadata.json and content.json in their directories'
+
+    def add_arguments(self, parser):
+        parser.add_argument('slugs', nargs='*', help='Slugs of the vibes to export (defaults to all vibes)')
+
+    def handle(self, *args, **options):
+        vibes = Vibe.objects.select_related('user').order_by('id')
+        if options['slugs']:
+            vibes = vibes.filter(slug__in=options['slugs'])
+
+        exported = 0
+        for vibe in vibes.iterator(chunk_size=500):
+            result = export_vibe_files(vibe)
+            if result['success']:
+                exported += 1
+            else:
+                self.stdout.write(self.style.WARNING(f"{vibe.slug}: {result['message']}"))
+
+        self.stdout.write(self.style.SUCCESS(f"Exported {exported} vibes"))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from vibezin.blob_utils import collect_garbage, VIBE_BLOB_GC_GRACE_PERIOD
+
+
+class Command(BaseCommand):
+    help = 'Removes stored vibe file contents that no vibe uses anymore'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be removed')
+        parser.add_argument('--grace-period', type=float, default=VIBE_BLOB_GC_GRACE_PERIOD,
+                            help='Keep unused blobs younger than this many seconds')
+
+    def handle(self, *args, **options):
+        result = collect_garbage(dry_run=options['dry_run'], grace_period=options['grace_period'])
+
+        action = 'Would remove' if options['dry_run'] else 'Removed'
+        self.stdout.write(self.style.SUCCESS(
+            f"{action} {result['removed']} blobs ({result['bytes_freed']} bytes), kept {result['kept']}"
+        ))
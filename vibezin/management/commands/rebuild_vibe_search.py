@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand, CommandError
+from vibezin.search_utils import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = 'Indexes all vibes for search, e.g. after creating the search table on an existing database'
+
+    def handle(self, *args, **options):
+        result = rebuild_search_index()
+
+        if 'error' in result:
+            raise CommandError(result['error'])
+
+        message = f"Indexed {result['indexed']} vibes"
+        if result['failed']:
+            self.stdout.write(self.style.WARNING(f"{message}, {result['failed']} failed (see the log)"))
+        else:
+            self.stdout.write(self.style.SUCCESS(message))
@@ -0,0 +1,59 @@
+import time
+import threading
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+from vibezin.job_utils import claim_next_job, run_job, get_worker_id
+
+
+class Command(BaseCommand):
+    help = 'Runs queued background jobs (image generation, IPFS pinning)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Run the jobs that are due and exit')
+        parser.add_argument('--poll-interval', type=float, default=2.0, help='Seconds to wait when the queue is empty')
+        parser.add_argument('--concurrency', type=int, default=1, help='Number of jobs to run at the same time')
+        parser.add_argument('--worker-id', default='', help='Identifier recorded on claimed jobs')
+
+    def handle(self, *args, **options):
+        worker_id = options['worker_id'] or get_worker_id()
+        concurrency = max(options['concurrency'], 1)
+
+        self.stdout.write(f"Starting job worker {worker_id} with {concurrency} thread(s)...")
+
+        threads = [
+            threading.Thread(
+                target=self.work,
+                args=(f"{worker_id}:{index}", options['once'], options['poll_interval']),
+                daemon=True
+            )
+            for index in range(concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(1)
+        except KeyboardInterrupt:
+            self.stdout.write("Stopping job worker")
+            return
+
+        self.stdout.write(self.style.SUCCESS("No more jobs to run"))
+
+    def work(self, worker_id, once, poll_interval):
+        try:
+            while True:
+                close_old_connections()
+
+                job = claim_next_job(worker_id)
+                if job is None:
+                    if once:
+                        return
+                    time.sleep(poll_interval)
+                    continue
+
+                job = run_job(job)
+                self.stdout.write(f"Job {job.id} ({job.job_type}): {job.status}")
+        finally:
+            connection.close()
@@ -1,6 +1,11 @@
+import re
 import logging
-from django.db import models
+from django.conf import settings
+from django.db import models, transaction, IntegrityError
+from django.db.models import Count, Max, Q
+from django.db.models.functions import Cast, Substr
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from django.utils.text import slugify
 from django.contrib.auth.models import User
 from django.db.models.signals import post_save
@@ -8,6 +13,10 @@ from django.dispatch import receiver
 
 logger = logging.getLogger(__name__)
 
+# Number of times Vibe.save allocates a slug before giving up on concurrent
+# creates of vibes with the same title
+SLUG_ALLOCATION_ATTEMPTS = getattr(settings, 'SLUG_ALLOCATION_ATTEMPTS', 5)
+
 # Create your models here.
 class Vibe(models.Model):
     title = models.CharField(max_length=200)
@@ -22,26 +31,71 @@ class Vibe(models.Model):
     has_custom_css = models.BooleanField(default=False)
     has_custom_js = models.BooleanField(default=False)
 
+    # Content shown on the standard vibe page (tagline, elements, colors...).
+    # It used to be read from content.json in the vibe directory, which is
+    # now only written as an export. Empty until the content is created or
+    # imported from a legacy content.json (see vibe_utils.get_vibe_content).
+    content = models.JSONField(default=dict, blank=True)
+
+    class Meta:
+        indexes = [
+            # The feed is read newest first, paged by (created_at, id)
+            models.Index(fields=['created_at', 'id']),
+            # Same for one user's vibes (profile pages)
+            models.Index(fields=['user', 'created_at', 'id']),
+        ]
+
     def __str__(self):
         return self.title
 
     def save(self, *args, **kwargs):
         # Generate a slug from the title if one doesn't exist
-        if not self.slug:
-            # Create a base slug from the title
-            base_slug = slugify(self.title)
+        if self.slug:
+            super().save(*args, **kwargs)
+            return
+
+        # Create a base slug from the title
+        base_slug = slugify(self.title) or 'vibe'
+
+        # Another vibe can take the same slug between allocating it and
+        # inserting; the unique constraint catches that and we try again
+        for attempt in range(SLUG_ALLOCATION_ATTEMPTS):
+            self.slug = self.allocate_slug(base_slug)
+            try:
+                with transaction.atomic():
+                    super().save(*args, **kwargs)
+                return
+            except IntegrityError:
+                if attempt == SLUG_ALLOCATION_ATTEMPTS - 1 or not Vibe.objects.filter(slug=self.slug).exists():
+                    self.slug = ''
+                    raise
+                logger.info(f"Slug {self.slug} was taken concurrently, allocating another")
+
+    @staticmethod
+    def allocate_slug(base_slug: str) -> str:
+        """
+        Find a free slug: the base slug if it is free, otherwise the base slug
+        with the next number after the highest one in use (``cats-3``).
 
-            # Check if the slug already exists
-            slug = base_slug
-            counter = 1
-            while Vibe.objects.filter(slug=slug).exists():
-                # If the slug exists, append a number to make it unique
-                slug = f"{base_slug}-{counter}"
-                counter += 1
+        Takes one query, however many vibes share the base slug.
+
+        Args:
+            base_slug: The slug made from the title
 
-            self.slug = slug
+        Returns:
+            The slug
+        """
+        prefix = f"{base_slug}-"
+        taken = Vibe.objects.filter(
+            Q(slug=base_slug) | Q(slug__startswith=prefix, slug__regex=rf'^{re.escape(prefix)}[0-9]+$')
+        ).aggregate(
+            base_taken=Count('pk', filter=Q(slug=base_slug)),
+            highest=Max(Cast(Substr('slug', len(prefix) + 1), models.BigIntegerField()), filter=~Q(slug=base_slug)),
+        )
 
-        super().save(*args, **kwargs)
+        if not taken['base_taken']:
+            return base_slug
+        return f"{prefix}{(taken['highest'] or 0) + 1}"
 
 
 class VibeConversationHistory(models.Model):
@@ -51,12 +105,17 @@ class VibeConversationHistory(models.Model):
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
 
-    # Store the conversation as JSON
-    conversation = models.JSONField(default=list)
+    # Conversations used to be stored here as a single JSON list. Messages are
+    # now stored as VibeConversationMessage rows; anything left in this column
+    # is moved over the first time the conversation is used.
+    legacy_conversation = models.JSONField(default=list, blank=True, editable=False, db_column='conversation')
 
     # Track the number of messages
     message_count = models.IntegerField(default=0)
 
+    # Sequence number for the next message
+    next_sequence = models.PositiveIntegerField(default=0, editable=False)
+
     # Track the last message timestamp
     last_message_at = models.DateTimeField(auto_now=True)
 
@@ -67,14 +126,98 @@ class VibeConversationHistory(models.Model):
     def __str__(self):
         return f"Conversation for {self.vibe.title} by {self.user.username}"
 
+    @property
+    def conversation(self) -> list:
+        """
+        The messages in the conversation as a list of dictionaries, oldest first.
+
+        The list is loaded once per instance and kept up to date by
+        add_message, so it can be read repeatedly without extra queries.
+        """
+        if getattr(self, '_messages_cache', None) is None:
+            self._import_legacy_conversation()
+            self._messages_cache = [message.to_dict() for message in self.messages.order_by('sequence')]
+        return self._messages_cache
+
+    @conversation.setter
+    def conversation(self, messages: list) -> None:
+        """
+        Replace the messages in the conversation.
+
+        Also works as a keyword argument to the constructor (and so to
+        objects.create and get_or_create); the messages of an unsaved
+        conversation are stored when it is first used after saving.
+        """
+        messages = list(messages or [])
+        self._messages_cache = None
+
+        if not self.pk:
+            self.legacy_conversation = messages
+            self.message_count = self.next_sequence = len(messages)
+            return
+
+        with transaction.atomic():
+            self.messages.all().delete()
+            VibeConversationMessage.objects.bulk_create([
+                VibeConversationMessage.from_dict(self, sequence, message)
+                for sequence, message in enumerate(messages)
+            ])
+            self.legacy_conversation = []
+            self.message_count = self.next_sequence = len(messages)
+            VibeConversationHistory.objects.filter(pk=self.pk).update(
+                legacy_conversation=[],
+                message_count=self.message_count,
+                next_sequence=self.next_sequence
+            )
+
+    def _import_legacy_conversation(self) -> None:
+        """Move messages stored in the old JSON column into message rows."""
+        if not self.pk or not self.legacy_conversation:
+            return
+
+        legacy = self.legacy_conversation
+        with transaction.atomic():
+            self.messages.all().delete()
+            VibeConversationMessage.objects.bulk_create([
+                VibeConversationMessage.from_dict(self, sequence, message)
+                for sequence, message in enumerate(legacy)
+            ])
+            self.legacy_conversation = []
+            self.message_count = self.next_sequence = len(legacy)
+            VibeConversationHistory.objects.filter(pk=self.pk).update(
+                legacy_conversation=[],
+                message_count=self.message_count,
+                next_sequence=self.next_sequence
+            )
+
+        logger.info(f"Moved {len(legacy)} messages of conversation {self.pk} to message rows")
+
+    def _has_tool_call(self, tool_call_id: str) -> bool:
+        """Check whether an assistant message in the conversation made a tool call."""
+        if getattr(self, '_messages_cache', None) is not None:
+            messages = (message.get("tool_calls") for message in self._messages_cache)
+        else:
+            # Only assistant messages that made tool calls need to be looked at
+            messages = self.messages.filter(role="assistant", tool_calls__isnull=False).values_list('tool_calls', flat=True)
+
+        return any(
+            tool_call.get("id") == tool_call_id
+            for tool_calls in messages if tool_calls
+            for tool_call in tool_calls
+        )
+
     def add_message(self, role: str, content: str, **kwargs) -> None:
         """
         Add a message to the conversation history.
 
+        Appending is a single INSERT plus a fixed-size update of the counters,
+        however long the conversation is.
+
         Args:
             role: The role of the message sender (system, user, assistant, tool)
             content: The content of the message
-            **kwargs: Additional fields for the message (e.g., tool_call_id, name for tool messages)
+            **kwargs: Additional fields for the message (e.g., tool_call_id, name for tool messages,
+                tool_calls for assistant messages)
         """
         message = {
             "role": role,
@@ -92,20 +235,7 @@ class VibeConversationHistory(models.Model):
             # Validate that there's a preceding assistant message with tool_calls
             # This is required by the OpenAI API
             tool_call_id = kwargs["tool_call_id"]
-            found_matching_tool_call = False
-
-            # Check the conversation for a matching tool call
-            for prev_msg in reversed(self.conversation):
-                if prev_msg.get("role") == "assistant" and "tool_calls" in prev_msg:
-                    # Look for a matching tool_call_id
-                    for tool_call in prev_msg["tool_calls"]:
-                        if tool_call.get("id") == tool_call_id:
-                            found_matching_tool_call = True
-                            break
-                    if found_matching_tool_call:
-                        break
-
-            if not found_matching_tool_call:
+            if not self._has_tool_call(tool_call_id):
                 logger.warning(f"Attempted to add a tool message with tool_call_id {tool_call_id} but no matching tool call was found in the conversation history")
                 # We'll still add the message, but log the warning
 
@@ -117,15 +247,44 @@ class VibeConversationHistory(models.Model):
             if key not in message:
                 message[key] = value
 
-        # Add the message to the conversation
-        conversation = self.conversation
-        conversation.append(message)
-        self.conversation = conversation
+        self._import_legacy_conversation()
+
+        # If another request appended a message since this instance was
+        # loaded, the sequence number is taken; move past it and try again
+        for attempt in range(3):
+            try:
+                with transaction.atomic():
+                    VibeConversationMessage.from_dict(self, self.next_sequence, message).save(force_insert=True)
+                break
+            except IntegrityError:
+                if attempt == 2:
+                    raise
+                last = self.messages.order_by('-sequence').values_list('sequence', flat=True).first()
+                self.next_sequence = 0 if last is None else last + 1
+                self.message_count = self.messages.count()
+                self._messages_cache = None
 
         # Update the message count
-        self.message_count = len(conversation)
-
-        # Save the changes
+        self.next_sequence += 1
+        self.message_count += 1
+        self.last_message_at = timezone.now()
+        VibeConversationHistory.objects.filter(pk=self.pk).update(
+            next_sequence=self.next_sequence,
+            message_count=self.message_count,
+            last_message_at=self.last_message_at,
+            updated_at=self.last_message_at
+        )
+
+        if getattr(self, '_messages_cache', None) is not None:
+            self._messages_cache.append(message)
+
+    def clear_messages(self) -> None:
+        """Delete every message in the conversation."""
+        self.messages.all().delete()
+        self.legacy_conversation = []
+        self.message_count = 0
+        self.next_sequence = 0
+        self._messages_cache = []
         self.save()
 
     def clean_conversation_history(self):
@@ -140,41 +299,107 @@ class VibeConversationHistory(models.Model):
         Returns:
             bool: True if changes were made, False otherwise
         """
-        if not self.conversation:
-            return False
+        self._import_legacy_conversation()
 
-        cleaned_conversation = []
-        changes_made = False
         tool_call_ids = set()
+        invalid_ids = []
 
         # First pass: collect all tool_call_ids from assistant messages
-        for msg in self.conversation:
-            if msg.get("role") == "assistant" and "tool_calls" in msg:
-                for tool_call in msg["tool_calls"]:
-                    if "id" in tool_call:
-                        tool_call_ids.add(tool_call["id"])
-
-        # Second pass: build a clean conversation history
-        for msg in self.conversation:
-            # Skip tool messages without a matching tool_call_id
-            if msg.get("role") == "tool":
-                tool_call_id = msg.get("tool_call_id")
-                if not tool_call_id or tool_call_id not in tool_call_ids:
-                    logger.warning(f"Removing invalid tool message with tool_call_id: {tool_call_id}")
-                    changes_made = True
-                    continue
-
-            # Keep all other messages
-            cleaned_conversation.append(msg)
-
-        # Update the conversation if changes were made
-        if changes_made:
-            self.conversation = cleaned_conversation
-            self.message_count = len(cleaned_conversation)
-            self.save()
-            logger.info(f"Cleaned conversation history, removed {len(self.conversation) - len(cleaned_conversation)} invalid messages")
-
-        return changes_made
+        for tool_calls in self.messages.filter(role="assistant", tool_calls__isnull=False).values_list('tool_calls', flat=True):
+            for tool_call in tool_calls or []:
+                if "id" in tool_call:
+                    tool_call_ids.add(tool_call["id"])
+
+        # Second pass: find tool messages without a matching tool_call_id
+        for message_id, tool_call_id in self.messages.filter(role="tool").values_list('id', 'tool_call_id'):
+            if not tool_call_id or tool_call_id not in tool_call_ids:
+                logger.warning(f"Removing invalid tool message with tool_call_id: {tool_call_id}")
+                invalid_ids.append(message_id)
+
+        # Remove the invalid messages if there are any
+        if not invalid_ids:
+            return False
+
+        self.messages.filter(id__in=invalid_ids).delete()
+        self.message_count = self.messages.count()
+        VibeConversationHistory.objects.filter(pk=self.pk).update(message_count=self.message_count)
+        self._messages_cache = None
+        logger.info(f"Cleaned conversation history, removed {len(invalid_ids)} invalid messages")
+        return True
+
+
+class VibeConversationMessage(models.Model):
+    """A single message in a vibe conversation."""
+    conversation = models.ForeignKey(VibeConversationHistory, on_delete=models.CASCADE, related_name='messages')
+    sequence = models.PositiveIntegerField(help_text="Position of the message in the conversation")
+    role = models.CharField(max_length=20)
+    content = models.TextField(blank=True)
+
+    # Set on tool messages
+    tool_call_id = models.CharField(max_length=100, blank=True)
+    name = models.CharField(max_length=100, blank=True)
+
+    # Set on assistant messages that call tools
+    tool_calls = models.JSONField(null=True, blank=True)
+
+    # Any other fields of the message
+    extra = models.JSONField(default=dict, blank=True)
+
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['conversation', 'sequence']
+        constraints = [
+            models.UniqueConstraint(fields=['conversation', 'sequence'], name='unique_conversation_message_sequence'),
+        ]
+
+    def __str__(self):
+        return f"{self.role} message {self.sequence} in conversation {self.conversation_id}"
+
+    @classmethod
+    def from_dict(cls, conversation: VibeConversationHistory, sequence: int, message: dict) -> 'VibeConversationMessage':
+        """
+        Create an (unsaved) message from its dictionary form.
+
+        Args:
+            conversation: The conversation the message belongs to
+            sequence: The position of the message in the conversation
+            message: The message dictionary
+
+        Returns:
+            The VibeConversationMessage
+        """
+        known_fields = {'role', 'content', 'tool_call_id', 'name', 'tool_calls', 'timestamp'}
+        created_at = parse_datetime(message.get('timestamp') or '') or timezone.now()
+
+        return cls(
+            conversation=conversation,
+            sequence=sequence,
+            role=message.get('role', ''),
+            content=message.get('content') or '',
+            tool_call_id=message.get('tool_call_id') or '',
+            name=message.get('name') or '',
+            tool_calls=message.get('tool_calls') or None,
+            extra={key: value for key, value in message.items() if key not in known_fields},
+            created_at=created_at
+        )
+
+    def to_dict(self) -> dict:
+        """Get the message in the dictionary form used by the conversation list API."""
+        message = {
+            "role": self.role,
+            "content": self.content,
+            "timestamp": self.created_at.isoformat()
+        }
+        if self.tool_calls:
+            message["tool_calls"] = self.tool_calls
+        if self.tool_call_id:
+            message["tool_call_id"] = self.tool_call_id
+        if self.name:
+            message["name"] = self.name
+        message.update(self.extra)
+        return message
+
 
 class UserProfile(models.Model):
     ACCOUNT_TYPES = (
@@ -248,3 +473,72 @@ class GeneratedImage(models.Model):
 
     def __str__(self):
         return f"Image by {self.user.username} - {self.prompt[:30]}..."
+
+
+class BackgroundJob(models.Model):
+    """A unit of slow work (e.g. image generation) run by the job worker."""
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_SUCCEEDED = 'succeeded'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = (
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_SUCCEEDED, 'Succeeded'),
+        (STATUS_FAILED, 'Failed'),
+    )
+
+    JOB_TYPES = (
+        ('generate_image', 'Generate image'),
+    )
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='background_jobs')
+    vibe = models.ForeignKey(Vibe, on_delete=models.CASCADE, related_name='background_jobs', null=True, blank=True)
+    job_type = models.CharField(max_length=50, choices=JOB_TYPES)
+    idempotency_key = models.CharField(max_length=255, null=True, blank=True, help_text="Client-supplied key that makes retried submissions return the same job")
+    payload = models.JSONField(default=dict, blank=True)
+
+    # Progress of completed steps, so a retry doesn't redo (or pay for) them
+    result = models.JSONField(default=dict, blank=True)
+    error = models.TextField(blank=True)
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=5)
+    run_after = models.DateTimeField(default=timezone.now, help_text="The job won't be picked up before this time")
+    locked_at = models.DateTimeField(null=True, blank=True)
+    locked_by = models.CharField(max_length=100, blank=True)
+
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'run_after']),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'idempotency_key'], name='unique_job_idempotency_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.job_type} job {self.id} ({self.status})"
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in (self.STATUS_SUCCEEDED, self.STATUS_FAILED)
+
+    def to_dict(self) -> dict:
+        """Get the job status as a JSON-serializable dictionary."""
+        return {
+            'id': self.id,
+            'job_type': self.job_type,
+            'status': self.status,
+            'attempts': self.attempts,
+            'max_attempts': self.max_attempts,
+            'result': self.result if self.status == self.STATUS_SUCCEEDED else {},
+            'error': self.error,
+            'created_at': self.created_at.isoformat(),
+            'completed_at': self.completed_at.isoformat() if self.completed_at else None,
+        }
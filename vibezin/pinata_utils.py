@@ -2,13 +2,14 @@
 Utilities for interacting with Pinata IPFS service.
 """
 import logging
-import requests
 import json
 from typing import Dict, Any
 from django.conf import settings
 from django.core.files.storage import default_storage
 from django.core.files.base import ContentFile
 
+from .http_utils import get_session
+
 logger = logging.getLogger(__name__)
 
 def upload_to_pinata(file_content, filename=None) -> Dict[str, Any]:
@@ -50,7 +51,7 @@ def upload_to_pinata(file_content, filename=None) -> Dict[str, Any]:
             }
 
             # Make the request to Pinata
-            response = requests.post(
+            response = get_session().post(
                 url,
                 headers=headers,
                 files=files
@@ -71,7 +72,7 @@ def upload_to_pinata(file_content, filename=None) -> Dict[str, Any]:
                         "pinata_secret_api_key": settings.PINATA_SECRET_API_KEY
                     }
 
-                    response = requests.post(
+                    response = get_session().post(
                         url,
                         headers=headers,
                         files=files
@@ -139,7 +140,7 @@ def delete_from_pinata(ipfs_hash) -> Dict[str, Any]:
         }
 
         logger.info(f"Sending DELETE request to Pinata API: {url}")
-        response = requests.delete(url, headers=headers)
+        response = get_session().delete(url, headers=headers)
 
         # If JWT fails, try with API key and secret
         if response.status_code != 200:
@@ -148,7 +149,7 @@ def delete_from_pinata(ipfs_hash) -> Dict[str, Any]:
                 "pinata_api_key": settings.PINATA_API_KEY,
                 "pinata_secret_api_key": settings.PINATA_SECRET_API_KEY
             }
-            response = requests.delete(url, headers=headers)
+            response = get_session().delete(url, headers=headers)
 
         logger.info(f"Pinata API response status: {response.status_code}")
         logger.info(f"Pinata API response body: {response.text}")
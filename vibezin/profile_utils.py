@@ -0,0 +1,132 @@
+"""
+Cached profile summaries.
+
+A profile page shows the user's profile fields, their vibe count and their
+latest vibes. All of it is kept as one denormalized summary per user in the
+cache, so a profile page costs one cache read. The summary is dropped by
+the signal handlers whenever the user, their profile or one of their vibes
+changes, and rebuilt on the next view.
+"""
+import logging
+from typing import Any, Dict, Optional, Tuple
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from .models import Vibe, UserProfile
+from .feed_utils import encode_cursor
+
+logger = logging.getLogger(__name__)
+
+# Cache alias used for profile summaries (see CACHES in settings)
+PROFILE_SUMMARY_CACHE_ALIAS = getattr(settings, 'PROFILE_SUMMARY_CACHE_ALIAS', 'default')
+
+# How long a summary is kept, in case a change bypasses the signals (seconds)
+PROFILE_SUMMARY_TTL = getattr(settings, 'PROFILE_SUMMARY_TTL', 3600)
+
+# Number of latest vibes kept in a summary
+PROFILE_SUMMARY_VIBES = getattr(settings, 'PROFILE_SUMMARY_VIBES', 20)
+
+# Profile fields shown on profile pages. The API key is deliberately left out.
+PROFILE_FIELDS = [
+    'bio', 'profile_image', 'background_image', 'custom_css', 'custom_html', 'theme', 'social_links',
+    'account_type', 'first_name', 'last_name', 'middle_initial', 'business_name', 'email', 'phone', 'address',
+]
+
+
+def _get_cache():
+    """Get the cache backend used for profile summaries."""
+    return caches[PROFILE_SUMMARY_CACHE_ALIAS]
+
+
+def _summary_key(username: str) -> str:
+    return f"profile_summary:{username}"
+
+
+def build_profile_summary(user: User) -> Tuple[Dict[str, Any], bool]:
+    """
+    Build the summary shown on a user's profile page from the database.
+
+    Args:
+        user: The User object
+
+    Returns:
+        Tuple of the summary and whether a profile had to be created for the user
+    """
+    profile, created = UserProfile.objects.get_or_create(user=user)
+
+    vibes = list(
+        Vibe.objects.filter(user=user)
+        .order_by('-created_at', '-id')
+        .only('id', 'title', 'slug', 'description', 'created_at')[:PROFILE_SUMMARY_VIBES]
+    )
+    vibe_count = len(vibes)
+    if vibe_count == PROFILE_SUMMARY_VIBES:
+        vibe_count = Vibe.objects.filter(user=user).count()
+
+    summary = {
+        'user_id': user.pk,
+        'username': user.username,
+        'profile': dict(
+            {name: getattr(profile, name) for name in PROFILE_FIELDS},
+            user={'username': user.username, 'is_staff': user.is_staff}
+        ),
+        'vibe_count': vibe_count,
+        'vibes': [
+            {
+                'id': vibe.pk,
+                'title': vibe.title,
+                'slug': vibe.slug,
+                'description': vibe.description,
+                'created_at': vibe.created_at,
+            }
+            for vibe in vibes
+        ],
+        # Cursor for the user's vibes after the latest ones (see feed_utils)
+        'next_cursor': encode_cursor(vibes[-1]) if vibes and vibe_count > len(vibes) else None,
+    }
+    return summary, created
+
+
+def get_profile_summary(username: str, user: Optional[User] = None) -> Tuple[Optional[Dict[str, Any]], bool]:
+    """
+    Get the summary shown on a user's profile page.
+
+    Args:
+        username: The username
+        user: The User object, if already loaded (saves a query on a cache miss)
+
+    Returns:
+        Tuple of the summary (None if there is no such user) and whether a
+        profile had to be created for the user
+    """
+    cache = _get_cache()
+    key = _summary_key(username)
+
+    summary = cache.get(key)
+    if summary is not None:
+        return summary, False
+
+    if user is None:
+        user = User.objects.filter(username=username).first()
+        if user is None:
+            return None, False
+
+    summary, created = build_profile_summary(user)
+    cache.set(key, summary, PROFILE_SUMMARY_TTL)
+    return summary, created
+
+
+def invalidate_profile_summary(username: Optional[str]) -> None:
+    """
+    Drop the cached summary of a user, so the next profile view rebuilds it.
+
+    Args:
+        username: The username
+    """
+    if not username:
+        return
+
+    try:
+        _get_cache().delete(_summary_key(username))
+    except Exception as e:
+        logger.exception(f"Error invalidating profile summary for {username}: {str(e)}")
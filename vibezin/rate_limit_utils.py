@@ -0,0 +1,349 @@
+"""
+Client-side rate limiting for OpenAI calls.
+
+OpenAI limits each API key to a number of requests and tokens per minute.
+Going over the limit only shows up as a 429 response, and under load most
+calls then fail. Every call to OpenAI (chat completions and DALL-E) first
+takes capacity for the user's API key:
+
+- If capacity is available, the call goes out right away.
+- If it will be available within OPENAI_RATE_LIMIT_MAX_WAIT seconds, the call
+  waits for it.
+- Otherwise the call is rejected with RateLimitExceeded without being sent.
+
+Capacity is counted in short windows of RATE_LIMIT_WINDOW seconds, each
+allowing its share of the per-minute limits. The counters and the pause after
+a 429 are kept in the OPENAI_RATE_LIMIT_CACHE_ALIAS cache, so every process
+that uses the same cache shares one budget per API key. With a local-memory
+cache (the default) the limits apply per process; point the alias at a shared
+cache such as Redis or Memcached when running several workers.
+
+When OpenAI still answers with 429 or a 5xx error, the call is retried after
+the delay from the Retry-After header (or an exponential backoff), with
+jitter. The whole API key is paused for that delay, so other calls with the
+same key don't run into the same 429. A 429 for insufficient quota is
+returned right away, since waiting doesn't fix it.
+"""
+import time
+import random
+import asyncio
+import hashlib
+import logging
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Dict, Optional
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+# Requests and tokens per minute allowed for each API key
+OPENAI_REQUESTS_PER_MINUTE = getattr(settings, 'OPENAI_REQUESTS_PER_MINUTE', 500)
+OPENAI_TOKENS_PER_MINUTE = getattr(settings, 'OPENAI_TOKENS_PER_MINUTE', 30000)
+
+# Images per minute allowed for each API key (DALL-E)
+OPENAI_IMAGES_PER_MINUTE = getattr(settings, 'OPENAI_IMAGES_PER_MINUTE', 50)
+
+# Longest a call waits for capacity before it is rejected (seconds)
+OPENAI_RATE_LIMIT_MAX_WAIT = getattr(settings, 'OPENAI_RATE_LIMIT_MAX_WAIT', 20)
+
+# Cache holding the counters shared by all processes
+OPENAI_RATE_LIMIT_CACHE_ALIAS = getattr(settings, 'OPENAI_RATE_LIMIT_CACHE_ALIAS', 'default')
+
+# Number of retries after a 429 or 5xx response
+OPENAI_MAX_RETRIES = getattr(settings, 'OPENAI_MAX_RETRIES', 3)
+
+# Backoff when the response has no Retry-After header (seconds)
+OPENAI_RETRY_BASE_DELAY = getattr(settings, 'OPENAI_RETRY_BASE_DELAY', 1)
+OPENAI_RETRY_MAX_DELAY = getattr(settings, 'OPENAI_RETRY_MAX_DELAY', 30)
+
+# Status codes that are worth retrying
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Length of a counting window (seconds). Short windows keep calls from
+# bursting through a whole minute's budget at once.
+RATE_LIMIT_WINDOW = 10
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a call would have to wait too long for rate limit capacity."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class RateLimiter:
+    """Request, token and image limits for one API key, counted in the cache."""
+
+    def __init__(self, key: str):
+        self.key = key
+        self.capacities = {
+            name: max(1, int(per_minute * RATE_LIMIT_WINDOW / 60))
+            for name, per_minute in (
+                ('requests', OPENAI_REQUESTS_PER_MINUTE),
+                ('tokens', OPENAI_TOKENS_PER_MINUTE),
+                ('images', OPENAI_IMAGES_PER_MINUTE),
+            )
+        }
+
+    @property
+    def cache(self):
+        return caches[OPENAI_RATE_LIMIT_CACHE_ALIAS]
+
+    def _cache_key(self, *parts) -> str:
+        return ':'.join(['openai-rate', self.key, *map(str, parts)])
+
+    def _take(self, window: int, amounts: Dict[str, int]) -> bool:
+        """
+        Take capacity from every counter of a window, or from none of them.
+
+        Args:
+            window: The window number
+            amounts: Amount to take from each counter
+
+        Returns:
+            Whether the capacity was taken
+        """
+        cache = self.cache
+        taken = []
+        for name, amount in amounts.items():
+            key = self._cache_key(name, window)
+            # incr is atomic in the shared cache backends; add only creates the counter
+            cache.add(key, 0, timeout=RATE_LIMIT_WINDOW * 3)
+            try:
+                used = cache.incr(key, amount)
+            except ValueError:
+                # The counter expired between add and incr
+                cache.add(key, amount, timeout=RATE_LIMIT_WINDOW * 3)
+                used = amount
+            taken.append((key, amount))
+
+            if used > self.capacities[name]:
+                for key, amount in taken:
+                    try:
+                        cache.decr(key, amount)
+                    except ValueError:
+                        pass
+                return False
+        return True
+
+    def reserve(self, amounts: Dict[str, float], max_wait: float) -> float:
+        """
+        Reserve capacity in every counter at once.
+
+        Args:
+            amounts: Amount to take from each counter
+            max_wait: Longest acceptable wait in seconds
+
+        Returns:
+            How long to wait before sending the call
+
+        Raises:
+            RateLimitExceeded: If the wait would be longer than max_wait.
+                Nothing is reserved in that case.
+        """
+        amounts = {
+            name: min(int(amount), self.capacities[name])
+            for name, amount in amounts.items() if amount
+        }
+        now = time.time()
+        wait = max((self.cache.get(self._cache_key('paused')) or 0.0) - now, 0.0)
+        window = int((now + wait) // RATE_LIMIT_WINDOW)
+
+        while True:
+            wait = max(wait, window * RATE_LIMIT_WINDOW - now)
+            if wait > max_wait:
+                raise RateLimitExceeded(
+                    f"OpenAI rate limit reached for your API key. Please try again in {int(wait) + 1} seconds.",
+                    wait
+                )
+            if self._take(window, amounts):
+                return wait
+            window += 1
+
+    def pause(self, seconds: float) -> None:
+        """Hold back every call with this key for a number of seconds."""
+        key = self._cache_key('paused')
+        until = time.time() + seconds
+        if until > (self.cache.get(key) or 0.0):
+            self.cache.set(key, until, timeout=int(seconds) + 1)
+
+
+def get_rate_limiter(api_key: str) -> RateLimiter:
+    """
+    Get the rate limiter for an API key.
+
+    Args:
+        api_key: The OpenAI API key
+
+    Returns:
+        The RateLimiter for this key. Its state is in the cache, so every
+        limiter for the same key shares it.
+    """
+    # Don't keep the key itself around
+    return RateLimiter(hashlib.sha256(api_key.encode('utf-8')).hexdigest())
+
+
+def is_quota_error(response) -> bool:
+    """
+    Check whether a response says the API key is out of quota.
+
+    OpenAI reports this as a 429 too, but it lasts until the account is
+    topped up, so it isn't worth retrying.
+
+    Args:
+        response: The requests or httpx response (with its body read)
+
+    Returns:
+        True if the response is an insufficient_quota error
+    """
+    if response.status_code != 429:
+        return False
+    try:
+        error = response.json().get('error')
+    except (ValueError, AttributeError):
+        return False
+    return isinstance(error, dict) and 'insufficient_quota' in (error.get('code'), error.get('type'))
+
+
+def estimate_request_tokens(payload: Dict[str, Any]) -> int:
+    """
+    Estimate the tokens a chat completions request counts against the limit.
+
+    Args:
+        payload: The request payload
+
+    Returns:
+        The prompt tokens plus max_tokens
+    """
+    from .ai_context_window import count_message_tokens
+
+    prompt_tokens = sum(count_message_tokens(message) for message in payload.get('messages', []))
+    return prompt_tokens + payload.get('max_tokens', 0)
+
+
+def get_retry_delay(headers, attempt: int) -> float:
+    """
+    Get the delay before retrying a failed call.
+
+    Args:
+        headers: The response headers
+        attempt: The number of retries made so far
+
+    Returns:
+        The delay in seconds, with jitter
+    """
+    retry_after = None
+    try:
+        if headers.get('retry-after-ms'):
+            retry_after = float(headers['retry-after-ms']) / 1000
+        elif headers.get('retry-after'):
+            value = headers['retry-after']
+            try:
+                retry_after = float(value)
+            except ValueError:
+                retry_after = parsedate_to_datetime(value).timestamp() - time.time()
+    except (TypeError, ValueError):
+        retry_after = None
+
+    if retry_after is not None and retry_after >= 0:
+        # Spread out the callers that were told the same time
+        return min(retry_after, OPENAI_RETRY_MAX_DELAY) * random.uniform(1.0, 1.2)
+
+    delay = min(OPENAI_RETRY_BASE_DELAY * (2 ** attempt), OPENAI_RETRY_MAX_DELAY)
+    return delay * random.uniform(0.5, 1.0)
+
+
+def _amounts(tokens: int, images: int) -> Dict[str, float]:
+    return {'requests': 1, 'tokens': tokens, 'images': images}
+
+
+def send_with_rate_limit(api_key: str, send: Callable[[], Any], tokens: int = 0, images: int = 0,
+                         max_wait: Optional[float] = None):
+    """
+    Send a call to OpenAI within the rate limits for the API key.
+
+    Args:
+        api_key: The OpenAI API key
+        send: Function that makes the call and returns a requests response
+        tokens: Estimated tokens used by the call
+        images: Number of images the call generates
+        max_wait: Longest wait for capacity (defaults to OPENAI_RATE_LIMIT_MAX_WAIT)
+
+    Returns:
+        The response of the last attempt
+
+    Raises:
+        RateLimitExceeded: If there's no capacity within max_wait
+    """
+    limiter = get_rate_limiter(api_key)
+    if max_wait is None:
+        max_wait = OPENAI_RATE_LIMIT_MAX_WAIT
+
+    attempt = 0
+    while True:
+        wait = limiter.reserve(_amounts(tokens, images), max_wait)
+        if wait > 0:
+            logger.info(f"Waiting {wait:.2f}s for OpenAI rate limit capacity")
+            time.sleep(wait)
+
+        response = send()
+        if response.status_code not in RETRY_STATUS_CODES or attempt >= OPENAI_MAX_RETRIES:
+            return response
+        if is_quota_error(response):
+            logger.warning("OpenAI API key is out of quota, not retrying")
+            return response
+
+        delay = get_retry_delay(response.headers, attempt)
+        logger.warning(f"OpenAI returned {response.status_code}, retrying in {delay:.2f}s (retry {attempt + 1}/{OPENAI_MAX_RETRIES})")
+        limiter.pause(delay)
+        response.close()
+        attempt += 1
+
+
+async def asend_with_rate_limit(api_key: str, send: Callable[[], Awaitable[Any]], tokens: int = 0,
+                                images: int = 0, max_wait: Optional[float] = None):
+    """
+    Send a call to OpenAI within the rate limits for the API key, asynchronously.
+
+    This is the async counterpart of send_with_rate_limit, for httpx responses.
+
+    Args:
+        api_key: The OpenAI API key
+        send: Coroutine function that makes the call and returns an httpx response
+        tokens: Estimated tokens used by the call
+        images: Number of images the call generates
+        max_wait: Longest wait for capacity (defaults to OPENAI_RATE_LIMIT_MAX_WAIT)
+
+    Returns:
+        The response of the last attempt
+
+    Raises:
+        RateLimitExceeded: If there's no capacity within max_wait
+    """
+    limiter = get_rate_limiter(api_key)
+    if max_wait is None:
+        max_wait = OPENAI_RATE_LIMIT_MAX_WAIT
+
+    attempt = 0
+    while True:
+        wait = limiter.reserve(_amounts(tokens, images), max_wait)
+        if wait > 0:
+            logger.info(f"Waiting {wait:.2f}s for OpenAI rate limit capacity")
+            await asyncio.sleep(wait)
+
+        response = await send()
+        if response.status_code not in RETRY_STATUS_CODES or attempt >= OPENAI_MAX_RETRIES:
+            return response
+        if response.status_code == 429:
+            # Streamed responses need their body read before it can be checked
+            await response.aread()
+            if is_quota_error(response):
+                logger.warning("OpenAI API key is out of quota, not retrying")
+                return response
+
+        delay = get_retry_delay(response.headers, attempt)
+        logger.warning(f"OpenAI returned {response.status_code}, retrying in {delay:.2f}s (retry {attempt + 1}/{OPENAI_MAX_RETRIES})")
+        limiter.pause(delay)
+        await response.aclose()
+        attempt += 1
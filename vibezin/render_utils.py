@@ -0,0 +1,330 @@
+"""
+Compiled render pipeline for vibe detail pages.
+
+A vibe page is assembled from the files in its directory (index.html plus any
+CSS and JS that gets spliced in). Assembling it means several stat() calls and
+file reads, so the result is compiled once per content version and kept in the
+``vibe_pages`` cache until a write or delete invalidates it. Gzip and brotli
+variants of the page are produced along with it, so compression happens once
+per content version rather than once per request.
+
+The same cache holds per-file validators for the files under
+``static/vibes/<slug>/`` so conditional requests can be answered without
+touching the disk.
+"""
+import os
+import json
+import hashlib
+import logging
+import mimetypes
+from pathlib import Path
+from typing import Dict, Any, Optional
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import SuspiciousFileOperation
+from django.utils._os import safe_join
+from .models import Vibe
+from .compression_utils import compress_variants, find_file_variants
+
+logger = logging.getLogger(__name__)
+
+# Cache alias used for compiled pages (see CACHES in settings)
+VIBE_PAGE_CACHE_ALIAS = getattr(settings, 'VIBE_PAGE_CACHE_ALIAS', 'vibe_pages')
+
+# Files that can act as the custom HTML for a vibe
+CUSTOM_HTML_FILENAMES = ['index.html', 'vibe.html']
+
+
+def _get_cache():
+    """Get the cache backend used for compiled vibe pages."""
+    return caches[VIBE_PAGE_CACHE_ALIAS]
+
+
+def _page_key(vibe_slug: str) -> str:
+    return f"vibe_page:{vibe_slug}"
+
+
+def _generation_key(vibe_slug: str) -> str:
+    return f"vibe_page_generation:{vibe_slug}"
+
+
+def _file_key(vibe_slug: str, filename: str) -> str:
+    # Filenames can contain characters that some cache backends reject in keys
+    return f"vibe_file:{vibe_slug}:{hashlib.md5(filename.encode('utf-8')).hexdigest()}"
+
+
+def splice_custom_assets(html: str, custom_css: Optional[str], custom_js: Optional[str]) -> str:
+    """
+    Splice custom CSS and JS into a vibe's custom HTML.
+
+    Args:
+        html: The custom HTML
+        custom_css: CSS to inline, if any
+        custom_js: JavaScript to inline, if any
+
+    Returns:
+        The assembled HTML
+    """
+    # Add the custom CSS if available
+    if custom_css:
+        if '<style>' not in html:
+            html = html.replace('</head>', f'<style>{custom_css}</style></head>')
+        elif '</head>' not in html:
+            # If there's no </head> tag, add the style at the beginning
+            html = f'<style>{custom_css}</style>\n{html}'
+
+    # Add the custom JS if available
+    if custom_js:
+        if '<script>' not in html:
+            if '</body>' in html:
+                html = html.replace('</body>', f'<script>{custom_js}</script></body>')
+            else:
+                # If there's no </body> tag, add the script at the end
+                html = f'{html}\n<script>{custom_js}</script>'
+
+    return html
+
+
+def compile_vibe_page(vibe: Vibe) -> Dict[str, Any]:
+    """
+    Assemble a vibe page from the files in its directory.
+
+    Args:
+        vibe: The Vibe object
+
+    Returns:
+        Dictionary with the compiled page. ``html`` holds the final page as
+        bytes when the vibe has custom HTML (with compressed copies in
+        ``variants``), otherwise it is None and the remaining fields feed the
+        standard vibe_detail template.
+    """
+    from .file_utils import VibeFileManager
+    from .vibe_utils import get_vibe_content
+
+    # Get the vibe content from the directory
+    content_result = get_vibe_content(vibe)
+    vibe_content = content_result.get('content', {}) if content_result.get('success', False) else {}
+
+    file_manager = VibeFileManager(vibe)
+    files = file_manager.list_files()
+
+    fingerprint = hashlib.sha256()
+    fingerprint.update(json.dumps(vibe_content, sort_keys=True, default=str).encode('utf-8'))
+    last_modified = 0
+
+    custom_html = None
+    custom_css = None
+    custom_js = None
+
+    for file in files:
+        name = file['name']
+        if name in CUSTOM_HTML_FILENAMES:
+            kind = 'html'
+        elif name.endswith('.css'):
+            kind = 'css'
+        elif name.endswith('.js'):
+            kind = 'js'
+        else:
+            continue
+
+        result = file_manager.read_file(name)
+        if not result.get('success', False):
+            continue
+
+        content = result.get('content', '')
+        fingerprint.update(name.encode('utf-8') + b'\0' + content.encode('utf-8') + b'\0')
+        last_modified = max(last_modified, file['modified'])
+
+        if kind == 'html':
+            custom_html = content
+        elif kind == 'css':
+            custom_css = content
+        else:
+            custom_js = content
+
+    html = None
+    variants = {}
+    if custom_html:
+        html = splice_custom_assets(custom_html, custom_css, custom_js).encode('utf-8')
+        variants = compress_variants(html)
+
+        # If the vibe doesn't have the custom HTML flag set,
+        # set it now to ensure future views work correctly
+        if not vibe.has_custom_html:
+            vibe.has_custom_html = True
+            if custom_css:
+                vibe.has_custom_css = True
+            if custom_js:
+                vibe.has_custom_js = True
+            vibe.save(update_fields=['has_custom_html', 'has_custom_css', 'has_custom_js', 'updated_at'])
+            logger.info(f"Updated custom flags for vibe: {vibe.slug} - HTML: {vibe.has_custom_html}, CSS: {vibe.has_custom_css}, JS: {vibe.has_custom_js}")
+
+    return {
+        'slug': vibe.slug,
+        'fingerprint': fingerprint.hexdigest(),
+        'last_modified': last_modified,
+        'html': html,
+        'variants': variants,
+        'vibe_content': vibe_content,
+        'custom_css': custom_css,
+        'custom_js': custom_js,
+    }
+
+
+def get_cached_vibe_page(vibe_slug: str) -> Optional[Dict[str, Any]]:
+    """
+    Look up a compiled vibe page in the cache.
+
+    Args:
+        vibe_slug: The slug of the vibe
+
+    Returns:
+        The compiled page dictionary or None on a cache miss
+    """
+    return _get_cache().get(_page_key(vibe_slug))
+
+
+def build_vibe_page(vibe: Vibe) -> Dict[str, Any]:
+    """
+    Compile a vibe page and store it in the cache.
+
+    The page is only stored if no invalidation happened while it was being
+    compiled, so a concurrent write can't leave a stale page behind.
+
+    Args:
+        vibe: The Vibe object
+
+    Returns:
+        The compiled page dictionary
+    """
+    cache = _get_cache()
+    generation = cache.get(_generation_key(vibe.slug), 0)
+
+    page = compile_vibe_page(vibe)
+
+    if cache.get(_generation_key(vibe.slug), 0) == generation:
+        cache.set(_page_key(vibe.slug), page, None)
+    else:
+        logger.info(f"Vibe {vibe.slug} changed while compiling, not caching the page")
+
+    return page
+
+
+def get_vibe_page(vibe: Vibe) -> Dict[str, Any]:
+    """
+    Get the compiled page for a vibe, compiling it on a cache miss.
+
+    Args:
+        vibe: The Vibe object
+
+    Returns:
+        The compiled page dictionary
+    """
+    page = get_cached_vibe_page(vibe.slug)
+    if page is None:
+        page = build_vibe_page(vibe)
+    return page
+
+
+def refresh_vibe_page(vibe: Vibe) -> Dict[str, Any]:
+    """
+    Invalidate and immediately recompile the page for a vibe.
+
+    Used after writes so the page (and its compressed variants) is built at
+    write time instead of on the next request.
+
+    Args:
+        vibe: The Vibe object
+
+    Returns:
+        The compiled page dictionary
+    """
+    invalidate_vibe_page(vibe.slug)
+    return build_vibe_page(vibe)
+
+
+def invalidate_vibe_page(vibe_slug: str) -> None:
+    """
+    Drop the compiled page for a vibe so the next view recompiles it.
+
+    This also makes the cached metadata of every file in the vibe stale.
+
+    Args:
+        vibe_slug: The slug of the vibe
+    """
+    if not vibe_slug:
+        return
+
+    try:
+        cache = _get_cache()
+        cache.delete(_page_key(vibe_slug))
+
+        # Bump the generation so in-flight compiles don't store a stale page
+        generation_key = _generation_key(vibe_slug)
+        if not cache.add(generation_key, 1, None):
+            try:
+                cache.incr(generation_key)
+            except ValueError:
+                # The key was evicted between add() and incr()
+                cache.set(generation_key, 1, None)
+    except Exception as e:
+        logger.exception(f"Error invalidating compiled page for {vibe_slug}: {str(e)}")
+
+
+def get_vibe_file_meta(vibe_slug: str, filename: str) -> Optional[Dict[str, Any]]:
+    """
+    Get the validators (fingerprint and modification time) for a vibe file.
+
+    Metadata is cached per file and tied to the vibe's invalidation
+    generation, so any write to the vibe makes it stale. A cache hit costs a
+    single cache round trip and no filesystem access.
+
+    Args:
+        vibe_slug: The slug of the vibe
+        filename: The name of the file relative to the vibe directory
+
+    Returns:
+        Dictionary with the file metadata or None if the file can't be served
+    """
+    from .vibe_utils import get_vibe_directory
+
+    cache = _get_cache()
+    file_key = _file_key(vibe_slug, filename)
+    generation_key = _generation_key(vibe_slug)
+
+    cached = cache.get_many([file_key, generation_key])
+    generation = cached.get(generation_key, 0)
+    meta = cached.get(file_key)
+    if meta is not None and meta['generation'] == generation:
+        return meta
+
+    # Never serve hidden files or anything outside the vibe directory
+    if any(part.startswith('.') for part in Path(filename).parts):
+        return None
+    vibe_dir = Path(os.path.abspath(get_vibe_directory(vibe_slug)))
+    try:
+        file_path = Path(safe_join(str(vibe_dir), filename))
+    except SuspiciousFileOperation:
+        return None
+    if not file_path.is_file():
+        return None
+
+    fingerprint = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(64 * 1024), b''):
+            fingerprint.update(chunk)
+
+    stat = file_path.stat()
+    content_type, encoding = mimetypes.guess_type(str(file_path))
+    relative_name = file_path.relative_to(vibe_dir).as_posix()
+    meta = {
+        'path': str(file_path),
+        'fingerprint': fingerprint.hexdigest(),
+        'variants': find_file_variants(vibe_dir, relative_name, fingerprint.hexdigest()),
+        'last_modified': stat.st_mtime,
+        'size': stat.st_size,
+        'content_type': content_type or 'application/octet-stream',
+        'generation': generation,
+    }
+    cache.set(file_key, meta, None)
+    return meta
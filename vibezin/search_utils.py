@@ -0,0 +1,361 @@
+"""
+Full-text search over vibes.
+
+Each vibe has one row in a search table, keyed by the vibe's id, with four
+text columns: the title, the description, the text of the vibe's content and
+the visible text of the vibe's HTML files. The table is an FTS5 table on SQLite
+and a table with a weighted tsvector column and a GIN index on PostgreSQL,
+so a search is an index lookup however many vibes there are. On other
+databases (or SQLite built without FTS5) search falls back to a LIKE scan
+of titles and descriptions.
+
+The rows are kept up to date incrementally: the Vibe signals update the
+title and description, vibe_utils.set_vibe_content updates the content, and
+VibeFileManager updates the file text when HTML files change.
+rebuild_search_index (the rebuild_vibe_search command) indexes all vibes from
+scratch.
+"""
+import re
+import logging
+from typing import Any, Dict, Iterable, List, Optional
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Q
+from .models import Vibe
+
+logger = logging.getLogger(__name__)
+
+# Number of results per search page
+VIBE_SEARCH_PAGE_SIZE = getattr(settings, 'VIBE_SEARCH_PAGE_SIZE', 20)
+
+# Largest page a client can ask for
+VIBE_SEARCH_MAX_PAGE_SIZE = getattr(settings, 'VIBE_SEARCH_MAX_PAGE_SIZE', 50)
+
+# Number of results that can be paged through; deeper pages cost more to rank
+VIBE_SEARCH_MAX_RESULTS = getattr(settings, 'VIBE_SEARCH_MAX_RESULTS', 1000)
+
+# Longest text indexed per column (characters)
+VIBE_SEARCH_MAX_TEXT = getattr(settings, 'VIBE_SEARCH_MAX_TEXT', 100000)
+
+# PostgreSQL text search configuration (stemming and stop words)
+VIBE_SEARCH_CONFIG = getattr(settings, 'VIBE_SEARCH_CONFIG', 'english')
+
+SEARCH_TABLE = 'vibezin_vibe_search'
+
+# Indexed columns, most important first
+SEARCH_COLUMNS = ('title', 'description', 'content', 'files')
+
+# Relative weight of a match in each column (FTS5 bm25 weights; PostgreSQL
+# uses the A-D weight classes in the same order)
+SEARCH_WEIGHTS = (10.0, 4.0, 2.0, 1.0)
+
+# Files whose text is indexed
+SEARCH_FILE_TYPES = ('html', 'htm')
+
+_TERM_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+# Search backend by database alias, detected once per process
+_backends = {}
+
+
+def get_search_backend() -> Optional[str]:
+    """
+    Get the full-text search backend of the database.
+
+    Returns:
+        'fts5' (SQLite), 'postgres' or None if the database has neither
+    """
+    alias = connection.alias
+    if alias not in _backends:
+        backend = None
+        if connection.vendor == 'postgresql':
+            backend = 'postgres'
+        elif connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+                if cursor.fetchone()[0]:
+                    backend = 'fts5'
+        if backend is None:
+            logger.warning(f"No full-text search on {connection.vendor}, searching titles and descriptions only")
+        _backends[alias] = backend
+    return _backends[alias]
+
+
+def create_search_index() -> None:
+    """
+    Create the search table if it doesn't exist (run after migrate).
+    """
+    backend = get_search_backend()
+    with connection.cursor() as cursor:
+        if backend == 'fts5':
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} "
+                f"USING fts5({', '.join(SEARCH_COLUMNS)}, tokenize='porter unicode61')"
+            )
+        elif backend == 'postgres':
+            # The configuration is spelled out, as generated columns must be immutable
+            config = VIBE_SEARCH_CONFIG.replace("'", "''")
+            document = ' || '.join(
+                f"setweight(to_tsvector('{config}'::regconfig, {column}), '{weight}')"
+                for column, weight in zip(SEARCH_COLUMNS, 'ABCD')
+            )
+            columns = ', '.join(f"{column} text NOT NULL DEFAULT ''" for column in SEARCH_COLUMNS)
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {SEARCH_TABLE} ("
+                f"vibe_id bigint PRIMARY KEY REFERENCES {Vibe._meta.db_table} (id) ON DELETE CASCADE, "
+                f"{columns}, "
+                f"document tsvector GENERATED ALWAYS AS ({document}) STORED)"
+            )
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {SEARCH_TABLE}_document ON {SEARCH_TABLE} USING gin (document)"
+            )
+
+
+def _clip(text: Optional[str]) -> str:
+    return (text or '')[:VIBE_SEARCH_MAX_TEXT]
+
+
+def _json_text(value: Any) -> List[str]:
+    """Collect the strings in a JSON value."""
+    if isinstance(value, str):
+        return [value]
+    if isinstance(value, dict):
+        return [text for item in value.values() for text in _json_text(item)]
+    if isinstance(value, list):
+        return [text for item in value for text in _json_text(item)]
+    return []
+
+
+def get_content_text(vibe: Vibe) -> str:
+    """
+    Get the searchable text of a vibe's content.
+
+    Args:
+        vibe: The Vibe object
+
+    Returns:
+        The strings in the content, separated by spaces
+    """
+    from .vibe_utils import get_vibe_content
+
+    # Indexing never generates content for a vibe that has none
+    result = get_vibe_content(vibe, create=False)
+    return ' '.join(_json_text(result.get('content', {})))
+
+
+def get_files_text(vibe: Vibe) -> str:
+    """
+    Get the visible text of a vibe's HTML files.
+
+    Args:
+        vibe: The Vibe object
+
+    Returns:
+        The text of all HTML files, in file name order
+    """
+    from .vibe_utils import get_vibe_directory
+    from .file_index_utils import get_file_index
+    from .html_utils import extract_text
+
+    texts = []
+    for info in get_file_index(get_vibe_directory(vibe.slug)):
+        if info['type'] not in SEARCH_FILE_TYPES:
+            continue
+        try:
+            with open(info['path'], 'r', encoding='utf-8', errors='replace') as f:
+                texts.append(extract_text(f.read()))
+        except FileNotFoundError:
+            continue
+    return ' '.join(texts)
+
+
+def update_vibe_search(vibe: Vibe, title: bool = True, content: bool = False, files: bool = False) -> bool:
+    """
+    Update the search row of a vibe, creating it if needed.
+
+    Only the requested columns are read and written, so a save of the vibe
+    doesn't read its files.
+
+    Args:
+        vibe: The Vibe object
+        title: Whether to update the title and description
+        content: Whether to update the text of the content
+        files: Whether to update the text of the HTML files
+
+    Returns:
+        True if the row was updated
+    """
+    backend = get_search_backend()
+    if backend is None or not vibe.pk or not (title or content or files):
+        return False
+
+    try:
+        values = {}
+        if title:
+            values['title'] = _clip(vibe.title)
+            values['description'] = _clip(vibe.description)
+        if content:
+            values['content'] = _clip(get_content_text(vibe))
+        if files:
+            values['files'] = _clip(get_files_text(vibe))
+
+        columns = list(values)
+        params = [values[column] for column in columns]
+
+        # A savepoint, so a failed update doesn't break the caller's transaction
+        with transaction.atomic(), connection.cursor() as cursor:
+            if backend == 'fts5':
+                assignments = ', '.join(f"{column} = %s" for column in columns)
+                cursor.execute(f"UPDATE {SEARCH_TABLE} SET {assignments} WHERE rowid = %s", params + [vibe.pk])
+                if cursor.rowcount == 0:
+                    cursor.execute(
+                        f"INSERT INTO {SEARCH_TABLE} (rowid, {', '.join(columns)}) "
+                        f"VALUES (%s, {', '.join(['%s'] * len(columns))})",
+                        [vibe.pk] + params
+                    )
+            else:
+                assignments = ', '.join(f"{column} = EXCLUDED.{column}" for column in columns)
+                cursor.execute(
+                    f"INSERT INTO {SEARCH_TABLE} (vibe_id, {', '.join(columns)}) "
+                    f"VALUES (%s, {', '.join(['%s'] * len(columns))}) "
+                    f"ON CONFLICT (vibe_id) DO UPDATE SET {assignments}",
+                    [vibe.pk] + params
+                )
+        return True
+    except (DatabaseError, OSError) as e:
+        logger.error(f"Error updating search index for {vibe.slug}: {str(e)}")
+        return False
+
+
+def remove_vibe_search(vibe_id: int) -> None:
+    """
+    Remove a vibe from the search index.
+
+    Args:
+        vibe_id: The id of the deleted vibe
+    """
+    backend = get_search_backend()
+    if backend is None:
+        return
+
+    key = 'rowid' if backend == 'fts5' else 'vibe_id'
+    try:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE {key} = %s", [vibe_id])
+    except DatabaseError as e:
+        logger.error(f"Error removing vibe {vibe_id} from search index: {str(e)}")
+
+
+def rebuild_search_index(vibes: Optional[Iterable[Vibe]] = None) -> Dict[str, Any]:
+    """
+    Index vibes from scratch, e.g. after creating the search table on an
+    existing database.
+
+    Args:
+        vibes: Vibes to index (defaults to all vibes)
+
+    Returns:
+        Dictionary with status and the number of vibes indexed
+    """
+    if get_search_backend() is None:
+        return {'success': False, 'error': f"No full-text search on {connection.vendor}"}
+
+    create_search_index()
+    if vibes is None:
+        vibes = Vibe.objects.order_by('id').iterator(chunk_size=500)
+
+        # Drop rows of vibes deleted without the signals (PostgreSQL cascades)
+        if get_search_backend() == 'fts5':
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"DELETE FROM {SEARCH_TABLE} WHERE rowid NOT IN (SELECT id FROM {Vibe._meta.db_table})"
+                )
+
+    indexed = 0
+    failed = 0
+    for vibe in vibes:
+        if update_vibe_search(vibe, title=True, content=True, files=True):
+            indexed += 1
+        else:
+            failed += 1
+
+    return {'success': failed == 0, 'indexed': indexed, 'failed': failed}
+
+
+def _fts5_query(terms: List[str]) -> str:
+    """Quote the terms for FTS5 MATCH; the last one also matches as a prefix."""
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+def _search_ids(terms: List[str], limit: int, offset: int) -> List[int]:
+    """Get the ids of the matching vibes, best match first."""
+    backend = get_search_backend()
+
+    if backend == 'fts5':
+        weights = ', '.join(str(weight) for weight in SEARCH_WEIGHTS)
+        sql = (
+            f"SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s "
+            f"ORDER BY bm25({SEARCH_TABLE}, {weights}), rowid DESC LIMIT %s OFFSET %s"
+        )
+        params = [_fts5_query(terms), limit, offset]
+    else:
+        # ts_rank weights are given lowest class (D) first
+        weights = ', '.join(str(weight / SEARCH_WEIGHTS[0]) for weight in reversed(SEARCH_WEIGHTS))
+        sql = (
+            f"SELECT vibe_id FROM {SEARCH_TABLE}, plainto_tsquery(%s::regconfig, %s) query "
+            f"WHERE document @@ query "
+            f"ORDER BY ts_rank('{{{weights}}}', document, query) DESC, vibe_id DESC LIMIT %s OFFSET %s"
+        )
+        params = [VIBE_SEARCH_CONFIG, ' '.join(terms), limit, offset]
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def search_vibes(query: str, page: int = 1, page_size: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Search vibes by title, description, content and the text of their files.
+
+    Args:
+        query: The search words; vibes matching all of them are found
+        page: The page of results, starting at 1
+        page_size: Number of results on the page (defaults to VIBE_SEARCH_PAGE_SIZE)
+
+    Returns:
+        Dictionary with the vibes on the page (best match first, with their
+        users) and the number of the next page (None on the last page)
+    """
+    if page_size is None:
+        page_size = VIBE_SEARCH_PAGE_SIZE
+    page_size = max(1, min(page_size, VIBE_SEARCH_MAX_PAGE_SIZE))
+    page = max(1, page)
+
+    terms = _TERM_PATTERN.findall(query.lower())
+    offset = (page - 1) * page_size
+    if not terms or offset >= VIBE_SEARCH_MAX_RESULTS:
+        return {'vibes': [], 'next_page': None}
+
+    # One extra result tells whether there is a next page
+    limit = min(page_size + 1, VIBE_SEARCH_MAX_RESULTS - offset)
+
+    if get_search_backend() is None:
+        condition = Q()
+        for term in terms:
+            condition &= Q(title__icontains=term) | Q(description__icontains=term)
+        vibes = list(
+            Vibe.objects.select_related('user').defer('content').filter(condition)
+            .order_by('-created_at', '-id')[offset:offset + limit]
+        )
+    else:
+        ids = _search_ids(terms, limit, offset)
+        found = Vibe.objects.select_related('user').defer('content').in_bulk(ids)
+        vibes = [found[pk] for pk in ids if pk in found]
+
+    has_more = len(vibes) > page_size
+    return {
+        'vibes': vibes[:page_size],
+        'next_page': page + 1 if has_more else None,
+    }
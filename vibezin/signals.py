@@ -2,17 +2,19 @@
 Signal handlers for the vibezin app.
 """
 import logging
-from django.db.models.signals import post_save, post_delete, pre_save
+from django.db.models.signals import post_save, post_delete, pre_save, post_migrate
 from django.dispatch import receiver
-from .models import Vibe
-from .vibe_utils import create_vibe_directory, delete_vibe_directory
+from django.contrib.auth.models import User
+from .models import Vibe, UserProfile
+from .vibe_utils import create_vibe_directory, delete_vibe_directory, invalidate_vibe_content, VIBE_EXPORT_JSON_FILES
 
 logger = logging.getLogger(__name__)
 
 @receiver(post_save, sender=Vibe)
 def create_vibe_directory_handler(sender, instance, created, **kwargs):
     """
-    Create a directory for a vibe when it is created.
+    Create a directory for a vibe when it is created, and export its
+    metadata when it changes if JSON exports are on.
     
     Args:
         sender: The model class
@@ -29,8 +31,8 @@ def create_vibe_directory_handler(sender, instance, created, **kwargs):
                 result = create_vibe_directory(instance)
                 if not result["success"]:
                     logger.error(f"Failed to create vibe directory: {result['message']}")
-            # Otherwise, update the metadata file
-            else:
+            # Otherwise, update the exported metadata file
+            elif VIBE_EXPORT_JSON_FILES:
                 from .vibe_utils import create_vibe_metadata_file
                 logger.info(f"Updating metadata for vibe: {instance.slug}")
                 result = create_vibe_metadata_file(instance)
@@ -40,6 +42,24 @@ def create_vibe_directory_handler(sender, instance, created, **kwargs):
         logger.exception(f"Error in create_vibe_directory_handler: {str(e)}")
 
 
+@receiver(post_save, sender=Vibe)
+@receiver(post_delete, sender=Vibe)
+def invalidate_vibe_content_handler(sender, instance, **kwargs):
+    """
+    Drop the cached content of a vibe when the vibe is saved or deleted.
+
+    Args:
+        sender: The model class
+        instance: The Vibe instance
+        **kwargs: Additional keyword arguments
+    """
+    update_fields = kwargs.get('update_fields')
+    if update_fields is not None and 'content' not in update_fields:
+        return
+
+    invalidate_vibe_content(instance.pk)
+
+
 @receiver(post_delete, sender=Vibe)
 def delete_vibe_directory_handler(sender, instance, **kwargs):
     """
@@ -96,5 +116,160 @@ def handle_slug_change(sender, instance, **kwargs):
                     
                     # Rename the directory
                     shutil.move(str(old_dir), str(new_dir))
+
+                # The compiled page is cached under the old slug
+                from .render_utils import invalidate_vibe_page
+                invalidate_vibe_page(old_instance.slug)
     except Exception as e:
         logger.exception(f"Error in handle_slug_change: {str(e)}")
+
+
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+def invalidate_ai_context_handler(sender, instance, **kwargs):
+    """
+    Drop the user's cached AI contexts when their profile (and API key) changes.
+
+    Args:
+        sender: The model class
+        instance: The UserProfile instance
+        **kwargs: Additional keyword arguments
+    """
+    from .ai_models import invalidate_user_ai_context
+    invalidate_user_ai_context(instance.user_id)
+
+
+@receiver(post_save, sender=Vibe)
+@receiver(post_delete, sender=Vibe)
+def invalidate_vibe_owner_profile_handler(sender, instance, **kwargs):
+    """
+    Drop the cached profile summary of a vibe's owner when the vibe changes.
+
+    Args:
+        sender: The model class
+        instance: The Vibe instance
+        **kwargs: Additional keyword arguments
+    """
+    try:
+        if instance.user_id:
+            from .profile_utils import invalidate_profile_summary
+            invalidate_profile_summary(instance.user.username)
+    except Exception as e:
+        logger.exception(f"Error in invalidate_vibe_owner_profile_handler: {str(e)}")
+
+
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+def invalidate_profile_summary_handler(sender, instance, **kwargs):
+    """
+    Drop the user's cached profile summary when their profile changes.
+
+    Args:
+        sender: The model class
+        instance: The UserProfile instance
+        **kwargs: Additional keyword arguments
+    """
+    try:
+        from .profile_utils import invalidate_profile_summary
+        invalidate_profile_summary(instance.user.username)
+    except Exception as e:
+        logger.exception(f"Error in invalidate_profile_summary_handler: {str(e)}")
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_profile_summary_handler(sender, instance, **kwargs):
+    """
+    Drop a user's cached profile summary when the user changes.
+
+    Saves that only update other fields (e.g. last_login on every login)
+    don't affect the summary and are skipped.
+
+    Args:
+        sender: The model class
+        instance: The User instance
+        **kwargs: Additional keyword arguments
+    """
+    update_fields = kwargs.get('update_fields')
+    if update_fields is not None and not {'username', 'is_staff'} & set(update_fields):
+        return
+
+    from .profile_utils import invalidate_profile_summary
+    invalidate_profile_summary(instance.username)
+
+
+@receiver(pre_save, sender=User)
+def handle_username_change(sender, instance, **kwargs):
+    """
+    Drop the cached profile summary under a user's old username when it changes.
+
+    Args:
+        sender: The model class
+        instance: The User instance
+        **kwargs: Additional keyword arguments
+    """
+    update_fields = kwargs.get('update_fields')
+    if not instance.pk or (update_fields is not None and 'username' not in update_fields):
+        return
+
+    try:
+        old_username = User.objects.filter(pk=instance.pk).values_list('username', flat=True).first()
+        if old_username and old_username != instance.username:
+            from .profile_utils import invalidate_profile_summary
+            invalidate_profile_summary(old_username)
+    except Exception as e:
+        logger.exception(f"Error in handle_username_change: {str(e)}")
+
+
+@receiver(post_save, sender=Vibe)
+def update_vibe_search_handler(sender, instance, created, **kwargs):
+    """
+    Update the search index when a vibe is saved.
+
+    The title and description are indexed on every save; the content is
+    indexed whenever it is stored (see vibe_utils.set_vibe_content).
+
+    Args:
+        sender: The model class
+        instance: The Vibe instance
+        created: Whether the instance was created
+        **kwargs: Additional keyword arguments
+    """
+    try:
+        from .search_utils import update_vibe_search
+        update_vibe_search(instance, title=True)
+    except Exception as e:
+        logger.exception(f"Error in update_vibe_search_handler: {str(e)}")
+
+
+@receiver(post_delete, sender=Vibe)
+def remove_vibe_search_handler(sender, instance, **kwargs):
+    """
+    Remove a vibe from the search index when it is deleted.
+
+    Args:
+        sender: The model class
+        instance: The Vibe instance
+        **kwargs: Additional keyword arguments
+    """
+    try:
+        from .search_utils import remove_vibe_search
+        remove_vibe_search(instance.pk)
+    except Exception as e:
+        logger.exception(f"Error in remove_vibe_search_handler: {str(e)}")
+
+
+@receiver(post_migrate)
+def create_search_index_handler(sender, **kwargs):
+    """
+    Create the search table after the vibezin tables are migrated.
+
+    Args:
+        sender: The app config that was migrated
+        **kwargs: Additional keyword arguments
+    """
+    if sender.name != 'vibezin':
+        return
+
+    from .search_utils import create_search_index
+    create_search_index()
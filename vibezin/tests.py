@@ -1,3 +1,706 @@
-from django.test import TestCase
+import asyncio
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+
+from . import blob_utils
+from .models import Vibe, BackgroundJob
+
+
+class VibeTestMixin:
+    """Gives each test a user, empty caches and its own vibe and blob directories."""
+
+    def setUp(self):
+        for alias in ('default', 'vibe_pages'):
+            caches[alias].clear()
+
+        temp_dir = Path(tempfile.mkdtemp(prefix='vibezin-test-'))
+        self.addCleanup(shutil.rmtree, temp_dir, True)
+        settings_override = override_settings(VIBE_CONTENT_DIR=temp_dir / 'vibes')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        blob_dir = mock.patch.object(blob_utils, 'VIBE_BLOB_DIR', temp_dir / 'blobs')
+        blob_dir.start()
+        self.addCleanup(blob_dir.stop)
+
+        # New vibes would otherwise ask OpenAI for their initial content
+        generate_content = mock.patch('vibezin.vibe_utils.generate_vibe_content', return_value={'success': False})
+        generate_content.start()
+        self.addCleanup(generate_content.stop)
+
+        self.user = User.objects.create_user('alice', password='password')
+        self.user.profile.chatgpt_api_key = 'sk-real'
+        self.user.profile.save()
+
+    def create_vibe(self, title='Cats', **kwargs):
+        return Vibe.objects.create(title=title, description='A vibe', user=self.user, **kwargs)
+
+
+class VibeTestCase(VibeTestMixin, TestCase):
+    pass
+
+
+class VibeTransactionTestCase(VibeTestMixin, TransactionTestCase):
+    """For tests whose code uses the database from other threads."""
+
+
+class GenerateImageToolTests(VibeTestCase):
+    """The generate_image tool, which runs its job inline."""
+
+    def test_job_claimed_by_worker_returns_status_url(self):
+        from .ai_tools import handle_generate_image
+        from .file_utils import VibeFileManager
+
+        vibe = self.create_vibe()
+        with mock.patch('vibezin.job_utils.claim_job', return_value=False), \
+                mock.patch('vibezin.image_utils.generate_image') as generate_image:
+            reply = handle_generate_image(VibeFileManager(vibe), {'prompt': 'a cat'}, self.user)
+
+        job = BackgroundJob.objects.get()
+        self.assertEqual(job.status, BackgroundJob.STATUS_PENDING)
+        self.assertIn(f'/jobs/{job.id}/', reply)
+        generate_image.assert_not_called()
+
+    def test_failure_is_not_retried(self):
+        from .ai_tools import handle_generate_image
+        from .file_utils import VibeFileManager
+
+        vibe = self.create_vibe()
+        failure = {'success': False, 'error': 'overloaded', 'status_code': 503}
+        with mock.patch('vibezin.image_utils.generate_image', return_value=failure):
+            reply = handle_generate_image(VibeFileManager(vibe), {'prompt': 'a cat'}, self.user)
+
+        self.assertEqual(reply, 'Error: overloaded')
+        self.assertEqual(BackgroundJob.objects.get().status, BackgroundJob.STATUS_FAILED)
+
+
+class AsyncHTTPClientTests(SimpleTestCase):
+    """The shared httpx client kept per event loop."""
+
+    def test_client_is_shared_within_a_loop_and_closed_with_it(self):
+        from .http_utils import get_async_client
+
+        async def get_clients():
+            return get_async_client(), get_async_client()
+
+        first, second = asyncio.run(get_clients())
+        self.assertIs(first, second)
+        self.assertTrue(first.is_closed)
+
+
+class AIContextCacheTests(VibeTestCase):
+    """The per-user cache of AI model contexts."""
+
+    def test_cache_hit_does_not_load_the_profile(self):
+        from .ai_models import get_user_ai_context
+
+        context = get_user_ai_context(User.objects.get(pk=self.user.pk))
+        user = User.objects.get(pk=self.user.pk)
+        with self.assertNumQueries(0):
+            self.assertIs(get_user_ai_context(user), context)
+
+    def test_new_api_key_is_picked_up(self):
+        from .ai_models import get_user_ai_context
+
+        self.assertEqual(get_user_ai_context(self.user).api_key, 'sk-real')
+        self.user.profile.chatgpt_api_key = 'sk-new'
+        self.user.profile.save()
+        self.assertEqual(get_user_ai_context(User.objects.get(pk=self.user.pk)).api_key, 'sk-new')
+
+
+class BlobStoreTests(VibeTestCase):
+    """Vibe files stored as hard links to content-addressed blobs."""
+
+    def test_identical_files_share_a_blob(self):
+        from .file_utils import VibeFileManager
+
+        first = VibeFileManager(self.create_vibe('First'))
+        second = VibeFileManager(self.create_vibe('Second'))
+        first.write_file('style.css', 'body { color: red; }')
+        second.write_file('style.css', 'body { color: red; }')
+
+        digest = blob_utils.hash_content(b'body { color: red; }')
+        self.assertTrue(os.path.samefile(first.vibe_dir / 'style.css', blob_utils.get_blob_path(digest)))
+        self.assertTrue(os.path.samefile(second.vibe_dir / 'style.css', blob_utils.get_blob_path(digest)))
+
+    def test_shared_file_cannot_be_opened_for_writing_in_place(self):
+        from .file_utils import VibeFileManager
+
+        first = VibeFileManager(self.create_vibe('First'))
+        second = VibeFileManager(self.create_vibe('Second'))
+        first.write_file('index.html', '<p>shared</p>')
+        second.write_file('index.html', '<p>shared</p>')
+
+        for mode in ('w', 'a', 'r+'):
+            with self.assertRaises(blob_utils.SharedBlobError):
+                blob_utils.open_vibe_file(first.vibe_dir / 'index.html', mode)
+
+        # Writing through the manager replaces the link instead
+        first.write_file('index.html', '<p>changed</p>')
+        self.assertEqual(first.read_file('index.html')['content'], '<p>changed</p>')
+        self.assertEqual(second.read_file('index.html')['content'], '<p>shared</p>')
+
+    def test_garbage_collection_keeps_linked_blobs(self):
+        from .file_utils import VibeFileManager
+
+        manager = VibeFileManager(self.create_vibe())
+        manager.write_file('index.html', '<p>kept</p>')
+        manager.write_file('old.html', '<p>dropped</p>')
+        manager.delete_file('old.html')
+        kept = blob_utils.get_blob_path(blob_utils.hash_content(b'<p>kept</p>'))
+        dropped = blob_utils.get_blob_path(blob_utils.hash_content(b'<p>dropped</p>'))
+
+        # A lost manifest entry doesn't matter while the file links the blob
+        blob_utils.write_manifest(manager.vibe_dir, {})
+
+        result = blob_utils.collect_garbage(grace_period=0)
+        self.assertTrue(kept.exists())
+        self.assertFalse(dropped.exists())
+        self.assertEqual(result['removed'], 1)
+        self.assertEqual(manager.read_file('index.html')['content'], '<p>kept</p>')
+
+    def test_garbage_collection_keeps_recent_blobs(self):
+        digest = blob_utils.put_blob(b'about to be linked')
+
+        blob_utils.collect_garbage()
+        self.assertTrue(blob_utils.get_blob_path(digest).exists())
+
+
+class FileIndexTests(VibeTestCase):
+    """The in-memory index of the files in each vibe directory."""
+
+    def setUp(self):
+        super().setUp()
+        from .file_utils import VibeFileManager
+        self.manager = VibeFileManager(self.create_vibe())
+        self.manager.write_file('index.html', '<p>hi</p>')
+
+    def set_directory_mtime(self, mtime_ns):
+        os.utime(self.manager.vibe_dir, ns=(mtime_ns, mtime_ns))
+
+    def test_change_within_a_timestamp_tick_is_listed(self):
+        from .file_index_utils import get_file_index
+
+        vibe_dir = self.manager.vibe_dir
+        get_file_index(vibe_dir)
+        mtime_ns = os.stat(vibe_dir).st_mtime_ns
+
+        # Another process adds a file within the same tick
+        (vibe_dir / 'other.html').write_text('<p>other</p>')
+        self.set_directory_mtime(mtime_ns)
+
+        self.assertEqual([f['name'] for f in get_file_index(vibe_dir)], ['index.html', 'other.html'])
+
+    def test_unchanged_directory_is_not_scanned_again(self):
+        from . import file_index_utils
+
+        vibe_dir = self.manager.vibe_dir
+        self.set_directory_mtime(os.stat(vibe_dir).st_mtime_ns - 60 * 1_000_000_000)
+        file_index_utils.get_file_index(vibe_dir)
+
+        with mock.patch.object(file_index_utils, '_scan_directory') as scan:
+            files = file_index_utils.get_file_index(vibe_dir)
+        scan.assert_not_called()
+        self.assertEqual([f['name'] for f in files], ['index.html'])
+
+
+class FileManagerPathTests(VibeTestCase):
+    """File names given to VibeFileManager stay inside the vibe directory."""
+
+    def test_names_outside_the_vibe_directory_are_refused(self):
+        from .file_utils import VibeFileManager
+
+        victim = VibeFileManager(self.create_vibe('Victim'))
+        victim.write_file('index.html', '<p>mine</p>')
+        manager = VibeFileManager(self.create_vibe('Attacker'))
+
+        for result in (
+            manager.delete_file(f'../{victim.vibe_dir.name}/index.html'),
+            manager.write_file(f'../{victim.vibe_dir.name}/index.html', '<p>yours</p>'),
+            manager.read_file(str(victim.vibe_dir / 'index.html')),
+            manager.write_file('.manifest.json', '{}'),
+        ):
+            self.assertFalse(result['success'])
+            self.assertIn('Invalid file name', result['error'])
+
+        self.assertEqual(victim.read_file('index.html')['content'], '<p>mine</p>')
+        self.assertIn('index.html', blob_utils.read_manifest(victim.vibe_dir))
+        self.assertEqual([f['name'] for f in victim.list_files()], ['index.html'])
+
+
+class AIResponseCacheTests(SimpleTestCase):
+    """The opt-in cache for identical AI requests."""
+
+    def setUp(self):
+        from . import ai_response_cache
+
+        caches['default'].clear()
+        cache_alias = mock.patch.object(ai_response_cache, 'AI_RESPONSE_CACHE_ALIAS', 'default')
+        cache_alias.start()
+        self.addCleanup(cache_alias.stop)
+
+    def generate(self, api_key, content):
+        from .ai_models import GPT4Context
+
+        response = mock.Mock(status_code=200)
+        response.json.return_value = {'choices': [{'message': {'role': 'assistant', 'content': content}}]}
+        context = GPT4Context(api_key)
+        with mock.patch.object(GPT4Context, '_post', return_value=response) as post:
+            result = context.generate_response([{'role': 'user', 'content': 'hi'}], use_cache=True)
+        return result['choices'][0]['message']['content'], post.call_count
+
+    def test_identical_request_is_answered_from_the_cache(self):
+        self.assertEqual(self.generate('sk-first', 'first'), ('first', 1))
+        self.assertEqual(self.generate('sk-first', 'second'), ('first', 0))
+
+    def test_cached_responses_are_not_shared_between_api_keys(self):
+        self.assertEqual(self.generate('sk-first', 'first'), ('first', 1))
+        self.assertEqual(self.generate('sk-second', 'second'), ('second', 1))
+
+
+class RateLimiterTests(SimpleTestCase):
+    """OpenAI rate limits shared through the cache."""
+
+    def setUp(self):
+        from . import rate_limit_utils
+
+        caches['default'].clear()
+        # Stay inside one counting window
+        clock = mock.patch.object(rate_limit_utils, 'time', mock.Mock(time=mock.Mock(return_value=1000.0)))
+        clock.start()
+        self.addCleanup(clock.stop)
+
+    def quota_error(self):
+        return {'error': {'message': 'You exceeded your current quota', 'type': 'insufficient_quota',
+                          'code': 'insufficient_quota'}}
+
+    def test_limiters_for_the_same_key_share_capacity(self):
+        from . import rate_limit_utils
+
+        with mock.patch.object(rate_limit_utils, 'OPENAI_IMAGES_PER_MINUTE', 12):
+            worker_one = rate_limit_utils.get_rate_limiter('sk-real')
+            worker_two = rate_limit_utils.get_rate_limiter('sk-real')
+            other_key = rate_limit_utils.get_rate_limiter('sk-other')
+
+            self.assertEqual(worker_one.reserve({'images': 1}, max_wait=0), 0)
+            self.assertEqual(worker_two.reserve({'images': 1}, max_wait=0), 0)
+            with self.assertRaises(rate_limit_utils.RateLimitExceeded):
+                worker_one.reserve({'images': 1}, max_wait=0)
+            self.assertEqual(other_key.reserve({'images': 1}, max_wait=0), 0)
+
+            # The call that can't wait long enough reserves nothing
+            self.assertEqual(worker_two.reserve({'images': 1}, max_wait=10), 10)
+
+    def test_pause_holds_back_every_limiter_for_the_key(self):
+        from . import rate_limit_utils
+
+        rate_limit_utils.get_rate_limiter('sk-real').pause(5)
+        limiter = rate_limit_utils.get_rate_limiter('sk-real')
+        with self.assertRaises(rate_limit_utils.RateLimitExceeded) as raised:
+            limiter.reserve({'requests': 1}, max_wait=1)
+        self.assertEqual(raised.exception.retry_after, 5)
+        self.assertEqual(limiter.reserve({'requests': 1}, max_wait=5), 5)
+
+    def test_quota_error_is_not_retried(self):
+        from . import rate_limit_utils
+
+        response = mock.Mock(status_code=429, headers={})
+        response.json.return_value = self.quota_error()
+        send = mock.Mock(return_value=response)
+
+        self.assertIs(rate_limit_utils.send_with_rate_limit('sk-real', send), response)
+        self.assertEqual(send.call_count, 1)
+
+    def test_quota_error_is_not_retried_for_streamed_async_calls(self):
+        import httpx
+        from . import rate_limit_utils
+
+        requests_sent = []
+
+        def handler(request):
+            requests_sent.append(request)
+            return httpx.Response(429, json=self.quota_error())
+
+        async def send():
+            async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+                response = await rate_limit_utils.asend_with_rate_limit(
+                    'sk-real',
+                    lambda: client.send(client.build_request('POST', 'https://api.openai.com/v1/chat/completions'),
+                                        stream=True)
+                )
+                await response.aclose()
+                return response
+
+        self.assertEqual(asyncio.run(send()).status_code, 429)
+        self.assertEqual(len(requests_sent), 1)
+
+    def test_rate_limited_call_is_retried(self):
+        from . import rate_limit_utils
+
+        limited = mock.Mock(status_code=429, headers={'retry-after': '1'})
+        limited.json.return_value = {'error': {'type': 'requests', 'code': 'rate_limit_exceeded'}}
+        ok = mock.Mock(status_code=200)
+        send = mock.Mock(side_effect=[limited, ok])
+
+        self.assertIs(rate_limit_utils.send_with_rate_limit('sk-real', send), ok)
+        self.assertEqual(send.call_count, 2)
+
+
+class FileHistoryTests(VibeTestCase):
+    """Earlier versions of vibe files, kept as reverse deltas."""
+
+    def write_versions(self, manager):
+        lines = [f'<p>line {number}</p>\n' for number in range(20)]
+        contents = []
+        for number in range(5):
+            lines = list(lines)
+            lines[number * 3] = f'<p>edit {number}</p>\n'
+            lines.insert(number, f'<h2>new {number}</h2>\n')
+            contents.append(''.join(lines))
+            result = manager.write_file('index.html', contents[-1])
+            self.assertEqual(result['version'], number + 1)
+        return contents
+
+    def test_write_history_revert_round_trip(self):
+        from .file_utils import VibeFileManager
+
+        manager = VibeFileManager(self.create_vibe())
+        contents = self.write_versions(manager)
+
+        for number, content in enumerate(contents, 1):
+            self.assertEqual(manager.read_version('index.html', number)['content'], content)
+
+        versions = manager.list_versions('index.html')['versions']
+        self.assertEqual([version['version'] for version in versions], [5, 4, 3, 2, 1])
+        self.assertEqual([version['current'] for version in versions], [True, False, False, False, False])
+
+        result = manager.restore_version('index.html', 2)
+        self.assertTrue(result['success'])
+        self.assertEqual(result['version'], 6)
+        self.assertEqual(manager.read_file('index.html')['content'], contents[1])
+
+        # The restore is a new version; the versions it replaced are still there
+        self.assertEqual(len(manager.list_versions('index.html')['versions']), 6)
+        self.assertEqual(manager.read_version('index.html', 5)['content'], contents[4])
+        self.assertEqual(manager.diff_versions('index.html', 2)['diff'], '')
+        self.assertFalse(manager.read_version('index.html', 7)['success'])
+
+    def test_restore_through_the_file_operation_view(self):
+        from django.urls import reverse
+        from .file_utils import VibeFileManager
+
+        vibe = self.create_vibe()
+        manager = VibeFileManager(vibe)
+        contents = self.write_versions(manager)
+        self.client.force_login(self.user)
+
+        response = self.client.post(
+            reverse('vibezin:vibe_ai_file_operation', args=[vibe.slug]),
+            {'operation': 'restore', 'filename': 'index.html', 'version': '1'}
+        )
+        self.assertTrue(response.json()['success'])
+        self.assertEqual(manager.read_file('index.html')['content'], contents[0])
+        self.assertNotIn('.history', [f['name'] for f in manager.list_files()])
+
+
+class FeedPaginationTests(VibeTestCase):
+    """The keyset-paginated vibe feed."""
+
+    def create_vibes(self, created_at):
+        from datetime import timedelta
+
+        # Vibes created in the same instant are ordered by id
+        return [
+            self.create_vibe(f'Vibe {number}', created_at=created_at - timedelta(minutes=number // 3))
+            for number in range(8)
+        ]
+
+    def test_pages_split_vibes_with_equal_created_at(self):
+        from django.utils import timezone
+        from .feed_utils import get_feed_page
+
+        vibes = self.create_vibes(timezone.now())
+        expected = [vibe.pk for vibe in sorted(vibes, key=lambda vibe: (vibe.created_at, vibe.pk), reverse=True)]
+
+        seen, cursor = [], None
+        while True:
+            page = get_feed_page(cursor, page_size=2)
+            seen.extend(vibe.pk for vibe in page['vibes'])
+            cursor = page['next_cursor']
+            if cursor is None:
+                break
+        self.assertEqual(seen, expected)
+
+    def test_new_vibes_do_not_shift_later_pages(self):
+        from django.urls import reverse
+        from django.utils import timezone
+
+        now = timezone.now()
+        vibes = self.create_vibes(now)
+        url = reverse('vibezin:vibe_feed')
+
+        first = self.client.get(url, {'limit': '4'}).json()
+        self.create_vibe('Newer', created_at=now)
+        second = self.client.get(url, {'limit': '4', 'cursor': first['next_cursor']}).json()
+
+        seen = [vibe['id'] for vibe in first['vibes'] + second['vibes']]
+        self.assertEqual(sorted(seen), sorted(vibe.pk for vibe in vibes))
+        self.assertIsNone(second['next_cursor'])
+
+    def test_malformed_cursor_is_rejected(self):
+        from django.urls import reverse
+
+        response = self.client.get(reverse('vibezin:vibe_feed'), {'cursor': 'not a cursor!'})
+        self.assertEqual(response.status_code, 400)
+
+
+class SlugAllocationTests(VibeTestCase):
+    """Unique vibe slugs made from titles."""
+
+    def test_colliding_titles_get_numbered_slugs(self):
+        slugs = [self.create_vibe('Cats').slug for _ in range(12)]
+        self.assertEqual(slugs, ['cats'] + [f'cats-{number}' for number in range(1, 12)])
+
+    def test_next_number_follows_the_highest_in_use(self):
+        self.create_vibe('Cats')
+        self.create_vibe('Cats and dogs')
+        self.create_vibe('Other', slug='cats-0099')
+
+        with self.assertNumQueries(1):
+            self.assertEqual(Vibe.allocate_slug('cats'), 'cats-100')
+
+        Vibe.objects.filter(slug='cats').delete()
+        self.assertEqual(Vibe.allocate_slug('cats'), 'cats')
+
+    def test_slug_taken_concurrently_is_allocated_again(self):
+        self.create_vibe('Cats')
+        allocate_slug = Vibe.allocate_slug
+        allocated = []
+
+        def allocate_stale_slug(base_slug):
+            # The first answer was computed before another vibe took 'cats-1'
+            allocated.append(base_slug)
+            if len(allocated) == 1:
+                Vibe.objects.create(title='Other', description='A vibe', user=self.user, slug='cats-1')
+                return 'cats-1'
+            return allocate_slug(base_slug)
+
+        with mock.patch.object(Vibe, 'allocate_slug', side_effect=allocate_stale_slug):
+            vibe = self.create_vibe('Cats')
+
+        self.assertEqual(len(allocated), 2)
+        self.assertEqual(vibe.slug, 'cats-2')
+        self.assertEqual(Vibe.objects.filter(slug__startswith='cats').count(), 3)
+
+
+class ContextWindowTests(SimpleTestCase):
+    """Conversations fitted into the AI token budget."""
+
+    def conversation(self):
+        return [
+            {'role': 'system', 'content': 'You build vibe pages.'},
+            {'role': 'user', 'content': 'Make me a page about cats'},
+            {'role': 'assistant', 'content': 'x' * 40000, 'tool_calls': [{'id': 'call_a'}, {'id': 'call_b'}]},
+            {'role': 'tool', 'tool_call_id': 'call_a', 'name': 'write_file', 'content': 'Wrote index.html'},
+            {'role': 'tool', 'tool_call_id': 'call_b', 'name': 'write_file', 'content': 'Wrote style.css'},
+            {'role': 'user', 'content': 'Thanks'},
+            {'role': 'assistant', 'content': 'You are welcome'},
+        ]
+
+    def assertToolCallsAnswered(self, messages):
+        called = set()
+        for message in messages:
+            called |= {tool_call['id'] for tool_call in message.get('tool_calls') or []}
+            if message['role'] == 'tool':
+                self.assertIn(message['tool_call_id'], called)
+
+    def test_tool_results_are_left_out_with_their_call(self):
+        from .ai_context_window import OMITTED_MESSAGES_NOTE, fit_messages
+
+        fitted = fit_messages(self.conversation(), budget=200, keep_recent=2)
+
+        self.assertNotIn('tool', [message['role'] for message in fitted])
+        self.assertEqual(fitted[1]['content'], OMITTED_MESSAGES_NOTE)
+        self.assertEqual(fitted[-2:], self.conversation()[-2:])
+
+    def test_recent_window_is_widened_to_include_the_call(self):
+        from .ai_context_window import fit_messages
+
+        # The last three messages start with the second tool result
+        messages = self.conversation()
+        fitted = fit_messages(messages, budget=200, keep_recent=3)
+
+        self.assertEqual([message['role'] for message in fitted][-5:], ['assistant', 'tool', 'tool', 'user', 'assistant'])
+        self.assertToolCallsAnswered(fitted)
+        self.assertEqual(messages, self.conversation())
+
+    def test_conversation_under_budget_is_unchanged(self):
+        from .ai_context_window import fit_messages
+
+        messages = self.conversation()
+        self.assertIs(fit_messages(messages, budget=10 ** 6), messages)
+
+
+class ToolDispatchTests(VibeTestCase):
+    """Native tool calls from AI responses."""
+
+    def tool_call(self, call_id, name, arguments):
+        import json
+
+        if not isinstance(arguments, str):
+            arguments = json.dumps(arguments)
+        return {'id': call_id, 'type': 'function', 'function': {'name': name, 'arguments': arguments}}
+
+    def dispatch(self, *tool_calls):
+        from .ai_tools import dispatch_tool_calls
+
+        self.vibe = self.create_vibe()
+        return dispatch_tool_calls(list(tool_calls), self.vibe, self.user)
+
+    def test_results_answer_each_call_in_order(self):
+        results = self.dispatch(
+            self.tool_call('call_1', 'write_file', {'filename': 'index.html', 'content': '<p>hi</p>'}),
+            self.tool_call('call_2', 'read_file', {'filename': 'index.html'}),
+            self.tool_call('call_3', 'write_file', {'filename': 'empty.txt', 'content': ''}),
+        )
+
+        self.assertEqual([result['tool_call_id'] for result in results], ['call_1', 'call_2', 'call_3'])
+        self.assertEqual([result['role'] for result in results], ['tool'] * 3)
+        self.assertIn('<p>hi</p>', results[1]['content'])
+        self.assertNotIn('Error', results[2]['content'])
+
+    def test_invalid_calls_are_answered_with_errors(self):
+        from .file_utils import VibeFileManager
+
+        results = self.dispatch(
+            self.tool_call('call_1', 'read_file', '{not json'),
+            self.tool_call('call_2', 'read_file', '["index.html"]'),
+            self.tool_call('call_3', 'make_coffee', {}),
+            self.tool_call('call_4', 'write_file', {'filename': 'index.html'}),
+            self.tool_call('call_5', 'generate_image', {'prompt': 'A cat', 'size': '5x5'}),
+            self.tool_call('call_6', 'write_files', {'files': [{'filename': 'a.html'}]}),
+            self.tool_call('call_7', 'read_file', {'filename': 42}),
+        )
+
+        errors = [result['content'] for result in results]
+        self.assertIn('Invalid JSON arguments for read_file', errors[0])
+        self.assertIn('must be a JSON object', errors[1])
+        self.assertIn('Unknown tool: make_coffee', errors[2])
+        self.assertIn("Missing required argument 'content' for write_file", errors[3])
+        self.assertIn("Argument 'size' for generate_image must be one of", errors[4])
+        self.assertIn("Missing required argument 'files[0].content' for write_files", errors[5])
+        self.assertIn("Argument 'filename' for read_file must be a string", errors[6])
+        self.assertNotIn('a.html', [f['name'] for f in VibeFileManager(self.vibe).list_files()])
+
+
+class ToolExecutorTests(SimpleTestCase):
+    """Independent tool calls run concurrently."""
+
+    def calls(self, *specs):
+        return [{'name': name, 'arguments': arguments} for name, arguments in specs]
+
+    def test_calls_on_the_same_file_run_in_order(self):
+        from .ai_tool_executor import plan_batches
+
+        calls = self.calls(
+            ('generate_image', {'prompt': 'A cat'}),
+            ('generate_image', {'prompt': 'A dog'}),
+            ('read_file', {'filename': 'index.html'}),
+            ('write_file', {'filename': 'index.html', 'content': '<p>hi</p>'}),
+            ('read_file', {'filename': 'index.html'}),
+            ('read_file', {'filename': 'style.css'}),
+            ('list_files', {}),
+        )
+        self.assertEqual(plan_batches(calls), [[0, 1, 2], [3], [4, 5, 6]])
+
+    def test_independent_calls_run_concurrently(self):
+        import threading
+        from .ai_tool_executor import execute_tool_calls
+
+        # Each call waits for the other, so running them one after another fails
+        both_running = threading.Barrier(2, timeout=5)
+
+        def run_call(call):
+            both_running.wait()
+            return call['arguments']['prompt']
+
+        calls = self.calls(('generate_image', {'prompt': 'A cat'}), ('generate_image', {'prompt': 'A dog'}))
+        self.assertEqual(execute_tool_calls(calls, run_call), ['A cat', 'A dog'])
+
+    def test_failing_call_does_not_fail_the_batch(self):
+        from .ai_tool_executor import execute_tool_calls
+
+        def run_call(call):
+            if call['arguments']['prompt'] == 'A dog':
+                raise RuntimeError('no dogs')
+            return call['arguments']['prompt']
+
+        calls = self.calls(('generate_image', {'prompt': 'A cat'}), ('generate_image', {'prompt': 'A dog'}))
+        self.assertEqual(execute_tool_calls(calls, run_call), ['A cat', 'Error: no dogs'])
+
+
+class ReasoningLoopTests(VibeTransactionTestCase):
+    """The reasoning loop shared by the sync, async and streaming AI paths."""
+
+    tool_round = {'choices': [{'message': {'role': 'assistant', 'content': 'Let me look', 'tool_calls': [
+        {'id': 'call_1', 'type': 'function', 'function': {'name': 'list_files', 'arguments': '{}'}},
+    ]}}]}
+    final_round = {'choices': [{'message': {'role': 'assistant', 'content': 'Done!'}}]}
+
+    def conversation(self):
+        from .ai_conversation import VibeConversation
+
+        return VibeConversation(self.user, self.create_vibe().id)
+
+    def assertToolRoundTrip(self, result, conversation):
+        self.assertTrue(result['success'])
+        self.assertEqual(result['content'], 'Done!')
+        self.assertEqual(result['iterations'], 2)
+        self.assertEqual([tool['name'] for tool in result['tool_results']], ['list_files'])
+        self.assertEqual(conversation.messages[-1]['role'], 'tool')
+        self.assertEqual(conversation.messages[-1]['tool_call_id'], 'call_1')
+
+    def test_tool_round_then_answer(self):
+        conversation = self.conversation()
+        with mock.patch.object(conversation.context, 'generate_response',
+                               side_effect=[self.tool_round, self.final_round]):
+            result = conversation.get_response()
+        self.assertToolRoundTrip(result, conversation)
+
+    def test_async_tool_round_then_answer(self):
+        conversation = self.conversation()
+        with mock.patch.object(conversation.context, 'agenerate_response',
+                               side_effect=[self.tool_round, self.final_round]):
+            result = asyncio.run(conversation.aget_response())
+        self.assertToolRoundTrip(result, conversation)
+
+    def test_stops_after_max_iterations(self):
+        conversation = self.conversation()
+        with mock.patch.object(conversation.context, 'generate_response', return_value=self.tool_round) as generate:
+            result = conversation.get_response(max_iterations=2)
+        self.assertEqual(generate.call_count, 2)
+        self.assertEqual(result['iterations'], 2)
+        self.assertIn('Tool result', result['content'])
+
+    def test_errors_are_returned(self):
+        conversation = self.conversation()
+        with mock.patch.object(conversation.context, 'generate_response', return_value={'error': 'Invalid API key'}):
+            self.assertFalse(conversation.get_response()['success'])
+        with mock.patch.object(conversation.context, 'generate_response', side_effect=RuntimeError('boom')):
+            self.assertEqual(conversation.get_response()['error'], 'Error in O1 reasoning loop: boom')
+
+    def test_test_key_streams_a_mock_response(self):
+        conversation = self.conversation()
+        # The canned response generates an image; keep that offline
+        with mock.patch.object(conversation.context, 'api_key', 'sk-test-key'), \
+                mock.patch('vibezin.ai_tools.handle_generate_image', return_value='Image generated'):
+            events = list(conversation.stream_response())
+        self.assertEqual(events[0]['event'], 'token')
+        self.assertEqual(events[-1]['event'], 'done')
+        self.assertTrue(events[-1]['data']['success'])
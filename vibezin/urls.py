@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 from . import views_ai
@@ -5,8 +6,19 @@ from . import views_image
 
 app_name = 'vibezin'
 
+# Under ASGI the AI message views can run as coroutines, so waiting on
+# OpenAI doesn't hold a thread per session
+if getattr(settings, 'AI_ASYNC_VIEWS', False):
+    ai_message_view = views_ai.vibe_ai_message_async
+    ai_message_stream_view = views_ai.vibe_ai_message_stream_async
+else:
+    ai_message_view = views_ai.vibe_ai_message
+    ai_message_stream_view = views_ai.vibe_ai_message_stream
+
 urlpatterns = [
     path('', views.index, name='index'),
+    path('feed/', views.vibe_feed, name='vibe_feed'),
+    path('search/', views.vibe_search, name='vibe_search'),
     path('add/', views.add_vibe, name='add_vibe'),
     path('vibe/<str:vibe_slug>/', views.vibe_detail_by_slug, name='vibe_detail_by_slug'),
     path('vibe/id/<int:vibe_id>/', views.vibe_detail, name='vibe_detail'),  # Keep for backward compatibility
@@ -15,12 +27,15 @@ urlpatterns = [
     path('profile/upload-image/', views.upload_profile_image, name='upload_profile_image'),
     path('profile/upload-background/', views.upload_background_image, name='upload_background_image'),
     path('user/<str:username>/', views.user_profile, name='user_profile'),
+    path('static/vibes/<str:vibe_slug>/<path:filename>', views.vibe_static_file, name='vibe_static_file'),
 
     # AI Builder URLs
     path('vibe/<str:vibe_slug>/ai/', views_ai.vibe_ai_builder, name='vibe_ai_builder'),
-    path('vibe/<str:vibe_slug>/ai/message/', views_ai.vibe_ai_message, name='vibe_ai_message'),
+    path('vibe/<str:vibe_slug>/ai/message/', ai_message_view, name='vibe_ai_message'),
+    path('vibe/<str:vibe_slug>/ai/message/stream/', ai_message_stream_view, name='vibe_ai_message_stream'),
     path('vibe/<str:vibe_slug>/ai/clear-conversation/', views_ai.vibe_ai_clear_conversation, name='vibe_ai_clear_conversation'),
     path('vibe/<str:vibe_slug>/ai/file/', views_ai.vibe_ai_file_operation, name='vibe_ai_file_operation'),
+    path('vibe/<str:vibe_slug>/ai/files/', views_ai.vibe_ai_batch_file_operation, name='vibe_ai_batch_file_operation'),
     path('vibe/<str:vibe_slug>/ai/create-file/', views_ai.vibe_ai_create_file, name='vibe_ai_create_file'),
     path('vibe/<str:vibe_slug>/enable-custom-html/', views_ai.enable_custom_html, name='enable_custom_html'),
 
@@ -29,6 +44,7 @@ urlpatterns = [
     path('vibe/<str:vibe_slug>/generate-image/', views_image.generate_image_view, name='vibe_generate_image'),
     path('my-images/', views_image.user_images, name='user_images'),
     path('image-generator/', views_image.image_generator, name='image_generator'),
+    path('jobs/<int:job_id>/', views_image.job_status, name='job_status'),
 
     # Debug URLs
     path('debug/', views.debug_context, name='debug_context'),
@@ -1,5 +1,4 @@
 import os
-import requests
 import json
 import uuid
 import re
@@ -9,6 +8,8 @@ from django.core.files.base import ContentFile
 from PIL import Image
 from io import BytesIO
 
+from .http_utils import get_session
+
 def validate_image(image_file):
     """
     Validate image file size and type
@@ -88,7 +89,7 @@ def upload_to_ipfs(image_file, filename=None):
             }
 
             # Make the request to Pinata
-            response = requests.post(
+            response = get_session().post(
                 url,
                 headers=headers,
                 files=files
@@ -109,7 +110,7 @@ def upload_to_ipfs(image_file, filename=None):
                         "pinata_secret_api_key": settings.PINATA_SECRET_API_KEY
                     }
 
-                    response = requests.post(
+                    response = get_session().post(
                         url,
                         headers=headers,
                         files=files
@@ -193,7 +194,7 @@ def delete_from_ipfs(ipfs_url):
         }
 
         print(f"Sending DELETE request to Pinata API: {url}")
-        response = requests.delete(url, headers=headers)
+        response = get_session().delete(url, headers=headers)
 
         # If JWT fails, try with API key and secret
         if response.status_code != 200:
@@ -202,7 +203,7 @@ def delete_from_ipfs(ipfs_url):
                 "pinata_api_key": settings.PINATA_API_KEY,
                 "pinata_secret_api_key": settings.PINATA_SECRET_API_KEY
             }
-            response = requests.delete(url, headers=headers)
+            response = get_session().delete(url, headers=headers)
 
         print(f"Pinata API response status: {response.status_code}")
         print(f"Pinata API response body: {response.text}")
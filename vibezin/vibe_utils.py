@@ -1,5 +1,11 @@
 """
 Utility functions for managing vibe directories and content.
+
+A vibe's metadata (title, description, dates, owner) and content (tagline,
+elements, colors...) live in its database row. The content is read through
+a cache, so serving a vibe never reads it from disk. metadata.json and
+content.json are only written to the vibe directory as an export, when
+VIBE_EXPORT_JSON_FILES is on or by the export_vibe_files command.
 """
 import os
 import json
@@ -9,11 +15,34 @@ from pathlib import Path
 from typing import Dict, List, Any, Optional, Union
 from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import transaction
 from .models import Vibe
 from .ai_conversation import generate_vibe_content
+from .render_utils import invalidate_vibe_page
+from .file_index_utils import forget_file_index, write_indexed_text
 
 logger = logging.getLogger(__name__)
 
+# Cache alias used for vibe content (see CACHES in settings)
+VIBE_CONTENT_CACHE_ALIAS = getattr(settings, 'VIBE_CONTENT_CACHE_ALIAS', 'default')
+
+# How long cached content is kept, in case a change bypasses the signals (seconds)
+VIBE_CONTENT_TTL = getattr(settings, 'VIBE_CONTENT_TTL', 3600)
+
+# Whether metadata.json and content.json are kept up to date in vibe directories
+VIBE_EXPORT_JSON_FILES = getattr(settings, 'VIBE_EXPORT_JSON_FILES', False)
+
+
+def _get_cache():
+    """Get the cache backend used for vibe content."""
+    return caches[VIBE_CONTENT_CACHE_ALIAS]
+
+
+def _content_key(vibe_id: int) -> str:
+    return f"vibe_content:{vibe_id}"
+
+
 def get_vibe_directory(vibe_slug: str) -> Path:
     """
     Get the directory path for a vibe.
@@ -39,20 +68,15 @@ def ensure_vibe_directory_exists(vibe_slug: str) -> Path:
     """
     vibe_dir = get_vibe_directory(vibe_slug)
 
-    # Create the parent directory if it doesn't exist
-    if not settings.VIBE_CONTENT_DIR.exists():
-        settings.VIBE_CONTENT_DIR.mkdir(parents=True, exist_ok=True)
-
-    # Create the vibe directory if it doesn't exist
-    if not vibe_dir.exists():
-        vibe_dir.mkdir(parents=True, exist_ok=True)
+    # Create the vibe directory (and the parent directory) if it doesn't exist
+    vibe_dir.mkdir(parents=True, exist_ok=True)
 
     return vibe_dir
 
 
 def create_vibe_directory(vibe: Vibe) -> Dict[str, Any]:
     """
-    Create a directory for a vibe and initialize it with default files.
+    Create a directory for a vibe and initialize the vibe's content.
 
     Args:
         vibe: The Vibe object
@@ -66,9 +90,13 @@ def create_vibe_directory(vibe: Vibe) -> Dict[str, Any]:
 
         vibe_dir = ensure_vibe_directory_exists(vibe.slug)
 
-        # Create default files
-        create_vibe_metadata_file(vibe)
-        create_vibe_content_file(vibe)
+        # Create the content, unless the vibe already has some
+        result = get_vibe_content(vibe)
+        if not result["success"]:
+            return result
+
+        if VIBE_EXPORT_JSON_FILES:
+            export_vibe_files(vibe)
 
         return {
             "success": True,
@@ -96,8 +124,12 @@ def delete_vibe_directory(vibe: Vibe) -> Dict[str, Any]:
 
         vibe_dir = get_vibe_directory(vibe.slug)
 
+        # Drop the compiled page along with the files it was built from
+        invalidate_vibe_page(vibe.slug)
+
         if vibe_dir.exists():
             shutil.rmtree(vibe_dir)
+            forget_file_index(vibe_dir)
             return {"success": True, "message": f"Vibe directory deleted: {vibe_dir}"}
         else:
             return {"success": True, "message": f"Vibe directory does not exist: {vibe_dir}"}
@@ -106,9 +138,31 @@ def delete_vibe_directory(vibe: Vibe) -> Dict[str, Any]:
         return {"success": False, "message": f"Error deleting vibe directory: {str(e)}"}
 
 
+def get_vibe_metadata(vibe: Vibe) -> Dict[str, Any]:
+    """
+    Get the metadata of a vibe, as exported to metadata.json.
+
+    Args:
+        vibe: The Vibe object
+
+    Returns:
+        Dictionary with the vibe's metadata
+    """
+    return {
+        "id": vibe.id,
+        "title": vibe.title,
+        "slug": vibe.slug,
+        "description": vibe.description,
+        "created_at": vibe.created_at.isoformat(),
+        "updated_at": vibe.updated_at.isoformat(),
+        "user_id": vibe.user.id if vibe.user else None,
+        "username": vibe.user.username if vibe.user else None
+    }
+
+
 def create_vibe_metadata_file(vibe: Vibe) -> Dict[str, Any]:
     """
-    Create a metadata file for a vibe.
+    Export the metadata of a vibe to metadata.json in its directory.
 
     Args:
         vibe: The Vibe object
@@ -123,19 +177,9 @@ def create_vibe_metadata_file(vibe: Vibe) -> Dict[str, Any]:
         vibe_dir = ensure_vibe_directory_exists(vibe.slug)
         metadata_path = vibe_dir / "metadata.json"
 
-        metadata = {
-            "id": vibe.id,
-            "title": vibe.title,
-            "slug": vibe.slug,
-            "description": vibe.description,
-            "created_at": vibe.created_at.isoformat(),
-            "updated_at": vibe.updated_at.isoformat(),
-            "user_id": vibe.user.id if vibe.user else None,
-            "username": vibe.user.username if vibe.user else None
-        }
-
-        with open(metadata_path, 'w') as f:
-            json.dump(metadata, f, indent=2)
+        # Replace the file instead of writing into it: readers never see a
+        # partial file, and the file may be a hard link into the blob store
+        write_indexed_text(metadata_path.parent, metadata_path.name, json.dumps(get_vibe_metadata(vibe), indent=2))
 
         return {
             "success": True,
@@ -149,7 +193,7 @@ def create_vibe_metadata_file(vibe: Vibe) -> Dict[str, Any]:
 
 def create_vibe_content_file(vibe: Vibe) -> Dict[str, Any]:
     """
-    Create a content file for a vibe, potentially using AI to generate content.
+    Export the content of a vibe to content.json in its directory.
 
     Args:
         vibe: The Vibe object
@@ -161,31 +205,16 @@ def create_vibe_content_file(vibe: Vibe) -> Dict[str, Any]:
         if not vibe.slug:
             return {"success": False, "message": "Vibe has no slug"}
 
+        result = get_vibe_content(vibe)
+        if not result["success"]:
+            return result
+
         vibe_dir = ensure_vibe_directory_exists(vibe.slug)
         content_path = vibe_dir / "content.json"
 
-        # Default content structure
-        content = {
-            "tagline": "",
-            "elements": [],
-            "color_palette": [],
-            "essence": "",
-            "ai_generated": False
-        }
-
-        # Try to generate content with AI if user has an API key
-        if vibe.user and hasattr(vibe.user, 'profile') and vibe.user.profile.chatgpt_api_key:
-            try:
-                ai_result = generate_vibe_content(vibe.user, vibe.title, vibe.description)
-                if ai_result.get("success", False):
-                    content["ai_generated"] = True
-                    content["ai_raw_content"] = ai_result.get("content", "")
-                    # We'll parse the AI content in a more sophisticated way in a real implementation
-            except Exception as ai_error:
-                logger.error(f"Error generating AI content for {vibe.slug}: {str(ai_error)}")
-
-        with open(content_path, 'w') as f:
-            json.dump(content, f, indent=2)
+        # Replace the file instead of writing into it: readers never see a
+        # partial file, and the file may be a hard link into the blob store
+        write_indexed_text(content_path.parent, content_path.name, json.dumps(result["content"], indent=2))
 
         return {
             "success": True,
@@ -197,6 +226,113 @@ def create_vibe_content_file(vibe: Vibe) -> Dict[str, Any]:
         return {"success": False, "message": f"Error creating content file: {str(e)}"}
 
 
+def export_vibe_files(vibe: Vibe) -> Dict[str, Any]:
+    """
+    Export the metadata and content of a vibe to metadata.json and
+    content.json in its directory.
+
+    Args:
+        vibe: The Vibe object
+
+    Returns:
+        Dictionary with status and message
+    """
+    for result in (create_vibe_metadata_file(vibe), create_vibe_content_file(vibe)):
+        if not result["success"]:
+            return result
+
+    return {"success": True, "message": f"Exported metadata and content of {vibe.slug}"}
+
+
+def build_vibe_content(vibe: Vibe) -> Dict[str, Any]:
+    """
+    Build the initial content of a vibe, using AI to generate it if the user
+    has an API key.
+
+    Args:
+        vibe: The Vibe object
+
+    Returns:
+        The content
+    """
+    # Default content structure
+    content = {
+        "tagline": "",
+        "elements": [],
+        "color_palette": [],
+        "essence": "",
+        "ai_generated": False
+    }
+
+    # Try to generate content with AI if user has an API key
+    if vibe.user and hasattr(vibe.user, 'profile') and vibe.user.profile.chatgpt_api_key:
+        try:
+            ai_result = generate_vibe_content(vibe.user, vibe.title, vibe.description)
+            if ai_result.get("success", False):
+                content["ai_generated"] = True
+                content["ai_raw_content"] = ai_result.get("content", "")
+                # We'll parse the AI content in a more sophisticated way in a real implementation
+        except Exception as ai_error:
+            logger.error(f"Error generating AI content for {vibe.slug}: {str(ai_error)}")
+
+    return content
+
+
+def _read_legacy_content(vibe: Vibe) -> Optional[Dict[str, Any]]:
+    """Read the content of a vibe created before content was stored in the database."""
+    content_path = get_vibe_directory(vibe.slug) / "content.json"
+    try:
+        with open(content_path, 'r') as f:
+            content = json.load(f)
+    except FileNotFoundError:
+        return None
+    except ValueError as e:
+        logger.warning(f"Invalid legacy content.json for {vibe.slug}, ignoring it: {str(e)}")
+        return None
+    return content if isinstance(content, dict) and content else None
+
+
+def set_vibe_content(vibe: Vibe, content: Dict[str, Any], export: bool = True) -> None:
+    """
+    Store the content of a vibe.
+
+    Args:
+        vibe: The Vibe object
+        content: The content
+        export: Whether to also write content.json if VIBE_EXPORT_JSON_FILES is on
+    """
+    # Only the content column is written, so other changes to the vibe
+    # (and its updated_at) are left to Vibe.save
+    vibe_id = vibe.pk
+    Vibe.objects.filter(pk=vibe_id).update(content=content)
+    vibe.content = content
+    transaction.on_commit(lambda: invalidate_vibe_content(vibe_id))
+
+    # The compiled page shows the content, and search indexes it
+    invalidate_vibe_page(vibe.slug)
+    from .search_utils import update_vibe_search
+    update_vibe_search(vibe, title=False, content=True)
+
+    if export and VIBE_EXPORT_JSON_FILES:
+        create_vibe_content_file(vibe)
+
+
+def invalidate_vibe_content(vibe_id: Optional[int]) -> None:
+    """
+    Drop the cached content of a vibe, so the next read loads it from the database.
+
+    Args:
+        vibe_id: The id of the vibe
+    """
+    if not vibe_id:
+        return
+
+    try:
+        _get_cache().delete(_content_key(vibe_id))
+    except Exception as e:
+        logger.exception(f"Error invalidating content of vibe {vibe_id}: {str(e)}")
+
+
 def ensure_all_vibe_directories_exist() -> Dict[str, Any]:
     """
     Check all vibes in the database and create directories for any that don't have them.
@@ -240,39 +376,46 @@ def ensure_all_vibe_directories_exist() -> Dict[str, Any]:
         return {"success": False, "message": f"Error ensuring all vibe directories exist: {str(e)}"}
 
 
-def get_vibe_content(vibe: Vibe) -> Dict[str, Any]:
+def get_vibe_content(vibe: Vibe, create: bool = True) -> Dict[str, Any]:
     """
     Get the content for a vibe.
 
+    The content comes from the vibe's row if it was loaded with the vibe,
+    otherwise from the cache, loading it from the database on a miss. A vibe
+    without content gets the content of its legacy content.json, or new
+    content.
+
     Args:
         vibe: The Vibe object
+        create: Whether to create content for a vibe without any
 
     Returns:
         Dictionary with vibe content or error message
     """
     try:
-        if not vibe.slug:
-            return {"success": False, "message": "Vibe has no slug"}
-
-        vibe_dir = get_vibe_directory(vibe.slug)
-
-        # Check if the vibe directory exists, create it if it doesn't
-        if not vibe_dir.exists():
-            logger.info(f"Vibe directory doesn't exist for {vibe.slug}, creating it now")
-            result = create_vibe_directory(vibe)
-            if not result["success"]:
-                return result
-
-        content_path = vibe_dir / "content.json"
-
-        if not content_path.exists():
-            # Create the content file if it doesn't exist
-            result = create_vibe_content_file(vibe)
-            if not result["success"]:
-                return result
+        if not vibe.pk:
+            return {"success": False, "message": "Vibe has not been saved"}
 
-        with open(content_path, 'r') as f:
-            content = json.load(f)
+        if 'content' not in vibe.get_deferred_fields():
+            content = vibe.content
+        else:
+            cache = _get_cache()
+            key = _content_key(vibe.pk)
+            content = cache.get(key)
+            if content is None:
+                content = Vibe.objects.filter(pk=vibe.pk).values_list('content', flat=True).first() or {}
+                if content:
+                    cache.set(key, content, VIBE_CONTENT_TTL)
+
+        if not content:
+            content = _read_legacy_content(vibe)
+            if content is not None:
+                logger.info(f"Moving content.json of {vibe.slug} into the database")
+            elif create:
+                content = build_vibe_content(vibe)
+            else:
+                return {"success": True, "content": {}}
+            set_vibe_content(vibe, content, export=False)
 
         return {
             "success": True,
@@ -1,16 +1,24 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import HttpResponse, Http404, HttpResponseForbidden, JsonResponse
+from django.http import HttpResponse, Http404, HttpResponseForbidden, JsonResponse, FileResponse
 from django.urls import reverse
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
 from django.contrib import messages
 from django.conf import settings
-from django.views.decorators.http import require_POST
+from django.views.decorators.http import require_POST, require_safe
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+import os
 import json
 from .models import Vibe, UserProfile
 from .forms import VibeForm, UsernameForm, ProfileForm
 from .utils import validate_image, optimize_image, upload_to_ipfs, delete_from_ipfs
 from .vibe_utils import get_vibe_content, ensure_vibe_directory_exists
+from .render_utils import get_cached_vibe_page, build_vibe_page, get_vibe_file_meta
+from .compression_utils import choose_encoding
+from .feed_utils import get_feed_page, get_feed_queryset, serialize_feed_vibe
+from .profile_utils import get_profile_summary
+from .search_utils import search_vibes
 
 @login_required
 @require_POST
@@ -135,14 +143,56 @@ def index(request):
     if not request.user.is_authenticated:
         return render(request, 'vibezin/landing.html')
 
-    # Show vibes feed for authenticated users
-    vibes = Vibe.objects.all().order_by('-created_at')
+    # Show the first page of the vibes feed for authenticated users; the
+    # rest is loaded from vibe_feed as the user scrolls
+    page = get_feed_page()
     context = {
-        'vibes': vibes,
+        'vibes': page['vibes'],
+        'next_cursor': page['next_cursor'],
         'title': 'Your Vibe Feed'
     }
     return render(request, 'vibezin/index.html', context)
 
+@require_safe
+def vibe_feed(request):
+    """JSON endpoint for the next page of the vibes feed (infinite scroll)"""
+    # The feed can be limited to one user's vibes (e.g. on a profile page)
+    queryset = get_feed_queryset()
+    if request.GET.get('user'):
+        queryset = queryset.filter(user__username=request.GET['user'])
+
+    try:
+        page_size = int(request.GET['limit']) if request.GET.get('limit') else None
+        page = get_feed_page(request.GET.get('cursor'), page_size, queryset)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+
+    return JsonResponse({
+        'success': True,
+        'vibes': [serialize_feed_vibe(vibe, request.user) for vibe in page['vibes']],
+        'next_cursor': page['next_cursor']
+    })
+
+@require_safe
+def vibe_search(request):
+    """JSON endpoint for searching vibes, best match first"""
+    query = request.GET.get('q', '').strip()
+
+    try:
+        page = int(request.GET.get('page') or 1)
+        page_size = int(request.GET['limit']) if request.GET.get('limit') else None
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Invalid page or limit'}, status=400)
+
+    results = search_vibes(query, page, page_size)
+
+    return JsonResponse({
+        'success': True,
+        'query': query,
+        'vibes': [serialize_feed_vibe(vibe, request.user) for vibe in results['vibes']],
+        'next_page': results['next_page']
+    })
+
 @login_required
 def add_vibe(request):
     if request.method == 'POST':
@@ -193,112 +243,120 @@ def vibe_detail(request, vibe_id):
     }
     return render(request, 'vibezin/vibe_detail.html', context)
 
+def _conditional_response(request, fingerprint, last_modified, build_response, encodings=()):
+    """
+    Answer a request with validators, short-circuiting to 304 when the client's copy is current.
+
+    Args:
+        request: The HTTP request
+        fingerprint: Content fingerprint used as a strong ETag
+        last_modified: Modification time as a timestamp (or None)
+        build_response: Callable taking the chosen encoding (or None) that
+            builds the full response when needed
+        encodings: Encodings with a precompressed variant available
+    """
+    encoding = choose_encoding(request.headers.get('Accept-Encoding', ''), encodings)
+
+    # Each encoding is a different representation, so it gets its own ETag
+    etag = f'"{fingerprint}-{encoding}"' if encoding else f'"{fingerprint}"'
+    last_modified = int(last_modified) if last_modified else None
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = build_response(encoding)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+
+    response.headers['ETag'] = etag
+    if last_modified:
+        response.headers['Last-Modified'] = http_date(last_modified)
+
+    # Let browsers and the CDN keep a copy, but always revalidate it so
+    # edits from the AI builder show up immediately
+    patch_cache_control(response, no_cache=True)
+    if encodings:
+        patch_vary_headers(response, ['Accept-Encoding'])
+    return response
+
+def _vibe_page_response(request, page):
+    """Serve a compiled vibe page, using a precompressed variant when the client accepts one."""
+    return _conditional_response(
+        request, page['fingerprint'], page['last_modified'],
+        lambda encoding: HttpResponse(page['variants'][encoding] if encoding else page['html']),
+        page['variants']
+    )
+
 def vibe_detail_by_slug(request, vibe_slug):
     """View a vibe by its slug"""
-    vibe = get_object_or_404(Vibe, slug=vibe_slug)
-
-    # Ensure the vibe directory exists
-    ensure_vibe_directory_exists(vibe.slug)
-
-    # Get the vibe content from the directory
-    content_result = get_vibe_content(vibe)
-    vibe_content = content_result.get('content', {}) if content_result.get('success', False) else {}
-
-    # Check if the vibe has custom HTML, CSS, or JS files
-    from .file_utils import VibeFileManager
-    file_manager = VibeFileManager(vibe)
-    files = file_manager.list_files()
-
-    # Look for custom HTML file (index.html or vibe.html)
-    custom_html = None
-    custom_css = None
-    custom_js = None
-
-    for file in files:
-        if file['name'] in ['index.html', 'vibe.html']:
-            custom_html = file_manager.read_file(file['name'])
-            if custom_html.get('success', False):
-                custom_html = custom_html.get('content', '')
-        elif file['name'].endswith('.css'):
-            custom_css = file_manager.read_file(file['name'])
-            if custom_css.get('success', False):
-                custom_css = custom_css.get('content', '')
-        elif file['name'].endswith('.js'):
-            custom_js = file_manager.read_file(file['name'])
-            if custom_js.get('success', False):
-                custom_js = custom_js.get('content', '')
-
-    # If we have custom HTML, use it instead of the template
-    # Check if we're in the AI builder preview mode
-    is_preview = request.GET.get('preview', 'false').lower() == 'true'
+    # Public vibe pages are read far more often than they are written, so the
+    # assembled page comes from the compiled page cache whenever possible
+    page = get_cached_vibe_page(vibe_slug)
+    if page is not None and page['html'] is not None:
+        return _vibe_page_response(request, page)
+
+    # The content is read through its own cache (see vibe_utils.get_vibe_content)
+    vibe = get_object_or_404(Vibe.objects.select_related('user').defer('content'), slug=vibe_slug)
+
+    # Compile the page from the vibe directory on a cache miss
+    if page is None:
+        page = build_vibe_page(vibe)
 
     # ALWAYS use custom HTML if it exists, regardless of the flag
     # This ensures the preview always shows the custom HTML
-    if custom_html:
-        from django.http import HttpResponse
-
-        # Log for debugging
-        print(f"Using custom HTML for vibe: {vibe.slug}, has_custom_html: {vibe.has_custom_html}, is_preview: {is_preview}")
-
-        # Replace placeholders in the HTML with actual content
-        html = custom_html
-
-        # Add the custom CSS if available
-        if custom_css:
-            if '<style>' not in html:
-                html = html.replace('</head>', f'<style>{custom_css}</style></head>')
-            elif '</head>' not in html:
-                # If there's no </head> tag, add the style at the beginning
-                html = f'<style>{custom_css}</style>\n{html}'
-
-        # Add the custom JS if available
-        if custom_js:
-            if '<script>' not in html:
-                if '</body>' in html:
-                    html = html.replace('</body>', f'<script>{custom_js}</script></body>')
-                else:
-                    # If there's no </body> tag, add the script at the end
-                    html = f'{html}\n<script>{custom_js}</script>'
-
-        # If the vibe doesn't have the custom HTML flag set,
-        # set it now to ensure future views work correctly
-        if not vibe.has_custom_html:
-            vibe.has_custom_html = True
-            if custom_css:
-                vibe.has_custom_css = True
-            if custom_js:
-                vibe.has_custom_js = True
-            vibe.save()
-            print(f"Updated custom flags for vibe: {vibe.slug} - HTML: {vibe.has_custom_html}, CSS: {vibe.has_custom_css}, JS: {vibe.has_custom_js}")
-
-        return HttpResponse(html)
+    if page['html'] is not None:
+        return _vibe_page_response(request, page)
 
     # Otherwise, use the standard template
+    vibe_content = page['vibe_content']
     context = {
         'vibe': vibe,
         'title': vibe.title,
         'vibe_content': vibe_content,
         'ai_generated': vibe_content.get('ai_generated', False),
-        'custom_css': custom_css if vibe.has_custom_css else None,
-        'custom_js': custom_js if vibe.has_custom_js else None
+        'custom_css': page['custom_css'] if vibe.has_custom_css else None,
+        'custom_js': page['custom_js'] if vibe.has_custom_js else None
     }
     return render(request, 'vibezin/vibe_detail.html', context)
 
+@require_safe
+def vibe_static_file(request, vibe_slug, filename):
+    """
+    Serve a file from a vibe directory with ETag/Last-Modified validators.
+
+    Only reached when Django itself serves /static/vibes/ (the development
+    server's static handler takes precedence when DEBUG is on).
+    """
+    meta = get_vibe_file_meta(vibe_slug, filename)
+    if meta is None:
+        raise Http404("File does not exist")
+
+    def build_response(encoding):
+        path = meta['variants'][encoding] if encoding else meta['path']
+        try:
+            return FileResponse(
+                open(path, 'rb'),
+                content_type=meta['content_type'],
+                filename=os.path.basename(meta['path'])
+            )
+        except FileNotFoundError:
+            raise Http404("File does not exist")
+
+    return _conditional_response(
+        request, meta['fingerprint'], meta['last_modified'], build_response, meta['variants']
+    )
+
 @login_required
 def profile(request):
     """View for the current user's profile"""
-    # Check if user has a profile, create one if not
-    try:
-        user_profile = request.user.profile
-    except UserProfile.DoesNotExist:
-        # Create a profile for this user
-        user_profile = UserProfile.objects.create(user=request.user)
+    summary, created = get_profile_summary(request.user.username, request.user)
+    if created:
         messages.info(request, "We've created a new profile for you. Please update your information.")
 
-    user_vibes = Vibe.objects.filter(user=request.user).order_by('-created_at')
     context = {
-        'profile': user_profile,
-        'vibes': user_vibes,
+        'profile': summary['profile'],
+        'vibes': summary['vibes'],
+        'vibe_count': summary['vibe_count'],
+        'next_cursor': summary['next_cursor'],
         'title': f"{request.user.username}'s Profile",
         'is_owner': True
     }
@@ -306,31 +364,22 @@ def profile(request):
 
 def user_profile(request, username):
     """View for any user's profile"""
-    try:
-        user = User.objects.get(username=username)
-    except User.DoesNotExist:
-        raise Http404("User does not exist")
-
     # If user is trying to access their own profile, redirect to the profile view
     # This ensures all profile edits go through the proper edit_profile view
     if request.user.is_authenticated and request.user.username == username:
         return redirect('vibezin:profile')
 
-    # Check if user has a profile, create one if not
-    try:
-        user_profile = user.profile
-    except UserProfile.DoesNotExist:
-        # Create a profile for this user
-        user_profile = UserProfile.objects.create(user=user)
-        if request.user == user:
-            messages.info(request, "We've created a new profile for you. Please update your information.")
+    summary, created = get_profile_summary(username)
+    if summary is None:
+        raise Http404("User does not exist")
 
-    user_vibes = Vibe.objects.filter(user=user).order_by('-created_at')
     context = {
-        'profile': user_profile,
-        'vibes': user_vibes,
-        'title': f"{user.username}'s Profile",
-        'is_owner': request.user == user if request.user.is_authenticated else False
+        'profile': summary['profile'],
+        'vibes': summary['vibes'],
+        'vibe_count': summary['vibe_count'],
+        'next_cursor': summary['next_cursor'],
+        'title': f"{username}'s Profile",
+        'is_owner': False
     }
     return render(request, 'vibezin/profile.html', context)
 
@@ -2,21 +2,25 @@
 Views for AI-related functionality.
 """
 import json
-import os
 import logging
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import JsonResponse, HttpResponseForbidden
+from django.http import JsonResponse, HttpResponseForbidden, StreamingHttpResponse
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.http import require_POST
 from django.views.decorators.csrf import ensure_csrf_cookie
+from django.conf import settings
 from django.contrib import messages
-from django.utils import timezone
+from django.db import transaction
 from .models import Vibe, VibeConversationHistory
 from .ai_conversation import VibeConversation
 from .file_utils import VibeFileManager
 
 logger = logging.getLogger(__name__)
 
+# Maximum number of operations in one batch file request
+AI_BATCH_MAX_OPERATIONS = getattr(settings, 'AI_BATCH_MAX_OPERATIONS', 50)
+
 @login_required
 @ensure_csrf_cookie
 def vibe_ai_builder(request, vibe_slug):
@@ -46,10 +50,7 @@ def vibe_ai_builder(request, vibe_slug):
     # Get or create a conversation history
     conversation_history = VibeConversationHistory.objects.get_or_create(
         vibe=vibe,
-        user=request.user,
-        defaults={
-            'conversation': []
-        }
+        user=request.user
     )[0]  # Get the object, ignore the created flag
 
     # Get the file manager
@@ -97,9 +98,7 @@ def vibe_ai_clear_conversation(request, vibe_slug):
         )
 
         # Clear the conversation
-        conversation_history.conversation = []
-        conversation_history.message_count = 0
-        conversation_history.save()
+        conversation_history.clear_messages()
 
         logger.info(f"Cleared conversation history for vibe {vibe_slug}")
 
@@ -120,23 +119,18 @@ def vibe_ai_clear_conversation(request, vibe_slug):
             'error': f"Error clearing conversation history: {str(e)}"
         })
 
-@login_required
-@require_POST
-@ensure_csrf_cookie
-def vibe_ai_message(request, vibe_slug):
+
+def _check_ai_access(request, vibe):
     """
-    API endpoint for sending a message to the AI.
+    Check that the user can talk to the AI about a vibe.
 
     Args:
         request: The HTTP request
-        vibe_slug: The slug of the vibe
+        vibe: The Vibe object
 
     Returns:
-        JSON response with the AI's reply
+        An error response, or None if the user has access
     """
-    # Get the vibe
-    vibe = get_object_or_404(Vibe, slug=vibe_slug)
-
     # Check if the user is the owner of the vibe
     if vibe.user != request.user:
         return HttpResponseForbidden("You don't have permission to edit this vibe.")
@@ -165,40 +159,67 @@ def vibe_ai_message(request, vibe_slug):
             'error': "Your OpenAI API key appears to be invalid. It should start with 'sk-'. Please check your profile settings."
         })
 
+    return None
+
+
+def _reset_conversation(request, vibe):
+    """
+    Reset the conversation history for a vibe.
+
+    Args:
+        request: The HTTP request
+        vibe: The Vibe object
+
+    Returns:
+        JSON response with success status
+    """
+    logger.info(f"Resetting conversation for vibe {vibe.slug}")
+    try:
+        # Get the conversation history
+        conversation_history = VibeConversationHistory.objects.get(vibe=vibe, user=request.user)
+        # Reset the conversation
+        conversation_history.clear_messages()
+        logger.info(f"Conversation reset successful for vibe {vibe.slug}")
+        return JsonResponse({
+            'success': True,
+            'message': "Conversation has been reset."
+        })
+    except VibeConversationHistory.DoesNotExist:
+        # If no conversation exists, that's fine - it's effectively reset
+        logger.info(f"No conversation history found to reset for vibe {vibe.slug}")
+        return JsonResponse({
+            'success': True,
+            'message': "No conversation history found to reset."
+        })
+    except Exception as e:
+        logger.exception(f"Error resetting conversation: {str(e)}")
+        return JsonResponse({
+            'success': False,
+            'error': f"Error resetting conversation: {str(e)}"
+        })
+
+
+def _parse_ai_message(request, vibe):
+    """
+    Get the user's message from a request to the AI endpoints.
+
+    Reset requests are handled here as well.
+
+    Args:
+        request: The HTTP request
+        vibe: The Vibe object
+
+    Returns:
+        Tuple of the message and an early response (one of them is None)
+    """
     # Debug info
-    logger.info(f"Received AI message request for vibe: {vibe_slug}")
+    logger.info(f"Received AI message request for vibe: {vibe.slug}")
     logger.info(f"Request method: {request.method}")
     logger.info(f"Request content type: {request.content_type}")
 
     # Check if this is a reset request
-    reset_conversation = request.POST.get('reset', '').lower() == 'true'
-    if reset_conversation:
-        logger.info(f"Resetting conversation for vibe {vibe_slug}")
-        try:
-            # Get the conversation history
-            conversation_history = VibeConversationHistory.objects.get(vibe=vibe, user=request.user)
-            # Reset the conversation
-            conversation_history.conversation = []
-            conversation_history.message_count = 0
-            conversation_history.save()
-            logger.info(f"Conversation reset successful for vibe {vibe_slug}")
-            return JsonResponse({
-                'success': True,
-                'message': "Conversation has been reset."
-            })
-        except VibeConversationHistory.DoesNotExist:
-            # If no conversation exists, that's fine - it's effectively reset
-            logger.info(f"No conversation history found to reset for vibe {vibe_slug}")
-            return JsonResponse({
-                'success': True,
-                'message': "No conversation history found to reset."
-            })
-        except Exception as e:
-            logger.exception(f"Error resetting conversation: {str(e)}")
-            return JsonResponse({
-                'success': False,
-                'error': f"Error resetting conversation: {str(e)}"
-            })
+    if request.POST.get('reset', '').lower() == 'true':
+        return None, _reset_conversation(request, vibe)
 
     # Get the message from the request
     try:
@@ -219,36 +240,10 @@ def vibe_ai_message(request, vibe_slug):
                     data = json.loads(body)
 
                 message = data.get('message', '').strip()
-                reset_conversation = data.get('reset', '').lower() == 'true'
 
                 # Check for reset request from JSON data
-                if reset_conversation:
-                    logger.info(f"Resetting conversation for vibe {vibe_slug} (from JSON)")
-                    try:
-                        # Get the conversation history
-                        conversation_history = VibeConversationHistory.objects.get(vibe=vibe, user=request.user)
-                        # Reset the conversation
-                        conversation_history.conversation = []
-                        conversation_history.message_count = 0
-                        conversation_history.save()
-                        logger.info(f"Conversation reset successful for vibe {vibe_slug}")
-                        return JsonResponse({
-                            'success': True,
-                            'message': "Conversation has been reset."
-                        })
-                    except VibeConversationHistory.DoesNotExist:
-                        # If no conversation exists, that's fine - it's effectively reset
-                        logger.info(f"No conversation history found to reset for vibe {vibe_slug}")
-                        return JsonResponse({
-                            'success': True,
-                            'message': "No conversation history found to reset."
-                        })
-                    except Exception as e:
-                        logger.exception(f"Error resetting conversation: {str(e)}")
-                        return JsonResponse({
-                            'success': False,
-                            'error': f"Error resetting conversation: {str(e)}"
-                        })
+                if data.get('reset', '').lower() == 'true':
+                    return None, _reset_conversation(request, vibe)
 
                 logger.info(f"Parsed message from JSON: {message}")
             except json.JSONDecodeError as e:
@@ -260,24 +255,36 @@ def vibe_ai_message(request, vibe_slug):
 
         if not message:
             logger.warning("Empty message received")
-            return JsonResponse({
+            return None, JsonResponse({
                 'success': False,
                 'error': "Message cannot be empty."
             })
     except Exception as e:
         logger.exception(f"Error parsing message: {str(e)}")
-        return JsonResponse({
+        return None, JsonResponse({
             'success': False,
             'error': f"Error parsing message: {str(e)}"
         })
 
+    return message, None
+
+
+def _start_conversation(request, vibe, message):
+    """
+    Record the user's message and load the conversation for the AI.
+
+    Args:
+        request: The HTTP request
+        vibe: The Vibe object
+        message: The user's message
+
+    Returns:
+        Tuple of the VibeConversationHistory and the VibeConversation
+    """
     # Get or create a conversation history
     conversation_history = VibeConversationHistory.objects.get_or_create(
         vibe=vibe,
-        user=request.user,
-        defaults={
-            'conversation': []
-        }
+        user=request.user
     )[0]  # Get the object, ignore the created flag
 
     # Add the user's message to the conversation history
@@ -285,67 +292,249 @@ def vibe_ai_message(request, vibe_slug):
     logger.info(f"Added user message to conversation history: {message[:50]}...")
 
     # Create a conversation object
-    try:
-        logger.info(f"Creating conversation object for user {request.user.username} and vibe {vibe.id}")
-        conversation = VibeConversation(request.user, vibe.id)
+    logger.info(f"Creating conversation object for user {request.user.username} and vibe {vibe.id}")
+    conversation = VibeConversation(request.user, vibe.id)
+
+    # Clean the conversation history to ensure it's valid for the OpenAI API
+    logger.info("Cleaning conversation history to ensure it's valid for the OpenAI API")
+    was_cleaned = conversation_history.clean_conversation_history()
+    if was_cleaned:
+        logger.info("Conversation history was cleaned")
+
+    # Load the conversation history
+    logger.info(f"Loading conversation history with {len(conversation_history.conversation)} messages")
+
+    # Track tool_call_ids to ensure proper sequencing
+    tool_call_ids_processed = set()
+
+    # Add the messages in order. Tool messages have to follow the assistant
+    # message that made the call, so keep its tool_calls.
+    for i, msg in enumerate(conversation_history.conversation):
+        if msg['role'] == 'system':
+            continue
+
+        if msg['role'] != 'tool':
+            logger.info(f"Adding message {i} to conversation: role={msg['role']}, content_length={len(msg['content'])}")
+
+            # Track assistant messages with tool_calls
+            if msg['role'] == 'assistant' and msg.get('tool_calls'):
+                conversation.add_message(msg['role'], msg['content'], tool_calls=msg['tool_calls'])
+                for tool_call in msg['tool_calls']:
+                    if 'id' in tool_call:
+                        tool_call_ids_processed.add(tool_call['id'])
+            else:
+                conversation.add_message(msg['role'], msg['content'])
+            continue
+
+        # Tool messages need special handling with tool_call_id and name
+        if 'tool_call_id' in msg and 'name' in msg:
+            # Only add tool messages that correspond to tool_calls we've processed
+            if msg['tool_call_id'] in tool_call_ids_processed:
+                conversation.add_message(
+                    msg['role'],
+                    msg['content'],
+                    tool_call_id=msg['tool_call_id'],
+                    name=msg['name']
+                )
+                logger.info(f"Added tool message with tool_call_id: {msg['tool_call_id']}")
+            else:
+                logger.warning(f"Skipping tool message with tool_call_id {msg['tool_call_id']} as it doesn't match any processed tool calls")
+        else:
+            # Skip invalid tool messages
+            logger.warning(f"Skipping invalid tool message without tool_call_id or name: {msg}")
 
-        # Clean the conversation history to ensure it's valid for the OpenAI API
-        logger.info("Cleaning conversation history to ensure it's valid for the OpenAI API")
-        was_cleaned = conversation_history.clean_conversation_history()
-        if was_cleaned:
-            logger.info("Conversation history was cleaned")
+    return conversation_history, conversation
 
-        # Load the conversation history
-        logger.info(f"Loading conversation history with {len(conversation_history.conversation)} messages")
 
-        # Track tool_call_ids to ensure proper sequencing
-        tool_call_ids_processed = set()
+def _save_ai_response(conversation_history, response):
+    """
+    Save the AI's response to the conversation history.
 
-        # First pass: add all non-tool messages
-        for i, msg in enumerate(conversation_history.conversation):
-            if msg['role'] != 'system' and msg['role'] != 'tool':  # Skip system and tool messages for now
-                logger.info(f"Adding message {i} to conversation: role={msg['role']}, content_length={len(msg['content'])}")
+    Args:
+        conversation_history: The VibeConversationHistory object
+        response: The result of the O1 reasoning loop
 
-                # Add the message
-                conversation.add_message(msg['role'], msg['content'])
+    Returns:
+        Dictionary to return to the client
+    """
+    # Log the response details
+    logger.info(f"AI response received: success={response.get('success', False)}")
+    if 'iterations' in response:
+        logger.info(f"O1 reasoning loop completed in {response['iterations']} iterations")
+    if 'tool_results' in response:
+        logger.info(f"O1 reasoning loop used {len(response.get('tool_results', []))} tool calls")
+
+    if not response.get('success', False):
+        return {
+            'success': False,
+            'error': response.get('error', "Unknown error")
+        }
 
-                # Track assistant messages with tool_calls
-                if msg['role'] == 'assistant' and 'tool_calls' in msg:
-                    # Track tool_call_ids from this message
-                    for tool_call in msg['tool_calls']:
-                        if 'id' in tool_call:
-                            tool_call_ids_processed.add(tool_call['id'])
-
-        # Second pass: add tool messages in the correct sequence
-        for i, msg in enumerate(conversation_history.conversation):
-            if msg['role'] == 'tool':
-                # Tool messages need special handling with tool_call_id and name
-                if 'tool_call_id' in msg and 'name' in msg:
-                    # Only add tool messages that correspond to tool_calls we've processed
-                    if msg['tool_call_id'] in tool_call_ids_processed:
-                        conversation.add_message(
-                            msg['role'],
-                            msg['content'],
-                            tool_call_id=msg['tool_call_id'],
-                            name=msg['name']
-                        )
-                        logger.info(f"Added tool message with tool_call_id: {msg['tool_call_id']}")
-                    else:
-                        logger.warning(f"Skipping tool message with tool_call_id {msg['tool_call_id']} as it doesn't match any processed tool calls")
+    # Add the AI's response to the conversation history
+    # Note: We store the original content, not the processed content
+    content = response.get('content', '')
+    logger.info(f"Adding AI response to conversation history: content_length={len(content)}")
+
+    # Get the raw response to extract tool_calls if present
+    raw_response = response.get('raw_response', {})
+    tool_calls = []
+
+    # Extract tool_calls from the raw response if available
+    if raw_response and 'choices' in raw_response and len(raw_response['choices']) > 0:
+        message = raw_response['choices'][0].get('message', {})
+        if 'tool_calls' in message:
+            tool_calls = message['tool_calls']
+            logger.info(f"Extracted {len(tool_calls)} tool_calls from raw response")
+
+    # Add the assistant message with tool_calls if present
+    if tool_calls:
+        # Add the assistant message with tool_calls
+        conversation_history.add_message('assistant', content, tool_calls=tool_calls)
+        logger.info(f"Added assistant message with {len(tool_calls)} tool_calls")
+    else:
+        # Add a regular assistant message
+        conversation_history.add_message('assistant', content)
+        logger.info("Added regular assistant message without tool_calls")
+
+    # If there were tool results, add them to the conversation history
+    if 'tool_results' in response and response['tool_results']:
+        logger.info(f"Adding {len(response['tool_results'])} tool results to conversation history")
+        for tool_result in response['tool_results']:
+            # Make sure the tool result has the required fields
+            if 'tool_call_id' in tool_result and 'name' in tool_result and 'content' in tool_result:
+                # Verify this tool_call_id corresponds to a tool_call in the assistant message
+                tool_call_id = tool_result['tool_call_id']
+                found_matching_tool_call = False
+
+                # Check if there's a corresponding tool call in the conversation
+                if tool_calls:
+                    for tool_call in tool_calls:
+                        if tool_call.get('id') == tool_call_id:
+                            found_matching_tool_call = True
+                            break
+
+                if found_matching_tool_call:
+                    logger.info(f"Adding tool result for {tool_result['name']} with ID {tool_call_id}")
+                    conversation_history.add_message(
+                        'tool',
+                        tool_result['content'],
+                        tool_call_id=tool_call_id,
+                        name=tool_result['name']
+                    )
                 else:
-                    # Skip invalid tool messages
-                    logger.warning(f"Skipping invalid tool message without tool_call_id or name: {msg}")
+                    logger.warning(f"Skipping tool result with ID {tool_call_id} as it doesn't match any tool calls")
+            else:
+                logger.warning(f"Skipping invalid tool result: {tool_result}")
+
+    # Log the conversation history after saving
+    logger.info(f"Conversation history now has {len(conversation_history.conversation)} messages")
+    for i, msg in enumerate(conversation_history.conversation[-3:]):  # Log the last 3 messages
+        role = msg['role']
+        content_length = len(msg['content'])
+        extra_info = ""
+        if role == 'tool':
+            extra_info = f", tool_call_id={msg.get('tool_call_id', 'missing')}, name={msg.get('name', 'missing')}"
+        logger.info(f"Last message {i}: role={role}, content_length={content_length}{extra_info}")
+
+    # Return the processed content to the client with O1 reasoning information
+    # This includes the results of any tool calls and information about the reasoning process
+    logger.info(f"Returning processed content to client: content_length={len(response.get('content', ''))}")
+
+    # Include information about the O1 reasoning process in the response
+    result = {
+        'success': True,
+        'message': response.get('content', ''),
+        'o1_reasoning': {
+            'iterations': response.get('iterations', 0),
+            'tool_calls_count': len(response.get('tool_results', [])),
+            'completed': True
+        }
+    }
+
+    logger.info(f"Returning successful response with O1 reasoning info: iterations={result['o1_reasoning']['iterations']}, tool_calls={result['o1_reasoning']['tool_calls_count']}")
+    return result
+
+
+def _sse_event(event, data):
+    """Format a Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@login_required
+@require_POST
+@ensure_csrf_cookie
+def vibe_ai_message(request, vibe_slug):
+    """
+    API endpoint for sending a message to the AI.
+
+    Args:
+        request: The HTTP request
+        vibe_slug: The slug of the vibe
+
+    Returns:
+        JSON response with the AI's reply
+    """
+    # Get the vibe
+    vibe = get_object_or_404(Vibe, slug=vibe_slug)
+
+    error_response = _check_ai_access(request, vibe)
+    if error_response:
+        return error_response
+
+    message, early_response = _parse_ai_message(request, vibe)
+    if early_response:
+        return early_response
+
+    try:
+        conversation_history, conversation = _start_conversation(request, vibe, message)
 
         # Get a response from the AI using the O1 reasoning loop
         logger.info("Getting response from AI using O1 reasoning loop")
         response = conversation.get_response(max_iterations=5)  # Allow up to 5 iterations in the reasoning loop
+    except Exception as e:
+        logger.exception(f"Error in AI conversation: {str(e)}")
+        return JsonResponse({
+            'success': False,
+            'error': f"Error in AI conversation: {str(e)}"
+        })
+
+    return JsonResponse(_save_ai_response(conversation_history, response))
+
+
+@login_required
+@require_POST
+@ensure_csrf_cookie
+def vibe_ai_message_stream(request, vibe_slug):
+    """
+    API endpoint for sending a message to the AI and streaming the reply.
+
+    The reply is sent as Server-Sent Events while the O1 reasoning loop runs:
+    ``token`` events carry content deltas as the model generates them,
+    ``iteration``, ``tool_calls`` and ``tool_result`` events report progress,
+    and a final ``done`` event carries the same payload as vibe_ai_message
+    plus timing information. Errors that happen before the loop starts are
+    returned as JSON, just like vibe_ai_message.
+
+    Args:
+        request: The HTTP request
+        vibe_slug: The slug of the vibe
+
+    Returns:
+        Streaming response with the AI's reply
+    """
+    # Get the vibe
+    vibe = get_object_or_404(Vibe, slug=vibe_slug)
 
-        # Log the response details
-        logger.info(f"AI response received: success={response.get('success', False)}")
-        if 'iterations' in response:
-            logger.info(f"O1 reasoning loop completed in {response['iterations']} iterations")
-        if 'tool_results' in response:
-            logger.info(f"O1 reasoning loop used {len(response.get('tool_results', []))} tool calls")
+    error_response = _check_ai_access(request, vibe)
+    if error_response:
+        return error_response
+
+    message, early_response = _parse_ai_message(request, vibe)
+    if early_response:
+        return early_response
+
+    try:
+        conversation_history, conversation = _start_conversation(request, vibe, message)
     except Exception as e:
         logger.exception(f"Error in AI conversation: {str(e)}")
         return JsonResponse({
@@ -353,107 +542,151 @@ def vibe_ai_message(request, vibe_slug):
             'error': f"Error in AI conversation: {str(e)}"
         })
 
-    if response.get('success', False):
-        # Add the AI's response to the conversation history
-        # Note: We store the original content, not the processed content
-        content = response.get('content', '')
-        logger.info(f"Adding AI response to conversation history: content_length={len(content)}")
-
-        # Get the raw response to extract tool_calls if present
-        raw_response = response.get('raw_response', {})
-        tool_calls = []
-
-        # Extract tool_calls from the raw response if available
-        if raw_response and 'choices' in raw_response and len(raw_response['choices']) > 0:
-            message = raw_response['choices'][0].get('message', {})
-            if 'tool_calls' in message:
-                tool_calls = message['tool_calls']
-                logger.info(f"Extracted {len(tool_calls)} tool_calls from raw response")
-
-        # Add the assistant message with tool_calls if present
-        if tool_calls:
-            # Add the assistant message with tool_calls
-            assistant_message = {
-                "role": "assistant",
-                "content": content,
-                "tool_calls": tool_calls,
-                "timestamp": timezone.now().isoformat()
-            }
-            conversation_history.conversation.append(assistant_message)
-            conversation_history.message_count = len(conversation_history.conversation)
-            logger.info(f"Added assistant message with {len(tool_calls)} tool_calls")
-        else:
-            # Add a regular assistant message
-            conversation_history.add_message('assistant', content)
-            logger.info("Added regular assistant message without tool_calls")
-
-        # If there were tool results, add them to the conversation history
-        if 'tool_results' in response and response['tool_results']:
-            logger.info(f"Adding {len(response['tool_results'])} tool results to conversation history")
-            for tool_result in response['tool_results']:
-                # Make sure the tool result has the required fields
-                if 'tool_call_id' in tool_result and 'name' in tool_result and 'content' in tool_result:
-                    # Verify this tool_call_id corresponds to a tool_call in the assistant message
-                    tool_call_id = tool_result['tool_call_id']
-                    found_matching_tool_call = False
-
-                    # Check if there's a corresponding tool call in the conversation
-                    if tool_calls:
-                        for tool_call in tool_calls:
-                            if tool_call.get('id') == tool_call_id:
-                                found_matching_tool_call = True
-                                break
-
-                    if found_matching_tool_call:
-                        logger.info(f"Adding tool result for {tool_result['name']} with ID {tool_call_id}")
-                        conversation_history.add_message(
-                            'tool',
-                            tool_result['content'],
-                            tool_call_id=tool_call_id,
-                            name=tool_result['name']
-                        )
-                    else:
-                        logger.warning(f"Skipping tool result with ID {tool_call_id} as it doesn't match any tool calls")
-                else:
-                    logger.warning(f"Skipping invalid tool result: {tool_result}")
-
-        # Save the conversation history
-        logger.info("Saving conversation history")
-        conversation_history.save()
-
-        # Log the conversation history after saving
-        logger.info(f"Conversation history now has {len(conversation_history.conversation)} messages")
-        for i, msg in enumerate(conversation_history.conversation[-3:]):  # Log the last 3 messages
-            role = msg['role']
-            content_length = len(msg['content'])
-            extra_info = ""
-            if role == 'tool':
-                extra_info = f", tool_call_id={msg.get('tool_call_id', 'missing')}, name={msg.get('name', 'missing')}"
-            logger.info(f"Last message {i}: role={role}, content_length={content_length}{extra_info}")
-
-        # Return the processed content to the client with O1 reasoning information
-        # This includes the results of any tool calls and information about the reasoning process
-        logger.info(f"Returning processed content to client: content_length={len(response.get('content', ''))}")
-
-        # Include information about the O1 reasoning process in the response
-        result = {
-            'success': True,
-            'message': response.get('content', ''),
-            'o1_reasoning': {
-                'iterations': response.get('iterations', 0),
-                'tool_calls_count': len(response.get('tool_results', [])),
-                'completed': True
-            }
-        }
+    def event_stream():
+        # Send something right away so proxies and the browser open the stream
+        yield _sse_event('start', {'vibe': vibe.slug})
 
-        logger.info(f"Returning successful response with O1 reasoning info: iterations={result['o1_reasoning']['iterations']}, tool_calls={result['o1_reasoning']['tool_calls_count']}")
-        return JsonResponse(result)
-    else:
+        try:
+            for event in conversation.stream_response(max_iterations=5):
+                if event['event'] != 'done':
+                    yield _sse_event(event['event'], event['data'])
+                    continue
+
+                response = event['data']
+                result = _save_ai_response(conversation_history, response)
+                result['timing'] = response.get('timing', {})
+                yield _sse_event('done', result)
+        except Exception as e:
+            logger.exception(f"Error streaming AI conversation: {str(e)}")
+            yield _sse_event('done', {
+                'success': False,
+                'error': f"Error in AI conversation: {str(e)}"
+            })
+
+    response = StreamingHttpResponse(event_stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def _prepare_ai_turn(request, vibe_slug):
+    """
+    Run the synchronous setup shared by the async AI message views.
+
+    Args:
+        request: The HTTP request
+        vibe_slug: The slug of the vibe
+
+    Returns:
+        Tuple of an early response, the VibeConversationHistory and the
+        VibeConversation. When the early response is set the others are None.
+    """
+    vibe = get_object_or_404(Vibe, slug=vibe_slug)
+
+    error_response = _check_ai_access(request, vibe)
+    if error_response:
+        return error_response, None, None
+
+    message, early_response = _parse_ai_message(request, vibe)
+    if early_response:
+        return early_response, None, None
+
+    try:
+        conversation_history, conversation = _start_conversation(request, vibe, message)
+    except Exception as e:
+        logger.exception(f"Error in AI conversation: {str(e)}")
         return JsonResponse({
             'success': False,
-            'error': response.get('error', "Unknown error")
+            'error': f"Error in AI conversation: {str(e)}"
+        }), None, None
+
+    return None, conversation_history, conversation
+
+
+@login_required
+@require_POST
+@ensure_csrf_cookie
+async def vibe_ai_message_async(request, vibe_slug):
+    """
+    Async version of vibe_ai_message for ASGI deployments.
+
+    Waiting on OpenAI doesn't hold a worker thread, so one process can serve
+    many builder sessions at once. Enabled with the AI_ASYNC_VIEWS setting.
+
+    Args:
+        request: The HTTP request
+        vibe_slug: The slug of the vibe
+
+    Returns:
+        JSON response with the AI's reply
+    """
+    early_response, conversation_history, conversation = await sync_to_async(_prepare_ai_turn)(request, vibe_slug)
+    if early_response:
+        return early_response
+
+    try:
+        logger.info("Getting async response from AI using O1 reasoning loop")
+        response = await conversation.aget_response(max_iterations=5)
+    except Exception as e:
+        logger.exception(f"Error in AI conversation: {str(e)}")
+        return JsonResponse({
+            'success': False,
+            'error': f"Error in AI conversation: {str(e)}"
         })
 
+    result = await sync_to_async(_save_ai_response)(conversation_history, response)
+    return JsonResponse(result)
+
+
+@login_required
+@require_POST
+@ensure_csrf_cookie
+async def vibe_ai_message_stream_async(request, vibe_slug):
+    """
+    Async version of vibe_ai_message_stream for ASGI deployments.
+
+    Sends the same events as vibe_ai_message_stream. Enabled with the
+    AI_ASYNC_VIEWS setting.
+
+    Args:
+        request: The HTTP request
+        vibe_slug: The slug of the vibe
+
+    Returns:
+        Streaming response with the AI's reply
+    """
+    early_response, conversation_history, conversation = await sync_to_async(_prepare_ai_turn)(request, vibe_slug)
+    if early_response:
+        return early_response
+
+    async def event_stream():
+        # Send something right away so proxies and the browser open the stream
+        yield _sse_event('start', {'vibe': conversation.vibe.slug})
+
+        try:
+            async for event in conversation.astream_response(max_iterations=5):
+                if event['event'] != 'done':
+                    yield _sse_event(event['event'], event['data'])
+                    continue
+
+                response = event['data']
+                result = await sync_to_async(_save_ai_response)(conversation_history, response)
+                result['timing'] = response.get('timing', {})
+                yield _sse_event('done', result)
+        except Exception as e:
+            logger.exception(f"Error streaming AI conversation: {str(e)}")
+            yield _sse_event('done', {
+                'success': False,
+                'error': f"Error in AI conversation: {str(e)}"
+            })
+
+    response = StreamingHttpResponse(event_stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
 
 @login_required
 @require_POST
@@ -482,6 +715,7 @@ def vibe_ai_file_operation(request, vibe_slug):
         operation = request.POST.get('operation', '').strip()
         filename = request.POST.get('filename', '').strip()
         content = request.POST.get('content', '')
+        version = request.POST.get('version')
 
         # If not in POST data, try to parse JSON
         if not operation and request.content_type == 'application/json':
@@ -499,6 +733,7 @@ def vibe_ai_file_operation(request, vibe_slug):
                 operation = data.get('operation', '').strip()
                 filename = data.get('filename', '').strip()
                 content = data.get('content', '')
+                version = data.get('version')
                 logger.info(f"Parsed operation from JSON: {operation}")
             except json.JSONDecodeError as e:
                 logger.warning(f"JSON decode error: {str(e)}")
@@ -518,6 +753,18 @@ def vibe_ai_file_operation(request, vibe_slug):
                 'success': False,
                 'error': "Filename cannot be empty."
             })
+
+        # Version number for the history operations
+        if version not in (None, ''):
+            version = int(version)
+        else:
+            version = None
+
+        if version is None and operation in ('version', 'restore'):
+            return JsonResponse({
+                'success': False,
+                'error': "Version cannot be empty."
+            })
     except Exception as e:
         logger.exception(f"Error parsing file operation: {str(e)}")
         return JsonResponse({
@@ -532,53 +779,27 @@ def vibe_ai_file_operation(request, vibe_slug):
     if operation == 'read':
         result = file_manager.read_file(filename)
     elif operation == 'write':
+        # The file manager also updates the vibe's custom file flags
         result = file_manager.write_file(filename, content)
-
-        # Update the vibe's custom file flags
-        if result.get('success', False):
-            logger.info(f"File write successful: {filename}")
-            logger.info(f"Vibe custom flags before update - HTML: {vibe.has_custom_html}, CSS: {vibe.has_custom_css}, JS: {vibe.has_custom_js}")
-
-            if filename.endswith('.html'):
-                logger.info(f"Setting has_custom_html to True for file: {filename}")
-                vibe.has_custom_html = True
-            elif filename.endswith('.css'):
-                logger.info(f"Setting has_custom_css to True for file: {filename}")
-                vibe.has_custom_css = True
-            elif filename.endswith('.js'):
-                logger.info(f"Setting has_custom_js to True for file: {filename}")
-                vibe.has_custom_js = True
-
-            vibe.save()
-            logger.info(f"Vibe custom flags after update - HTML: {vibe.has_custom_html}, CSS: {vibe.has_custom_css}, JS: {vibe.has_custom_js}")
     elif operation == 'delete':
         logger.info(f"Delete operation requested for file: {filename}")
-        # Log the actual file path
-        file_path = file_manager.get_file_path(filename)
-        logger.info(f"File path to delete: {file_path}, exists: {file_path.exists()}")
         result = file_manager.delete_file(filename)
         logger.info(f"Delete result: {result}")
     elif operation == 'diff':
-        result = file_manager.get_diff(filename, content)
+        if version is not None:
+            # Compare an earlier version with the current content
+            result = file_manager.diff_versions(filename, version)
+        else:
+            result = file_manager.get_diff(filename, content)
+    elif operation == 'history':
+        result = file_manager.list_versions(filename)
+    elif operation == 'version':
+        result = file_manager.read_version(filename, version)
+    elif operation == 'restore':
+        result = file_manager.restore_version(filename, version)
     elif operation == 'list':
-        logger.error(f"CRITICAL DEBUG: list operation called for vibe: {vibe.slug}")
-
         # Get the list of files
         files = file_manager.list_files()
-        logger.error(f"CRITICAL DEBUG: Got {len(files)} files from file_manager.list_files()")
-
-        # Also list the files directly using os.listdir for debugging
-        try:
-            vibe_dir = file_manager.vibe_dir
-            logger.error(f"CRITICAL DEBUG: Vibe directory: {vibe_dir}")
-            logger.error(f"CRITICAL DEBUG: Vibe directory exists: {vibe_dir.exists()}")
-
-            if vibe_dir.exists():
-                logger.error(f"CRITICAL DEBUG: Files in directory using os.listdir:")
-                for filename in os.listdir(str(vibe_dir)):
-                    logger.error(f"CRITICAL DEBUG: - {filename}")
-        except Exception as e:
-            logger.error(f"CRITICAL DEBUG: Error listing directory with os.listdir: {str(e)}")
 
         result = {
             'success': True,
@@ -593,6 +814,62 @@ def vibe_ai_file_operation(request, vibe_slug):
     return JsonResponse(result)
 
 
+@login_required
+@require_POST
+@ensure_csrf_cookie
+def vibe_ai_batch_file_operation(request, vibe_slug):
+    """
+    API endpoint for several file operations in one request.
+
+    The request body is JSON: ``{"operations": [{"operation": "write",
+    "filename": "index.html", "content": "..."}, ...]}`` with read, write
+    and delete operations. Written files are stored together, with a single
+    update of the vibe's flags and compiled page.
+
+    Args:
+        request: The HTTP request
+        vibe_slug: The slug of the vibe
+
+    Returns:
+        JSON response with the result of each operation
+    """
+    # Get the vibe
+    vibe = get_object_or_404(Vibe, slug=vibe_slug)
+
+    # Check if the user is the owner of the vibe
+    if vibe.user != request.user:
+        return HttpResponseForbidden("You don't have permission to edit this vibe.")
+
+    try:
+        data = json.loads(request.body.decode('utf-8'))
+        operations = data.get('operations') if isinstance(data, dict) else None
+        if not isinstance(operations, list) or not all(isinstance(operation, dict) for operation in operations):
+            return JsonResponse({
+                'success': False,
+                'error': "Operations must be a list of objects."
+            })
+        if len(operations) > AI_BATCH_MAX_OPERATIONS:
+            return JsonResponse({
+                'success': False,
+                'error': f"Too many operations (at most {AI_BATCH_MAX_OPERATIONS})."
+            })
+    except (UnicodeDecodeError, json.JSONDecodeError) as e:
+        logger.warning(f"Invalid batch file operation request: {str(e)}")
+        return JsonResponse({
+            'success': False,
+            'error': f"Invalid JSON: {str(e)}"
+        })
+
+    logger.info(f"Batch of {len(operations)} file operations for vibe: {vibe.slug}")
+
+    # Apply the operations, with the vibe's flag update in one transaction
+    file_manager = VibeFileManager(vibe)
+    with transaction.atomic():
+        result = file_manager.apply_operations(operations)
+
+    return JsonResponse(result)
+
+
 @login_required
 @require_POST
 def enable_custom_html(request, vibe_slug):
@@ -713,33 +990,14 @@ def vibe_ai_create_file(request, vibe_slug):
         file_path = file_manager.get_file_path(filename)
         logger.info(f"File path: {file_path}")
 
-        # Write the file directly first
-        with open(file_path, 'w') as f:
-            f.write(content)
-
-        logger.info(f"File written directly: {file_path}")
-
-        # Now use the file manager to handle backups, etc.
+        # Write the file through the file manager, which stores the content
+        # in the blob store and handles backups
         result = file_manager.write_file(filename, content)
         logger.info(f"File manager result: {result}")
 
-        # Update the vibe's custom file flags
+        # The file manager also updates the vibe's custom file flags
         if result.get('success', False):
             logger.info(f"File write successful: {filename}")
-            logger.info(f"Vibe custom flags before update - HTML: {vibe.has_custom_html}, CSS: {vibe.has_custom_css}, JS: {vibe.has_custom_js}")
-
-            if filename.endswith('.html'):
-                logger.info(f"Setting has_custom_html to True for file: {filename}")
-                vibe.has_custom_html = True
-            elif filename.endswith('.css'):
-                logger.info(f"Setting has_custom_css to True for file: {filename}")
-                vibe.has_custom_css = True
-            elif filename.endswith('.js'):
-                logger.info(f"Setting has_custom_js to True for file: {filename}")
-                vibe.has_custom_js = True
-
-            vibe.save()
-            logger.info(f"Vibe custom flags after update - HTML: {vibe.has_custom_html}, CSS: {vibe.has_custom_css}, JS: {vibe.has_custom_js}")
 
             # Verify the file exists
             if file_path.exists():
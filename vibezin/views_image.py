@@ -5,12 +5,13 @@ import json
 import logging
 from django.http import JsonResponse
 from django.shortcuts import render, get_object_or_404
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required
-from django.views.decorators.http import require_POST
+from django.views.decorators.http import require_POST, require_GET
 from django.views.decorators.csrf import ensure_csrf_cookie
 
-from .models import Vibe, GeneratedImage
-from .image_utils import generate_image, save_generated_image
+from .models import Vibe, GeneratedImage, BackgroundJob
+from .job_utils import enqueue_job
 
 logger = logging.getLogger(__name__)
 
@@ -26,7 +27,7 @@ def generate_image_view(request, vibe_slug=None):
         vibe_slug: Optional slug of the vibe to associate the image with
 
     Returns:
-        JSON response with the generated image URL
+        JSON response with the ID of the job generating the image
     """
     # Check if the user has an OpenAI API key
     if not hasattr(request.user, 'profile') or not request.user.profile.chatgpt_api_key:
@@ -72,46 +73,45 @@ def generate_image_view(request, vibe_slug=None):
             'error': f"Error parsing request: {str(e)}"
         })
 
-    # Generate the image
-    api_key = request.user.profile.chatgpt_api_key
-    result = generate_image(api_key, prompt, size, quality)
-
-    if result.get('success', False):
-        # Save the image
-        image_url = result.get('image_url')
-        revised_prompt = result.get('revised_prompt', prompt)
-
-        save_result = save_generated_image(
-            user=request.user,
-            prompt=prompt,
-            image_url=image_url,
-            revised_prompt=revised_prompt
-        )
-
-        if save_result.get('success', False):
-            # If a vibe was provided, associate the image with it
-            if vibe:
-                image = GeneratedImage.objects.get(id=save_result.get('image_id'))
-                image.vibe = vibe
-                image.save()
+    # Queue the image generation; the browser polls the job for the result
+    idempotency_key = request.headers.get('Idempotency-Key') or request.POST.get('idempotency_key') or None
+    job, created = enqueue_job(
+        request.user,
+        'generate_image',
+        {'prompt': prompt, 'size': size, 'quality': quality},
+        vibe=vibe,
+        idempotency_key=idempotency_key
+    )
+
+    return JsonResponse({
+        'success': True,
+        'job_id': job.id,
+        'status': job.status,
+        'status_url': reverse('vibezin:job_status', args=[job.id]),
+        'message': "Image generation started." if created else "Image generation was already requested."
+    }, status=202 if created else 200)
+
+
+@login_required
+@require_GET
+def job_status(request, job_id):
+    """
+    API endpoint for polling the status of a background job.
+
+    Args:
+        request: The HTTP request
+        job_id: The ID of the job
+
+    Returns:
+        JSON response with the job status, and its result once it succeeded
+    """
+    job = get_object_or_404(BackgroundJob, id=job_id, user=request.user)
+
+    return JsonResponse({
+        'success': True,
+        'job': job.to_dict()
+    })
 
-            return JsonResponse({
-                'success': True,
-                'image_url': save_result.get('image_url'),
-                'revised_prompt': revised_prompt,
-                'message': "Image generated and saved successfully."
-            })
-        else:
-            return JsonResponse({
-                'success': False,
-                'error': save_result.get('error', "Failed to save the generated image.")
-            })
-    else:
-        return JsonResponse({
-            'success': False,
-            'error': result.get('error', "Failed to generate image."),
-            'details': result.get('details', "")
-        })
 
 @login_required
 def user_images(request):
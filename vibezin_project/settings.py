@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 import os
+import sys
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -101,6 +102,11 @@ DATABASES = {
     }
 }
 
+# The vibezin migrations aren't checked in, so `manage.py test` builds the
+# test database straight from the models
+if sys.argv[1:2] == ['test']:
+    MIGRATION_MODULES = {'vibezin': None}
+
 # PostgreSQL configuration - uncomment when database is set up
 # DATABASES = {
 #     'default': {
@@ -157,6 +163,140 @@ STATICFILES_DIRS = [
 # Vibe content directory
 VIBE_CONTENT_DIR = BASE_DIR / 'static' / 'vibes'
 
+# Content-addressed store for vibe files (see vibezin/blob_utils.py). Vibe
+# files are hard links into it, so keep it on the same filesystem as
+# VIBE_CONTENT_DIR. Unused blobs are removed by `manage.py gc_vibe_blobs`.
+VIBE_BLOB_DIR = Path(os.getenv('VIBE_BLOB_DIR', str(BASE_DIR / 'vibe_blobs')))
+VIBE_BLOB_GC_GRACE_PERIOD = int(os.getenv('VIBE_BLOB_GC_GRACE_PERIOD', '3600'))
+
+# Version history of vibe files (see vibezin/history_utils.py)
+VIBE_HISTORY_MAX_VERSIONS = int(os.getenv('VIBE_HISTORY_MAX_VERSIONS', '50'))
+VIBE_HISTORY_SNAPSHOT_INTERVAL = int(os.getenv('VIBE_HISTORY_SNAPSHOT_INTERVAL', '10'))
+
+# How durable vibe file writes are (see vibezin/fs_utils.py): 'none' leaves
+# flushing to the OS, 'file' fsyncs each file, 'full' also fsyncs directories
+VIBE_FSYNC_POLICY = os.getenv('VIBE_FSYNC_POLICY', 'none')
+
+# Number of vibe directories whose file listings are kept in memory per
+# process (see vibezin/file_index_utils.py)
+VIBE_FILE_INDEX_SIZE = int(os.getenv('VIBE_FILE_INDEX_SIZE', '1024'))
+# Resolution of directory modification times in seconds; listings rescan a
+# directory changed more recently than this
+VIBE_FILE_INDEX_MTIME_RESOLUTION = float(os.getenv('VIBE_FILE_INDEX_MTIME_RESOLUTION', '2'))
+
+# Number of vibes per page of the feed (see vibezin/feed_utils.py)
+VIBE_FEED_PAGE_SIZE = int(os.getenv('VIBE_FEED_PAGE_SIZE', '20'))
+
+# Vibe content (see vibezin/vibe_utils.py): how long it is cached, and
+# whether metadata.json and content.json are also written to vibe directories
+VIBE_CONTENT_TTL = int(os.getenv('VIBE_CONTENT_TTL', '3600'))
+VIBE_EXPORT_JSON_FILES = os.getenv('VIBE_EXPORT_JSON_FILES', 'False').lower() == 'true'
+
+# Vibe search (see vibezin/search_utils.py): results per page, how deep
+# results can be paged, and the PostgreSQL text search configuration
+VIBE_SEARCH_PAGE_SIZE = int(os.getenv('VIBE_SEARCH_PAGE_SIZE', '20'))
+VIBE_SEARCH_MAX_RESULTS = int(os.getenv('VIBE_SEARCH_MAX_RESULTS', '1000'))
+VIBE_SEARCH_CONFIG = os.getenv('VIBE_SEARCH_CONFIG', 'english')
+
+# Number of slug allocations Vibe.save tries when concurrent creates take the
+# same slug
+SLUG_ALLOCATION_ATTEMPTS = int(os.getenv('SLUG_ALLOCATION_ATTEMPTS', '5'))
+
+# Cached profile summaries (see vibezin/profile_utils.py): latest vibes kept
+# per user, and how long a summary lives if a change bypasses the signals
+PROFILE_SUMMARY_VIBES = int(os.getenv('PROFILE_SUMMARY_VIBES', '20'))
+PROFILE_SUMMARY_TTL = int(os.getenv('PROFILE_SUMMARY_TTL', '3600'))
+
+# Cache settings
+# Compiled vibe pages live in their own cache so they can be sized (and
+# evicted least-recently-used first) independently of everything else.
+# Point 'vibe_pages' at a shared backend (e.g. Redis) when running several
+# worker processes so that invalidation on write reaches all of them.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'vibe_pages': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'vibe-pages',
+        'TIMEOUT': None,
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('VIBE_PAGE_CACHE_MAX_ENTRIES', '1000')),
+            'CULL_FREQUENCY': 10,
+        },
+    },
+    # Responses to identical AI requests, for call sites that opt in
+    # (see vibezin/ai_response_cache.py)
+    'ai_responses': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv('AI_RESPONSE_CACHE_DIR', str(BASE_DIR / 'cache' / 'ai_responses')),
+        'TIMEOUT': int(os.getenv('AI_RESPONSE_CACHE_TTL', '86400')),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('AI_RESPONSE_CACHE_MAX_ENTRIES', '1000')),
+            'CULL_FREQUENCY': 4,
+        },
+    },
+}
+
+# How long a cached AI response is used, in seconds (0 turns the cache off)
+AI_RESPONSE_CACHE_TTL = int(os.getenv('AI_RESPONSE_CACHE_TTL', '86400'))
+
+# Outgoing HTTP settings (OpenAI, DALL-E, Pinata)
+# Connections are pooled and kept alive per host, see vibezin/http_utils.py
+HTTP_POOL_CONNECTIONS = int(os.getenv('HTTP_POOL_CONNECTIONS', '10'))
+HTTP_POOL_MAXSIZE = int(os.getenv('HTTP_POOL_MAXSIZE', '20'))
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', '10'))
+HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', '60'))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv('HTTP_KEEPALIVE_EXPIRY', '30'))
+# The async client serves every concurrent async session, so it gets its own,
+# larger limit and fails fast when it is exhausted
+HTTP_ASYNC_MAX_CONNECTIONS = int(os.getenv('HTTP_ASYNC_MAX_CONNECTIONS', '1000'))
+HTTP_ASYNC_POOL_TIMEOUT = float(os.getenv('HTTP_ASYNC_POOL_TIMEOUT', '5'))
+
+# AI builder settings
+# Serve the AI message views as async views. Only worth enabling when the
+# project runs under an ASGI server (see asgi.py).
+AI_ASYNC_VIEWS = os.getenv('AI_ASYNC_VIEWS', 'False').lower() == 'true'
+
+# Maximum number of independent tool calls (e.g. image generations) that run
+# at the same time, across the whole process
+AI_TOOL_MAX_WORKERS = int(os.getenv('AI_TOOL_MAX_WORKERS', '4'))
+
+# Maximum number of file operations in one request to the batch file endpoint
+AI_BATCH_MAX_OPERATIONS = int(os.getenv('AI_BATCH_MAX_OPERATIONS', '50'))
+
+# Number of per-user AI model contexts kept in memory by each process
+AI_CONTEXT_CACHE_SIZE = int(os.getenv('AI_CONTEXT_CACHE_SIZE', '1024'))
+
+# Token budget for the conversation sent with each AI request. System prompts
+# and the most recent messages are always sent in full; older file contents
+# and tool results are shortened or left out (see vibezin/ai_context_window.py)
+AI_CONTEXT_TOKEN_BUDGET = int(os.getenv('AI_CONTEXT_TOKEN_BUDGET', '16000'))
+AI_CONTEXT_KEEP_RECENT_MESSAGES = int(os.getenv('AI_CONTEXT_KEEP_RECENT_MESSAGES', '6'))
+
+# Background jobs (image generation and IPFS pinning), run with
+# `python manage.py run_jobs`. Failed jobs are retried with exponential
+# backoff; running jobs older than JOB_LOCK_TIMEOUT are picked up again.
+JOB_RETRY_BASE_DELAY = float(os.getenv('JOB_RETRY_BASE_DELAY', '10'))
+JOB_RETRY_MAX_DELAY = float(os.getenv('JOB_RETRY_MAX_DELAY', '600'))
+JOB_LOCK_TIMEOUT = int(os.getenv('JOB_LOCK_TIMEOUT', '600'))
+
+# Limits for OpenAI calls made with each API key. Calls wait up to
+# OPENAI_RATE_LIMIT_MAX_WAIT seconds for capacity and are rejected after
+# that; 429 and 5xx responses are retried honouring Retry-After, except when
+# the key is out of quota (see vibezin/rate_limit_utils.py).
+# The counters live in the OPENAI_RATE_LIMIT_CACHE_ALIAS cache: with the
+# local-memory default they are per process, so use a shared cache (Redis,
+# Memcached) to hold the limits across several workers.
+OPENAI_REQUESTS_PER_MINUTE = int(os.getenv('OPENAI_REQUESTS_PER_MINUTE', '500'))
+OPENAI_TOKENS_PER_MINUTE = int(os.getenv('OPENAI_TOKENS_PER_MINUTE', '30000'))
+OPENAI_IMAGES_PER_MINUTE = int(os.getenv('OPENAI_IMAGES_PER_MINUTE', '50'))
+OPENAI_RATE_LIMIT_MAX_WAIT = float(os.getenv('OPENAI_RATE_LIMIT_MAX_WAIT', '20'))
+OPENAI_RATE_LIMIT_CACHE_ALIAS = os.getenv('OPENAI_RATE_LIMIT_CACHE_ALIAS', 'default')
+OPENAI_MAX_RETRIES = int(os.getenv('OPENAI_MAX_RETRIES', '3'))
+OPENAI_RETRY_BASE_DELAY = float(os.getenv('OPENAI_RETRY_BASE_DELAY', '1'))
+OPENAI_RETRY_MAX_DELAY = float(os.getenv('OPENAI_RETRY_MAX_DELAY', '30'))
+
 # Media files (User uploaded files)
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'